@@ -1,7 +1,9 @@
 import sys
 import os
+import asyncio
 from logging.config import fileConfig
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 # اضافه کردن src به مسیر
@@ -9,6 +11,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # اینجا مدل‌های پروژه را ایمپورت می‌کنیم
 from src.database.models import Base  # فقط Base کافی است
+from src.database.database import async_database_url
 from src.utils.config import Config
 
 # این فایل config را می‌خواند
@@ -20,10 +23,8 @@ fileConfig(config.config_file_name)
 target_metadata = Base.metadata
 
 def get_url():
-    # خواندن آدرس دیتابیس از config یا env
-    cfg = Config()
-    db_url = os.getenv('DATABASE_URL') or 'sqlite:///data/slothunter.db'
-    return db_url
+    # همان آدرسی که برنامه استفاده می‌کند (DATABASE_URL یا config.yaml)، با درایور async
+    return async_database_url(Config().database_url)
 
 def run_migrations_offline():
     url = get_url()
@@ -33,19 +34,30 @@ def run_migrations_offline():
     with context.begin_transaction():
         context.run_migrations()
 
-def run_migrations_online():
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section),
+def do_run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        compare_type=True,
+        # SQLite تغییر ستون را فقط با بازسازی جدول پشتیبانی می‌کند
+        render_as_batch=connection.dialect.name == 'sqlite',
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+async def run_async_migrations():
+    connectable = async_engine_from_config(
+        config.get_section(config.config_ini_section) or {},
         prefix='sqlalchemy.',
         poolclass=pool.NullPool,
         url=get_url()
     )
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata, compare_type=True
-        )
-        with context.begin_transaction():
-            context.run_migrations()
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+def run_migrations_online():
+    asyncio.run(run_async_migrations())
 
 if context.is_offline_mode():
     run_migrations_offline()
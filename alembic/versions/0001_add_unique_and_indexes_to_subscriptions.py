@@ -27,7 +27,7 @@ def upgrade() -> None:
             SELECT user_id, doctor_id, COUNT(*) AS c
             FROM subscriptions
             GROUP BY user_id, doctor_id
-            HAVING c > 1
+            HAVING COUNT(*) > 1
             """
         )))
 
@@ -57,9 +57,16 @@ def upgrade() -> None:
         # Best-effort cleanup; do not fail migration due to cleanup step
         pass
 
+    # Skip objects that create_all already made from the model's __table_args__
+    inspector = sa.inspect(bind)
+    existing = {ix['name'] for ix in inspector.get_indexes('subscriptions')}
+    existing |= {uc['name'] for uc in inspector.get_unique_constraints('subscriptions')}
+
     # On SQLite, create_unique_constraint may map to unique index; use create_index with unique=True for portability
-    op.create_index('uq_subscription_user_doctor', 'subscriptions', ['user_id', 'doctor_id'], unique=True)
-    op.create_index('ix_subscriptions_user_active', 'subscriptions', ['user_id', 'is_active'], unique=False)
+    if 'uq_subscription_user_doctor' not in existing:
+        op.create_index('uq_subscription_user_doctor', 'subscriptions', ['user_id', 'doctor_id'], unique=True)
+    if 'ix_subscriptions_user_active' not in existing:
+        op.create_index('ix_subscriptions_user_active', 'subscriptions', ['user_id', 'is_active'], unique=False)
 
 
 def downgrade() -> None:
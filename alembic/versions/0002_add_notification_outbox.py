@@ -0,0 +1,45 @@
+"""
+Add notification_outbox table
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the durable outbox used by the notifier (skipped if create_all already made it)."""
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('notification_outbox'):
+        return
+
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), sa.ForeignKey('doctors.id'), nullable=False),
+        sa.Column('idempotency_key', sa.String(255), nullable=False, unique=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), server_default='0'),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('sent_at', sa.DateTime()),
+    )
+    op.create_index('ix_notification_outbox_status_id', 'notification_outbox', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_notification_outbox_status_id', table_name='notification_outbox')
+    except Exception:
+        pass
+    op.drop_table('notification_outbox')
@@ -0,0 +1,48 @@
+"""
+Add shard_leases and cluster_members tables
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create the lease tables used to partition polling across instances."""
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('shard_leases'):
+        op.create_table(
+            'shard_leases',
+            sa.Column('shard', sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column('owner', sa.String(64)),
+            sa.Column('expires_at', sa.DateTime()),
+            sa.Column('generation', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+    if not inspector.has_table('cluster_members'):
+        op.create_table(
+            'cluster_members',
+            sa.Column('instance_id', sa.String(64), primary_key=True),
+            sa.Column('hostname', sa.String(255)),
+            sa.Column('started_at', sa.DateTime()),
+            sa.Column('heartbeat_at', sa.DateTime()),
+        )
+        op.create_index('ix_cluster_members_heartbeat_at', 'cluster_members', ['heartbeat_at'], unique=False)
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_cluster_members_heartbeat_at', table_name='cluster_members')
+    except Exception:
+        pass
+    op.drop_table('cluster_members')
+    op.drop_table('shard_leases')
@@ -0,0 +1,43 @@
+"""
+Add composite indexes for the monitor, fanout and handler hot queries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_doctors_is_active', 'doctors', ['is_active', 'id']),
+    ('ix_doctor_centers_doctor_id', 'doctor_centers', ['doctor_id']),
+    ('ix_doctor_services_center_id', 'doctor_services', ['center_id']),
+    ('ix_subscriptions_doctor_active', 'subscriptions', ['doctor_id', 'is_active', 'user_id']),
+    ('ix_appointment_logs_doctor_id', 'appointment_logs', ['doctor_id']),
+    ('ix_notification_outbox_chat_status', 'notification_outbox', ['chat_id', 'status']),
+]
+
+
+def upgrade() -> None:
+    """Create each index unless create_all already made it."""
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if not inspector.has_table(table):
+            continue
+        if name in {ix['name'] for ix in inspector.get_indexes(table)}:
+            continue
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        try:
+            op.drop_index(name, table_name=table)
+        except Exception:
+            pass
@@ -0,0 +1,47 @@
+"""
+Add doctors.active_subscriber_count and backfill it
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add the denormalized counter (unless create_all already did) and fill it from subscriptions."""
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('doctors')}
+    if 'active_subscriber_count' not in columns:
+        with op.batch_alter_table('doctors') as batch_op:
+            batch_op.add_column(sa.Column(
+                'active_subscriber_count', sa.Integer(), nullable=False, server_default='0'
+            ))
+
+    doctors = sa.table('doctors', sa.column('id'), sa.column('active_subscriber_count'))
+    subscriptions = sa.table('subscriptions', sa.column('id'), sa.column('user_id'),
+                             sa.column('doctor_id'), sa.column('is_active', sa.Boolean))
+    users = sa.table('users', sa.column('id'), sa.column('is_active', sa.Boolean))
+    active_count = (
+        sa.select(sa.func.count(subscriptions.c.id))
+        .select_from(subscriptions.join(users, users.c.id == subscriptions.c.user_id))
+        .where(
+            subscriptions.c.doctor_id == doctors.c.id,
+            subscriptions.c.is_active == sa.true(),
+            users.c.is_active == sa.true(),
+        )
+        .scalar_subquery()
+    )
+    bind.execute(doctors.update().values(active_subscriber_count=active_count))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('doctors') as batch_op:
+        batch_op.drop_column('active_subscriber_count')
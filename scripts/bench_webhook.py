@@ -0,0 +1,161 @@
+"""
+بنچمارک محلی webhook (بدون اینترنت، با دیتابیس موقت و پاسخ‌های ساختگی Bot API)
+
+اجرا از ریشه پروژه:
+    python -m scripts.bench_webhook [--updates 2000] [--workers 8] [--connections 16]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+from src.database.database import DatabaseManager
+from src.telegram_bot.bot import SlotHunterBot
+from src.telegram_bot.update_processor import ChatSerialUpdateProcessor
+from src.telegram_bot.webhook import WebhookReceiver
+
+
+
+class OfflineRequest(BaseRequest):
+    """درخواست‌دهنده Bot API که بدون شبکه پاسخ ساختگی برمی‌گرداند"""
+
+    def __init__(self):
+        self.calls = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        elif endpoint in ('sendMessage', 'editMessageText'):
+            result = {'message_id': 1, 'date': int(time.time()),
+                      'chat': {'id': params.get('chat_id', 1), 'type': 'private'}, 'text': ''}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def _synthetic_update(update_id: int, user_id: int) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    chat = {'id': user_id, 'type': 'private'}
+    if update_id % 2:
+        return {'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'from': user,
+            'text': '/start', 'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        }}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': user, 'chat_instance': '1', 'data': 'show_doctors',
+        'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat, 'text': 'menu'},
+    }}
+
+
+async def _post_updates(port: int, path: str, secret: str, updates) -> int:
+    """ارسال آپدیت‌ها روی یک اتصال keep-alive؛ تعداد پاسخ‌های 200"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    ok = 0
+    try:
+        for update in updates:
+            body = json.dumps(update).encode()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            ok += status_line.split()[1] == b'200'
+    finally:
+        writer.close()
+    return ok
+
+
+async def _bench(total: int, workers: int, connections: int) -> int:
+    tmp_dir = tempfile.mkdtemp(prefix="slothunter-webhook-")
+    db_manager = DatabaseManager(f"sqlite+aiosqlite:///{Path(tmp_dir) / 'bench.db'}")
+    await db_manager._setup_database()
+
+    bot = SlotHunterBot("1:bench", db_manager)
+    request = OfflineRequest()
+    bot.application = (
+        Application.builder().token("1:bench").request(request).get_updates_request(request)
+        .concurrent_updates(ChatSerialUpdateProcessor(workers)).updater(None).build()
+    )
+    bot._setup_handlers()
+    app = bot.application
+    await app.initialize()
+    await app.start()
+
+    # گروه بعدی پس از handlerهای اصلی هر آپدیت اجرا می‌شود
+    processed = 0
+    done = asyncio.Event()
+
+    async def count_processed(update, context):
+        nonlocal processed
+        processed += 1
+        if processed >= total:
+            done.set()
+
+    app.add_handler(TypeHandler(Update, count_processed), group=1)
+
+    async def enqueue(data: dict):
+        await app.update_queue.put(Update.de_json(data, app.bot))
+
+    secret = "bench-secret"
+    receiver = WebhookReceiver(enqueue, secret, host="127.0.0.1", port=0)
+    await receiver.start()
+    try:
+        updates = [_synthetic_update(i, 1000 + i % 200) for i in range(1, total + 1)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            _post_updates(receiver.bound_port, receiver.path, secret, updates[i::connections])
+            for i in range(connections)
+        ))
+        accepted = time.perf_counter() - started
+        await asyncio.wait_for(done.wait(), timeout=120)
+        elapsed = time.perf_counter() - started
+    finally:
+        await receiver.stop()
+        await app.stop()
+        await app.shutdown()
+        await db_manager.close()
+
+    print(f"updates: {total}, accepted: {sum(results)}, workers: {workers}, connections: {connections}")
+    print(f"accept: {total / accepted:.0f} updates/s, end-to-end: {total / elapsed:.0f} updates/s")
+    print(f"request p95: {receiver.get_stats()['request_p95'] * 1000:.2f} ms, bot api calls: {request.calls}")
+    for name, stats in bot.get_update_stats()['handlers'].items():
+        print(f"  {name}: n={stats['count']} p50={stats['p50'] * 1000:.1f}ms "
+              f"p95={stats['p95'] * 1000:.1f}ms errors={stats['errors']}")
+    for name, stats in bot.get_update_stats()['callbacks'].items():
+        print(f"  callback {name}: n={stats['count']} p50={stats['p50'] * 1000:.1f}ms "
+              f"p95={stats['p95'] * 1000:.1f}ms errors={stats['errors']}")
+    return 0 if sum(results) == total else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="بنچمارک محلی webhook")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--connections', type=int, default=16)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_bench(args.updates, args.workers, args.connections)))
@@ -0,0 +1,357 @@
+"""
+ورود دسته‌ای دکترها از فایل آدرس‌ها یا slugها
+
+پروفایل‌ها همزمان (با سقف همزمانی و نرخ درخواست) دریافت می‌شوند، تکراری‌ها
+با یک پرس‌وجو روی slug و doctor_id کنار گذاشته می‌شوند و دکترها، مراکز و
+سرویس‌ها با insert دسته‌ای در یک تراکنش نوشته می‌شوند. برای هر آدرس یک
+سطر گزارش برمی‌گردد.
+
+اجرا از خط فرمان:
+    python -m src.api.bulk_import doctors.txt [--concurrency 4] [--rate 2] [--dry-run]
+"""
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+from sqlalchemy import insert, or_, select
+
+from src.api.doctor_extractor import DoctorExtractor
+from src.database.models import Doctor, DoctorCenter, DoctorService
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("BulkImport")
+
+# وضعیت‌های نتیجه هر آدرس
+ADDED = 'added'
+EXISTS = 'exists'
+DUPLICATE = 'duplicate'
+FAILED = 'failed'
+STATUS_LABELS = {ADDED: '✅ اضافه شد', EXISTS: '♻️ موجود', DUPLICATE: '🔁 تکراری', FAILED: '❌ خطا'}
+
+
+class RateLimiter:
+    """فاصله‌گذاری شروع درخواست‌ها: حداکثر rate درخواست در ثانیه"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class ImportItem:
+    """نتیجه ورود یک آدرس"""
+    source: str
+    slug: Optional[str] = None
+    status: Optional[str] = None  # None: هنوز در حال پردازش
+    message: str = ''
+    doctor_id: Optional[int] = None  # شناسه دکتر در دیتابیس
+    name: Optional[str] = None
+    centers: int = 0
+    services: int = 0
+    data: Optional[Dict] = field(default=None, repr=False)
+
+
+@dataclass
+class ImportReport:
+    items: List[ImportItem]
+    elapsed: float
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return dict(Counter(item.status for item in self.items))
+
+    def format(self, limit: int = 50) -> str:
+        """متن گزارش برای ربات و خط فرمان"""
+        counts = self.counts
+        lines = [
+            f"📥 ورود دسته‌ای: {len(self.items)} آدرس در {self.elapsed:.1f} ثانیه",
+            " | ".join(f"{STATUS_LABELS[status]}: {counts.get(status, 0)}"
+                       for status in (ADDED, EXISTS, DUPLICATE, FAILED)),
+            "",
+        ]
+        for item in self.items[:limit]:
+            title = item.name or item.slug or item.source
+            detail = f"{item.centers} مرکز، {item.services} سرویس" if item.status == ADDED else item.message
+            lines.append(f"{STATUS_LABELS[item.status]} {title}" + (f" — {detail}" if detail else ""))
+        if len(self.items) > limit:
+            lines.append(f"... و {len(self.items) - limit} مورد دیگر")
+        return "\n".join(lines)
+
+
+def parse_sources(text: str) -> List[str]:
+    """خطوط غیرخالی فایل (خطوط # توضیح هستند)"""
+    sources = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            sources.append(line)
+    return sources
+
+
+# ==================== سطرهای جدول‌ها از اطلاعات استخراج‌شده ====================
+
+def doctor_row(doctor_data: Dict, now: datetime) -> Dict:
+    return {
+        'name': doctor_data['name'],
+        'slug': doctor_data['extracted_slug'],
+        'doctor_id': str(doctor_data['doctor_id']),
+        'provider_id': doctor_data.get('provider_id'),
+        'user_id': doctor_data.get('user_id'),
+        'server_id': doctor_data.get('server_id', 1),
+        'specialty': doctor_data.get('specialty', 'عمومی'),
+        'biography': doctor_data.get('biography', ''),
+        'image_url': doctor_data.get('image_url', ''),
+        'is_active': True,
+        'created_at': now,
+    }
+
+
+def center_row(doctor_pk: int, center_data: Dict, now: datetime) -> Dict:
+    return {
+        'doctor_id': doctor_pk,
+        'center_id': str(center_data['center_id']),
+        'center_name': center_data['center_name'],
+        'center_type': center_data.get('center_type') or 'نامشخص',
+        'center_address': center_data.get('center_address'),
+        'center_phone': center_data.get('center_phone'),
+        'user_center_id': str(center_data['user_center_id']),
+        'is_active': True,
+        'created_at': now,
+    }
+
+
+def service_row(center_pk: int, service_data: Dict, now: datetime) -> Dict:
+    return {
+        'center_id': center_pk,
+        'service_id': str(service_data['service_id']),
+        'service_name': service_data['service_name'],
+        'user_center_id': str(service_data['user_center_id']),
+        'price': service_data.get('price') or 0,
+        'duration': str(service_data.get('duration') or ''),
+        'is_active': True,
+        'created_at': now,
+    }
+
+
+class BulkDoctorImporter:
+    """ورود همزمان و دسته‌ای دکترها"""
+
+    def __init__(self, db_manager, extractor: Optional[DoctorExtractor] = None,
+                 concurrency: int = 4, rate: float = 2.0):
+        self.db_manager = db_manager
+        self.extractor = extractor or DoctorExtractor()
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+
+        self._fetched = metrics.counter('import.profiles_fetched')
+        self._fetch_time = metrics.histogram('import.fetch_seconds')
+
+    async def run(self, sources: Iterable[str], dry_run: bool = False) -> ImportReport:
+        started = time.perf_counter()
+        items = self._resolve_slugs(sources)
+        await self._skip_existing_slugs(items)
+        await self._fetch_profiles([item for item in items if item.status is None])
+        if not dry_run:
+            await self._insert([item for item in items if item.status is None])
+        for item in items:
+            if item.status is None:  # dry-run: شمارش مراکز و سرویس‌هایی که اضافه می‌شدند
+                centers = [center for center in item.data['centers'] if center.get('services')]
+                item.status, item.message = ADDED, 'dry-run'
+                item.centers = len(centers)
+                item.services = sum(len(center['services']) for center in centers)
+            item.data = None
+        report = ImportReport(items, time.perf_counter() - started)
+        logger.info(f"📥 ورود دسته‌ای تمام شد: {report.counts}")
+        return report
+
+    def _resolve_slugs(self, sources: Iterable[str]) -> List[ImportItem]:
+        """slug هر آدرس؛ آدرس‌های نامعتبر و تکراری داخل فایل علامت می‌خورند"""
+        items, seen = [], set()
+        for source in sources:
+            item = ImportItem(source=source)
+            try:
+                item.slug = self.extractor.extract_slug_from_url(source)
+            except ValueError as e:
+                item.status, item.message = FAILED, str(e)
+            else:
+                if item.slug in seen:
+                    item.status, item.message = DUPLICATE, 'تکراری در فایل'
+                seen.add(item.slug)
+            items.append(item)
+        return items
+
+    async def _skip_existing_slugs(self, items: List[ImportItem]):
+        """دکترهای موجود قبل از دریافت پروفایل کنار گذاشته می‌شوند (صرفه‌جویی در درخواست)"""
+        pending = {item.slug: item for item in items if item.status is None}
+        if not pending:
+            return
+        async with self.db_manager.session_scope() as session:
+            rows = (await session.execute(
+                select(Doctor.id, Doctor.slug, Doctor.name).filter(Doctor.slug.in_(list(pending)))
+            )).all()
+        for row in rows:
+            item = pending[row.slug]
+            item.status, item.doctor_id, item.name = EXISTS, row.id, row.name
+            item.message = 'قبلاً اضافه شده'
+
+    async def _fetch_profiles(self, items: List[ImportItem]):
+        if not items:
+            return
+        limiter = RateLimiter(self.rate)
+        slots = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async with httpx.AsyncClient(timeout=self.extractor.timeout, limits=limits) as client:
+            async def fetch(item: ImportItem):
+                async with slots:
+                    await limiter.wait()
+                    started = time.perf_counter()
+                    try:
+                        item.data = await self.extractor.extract_doctor_from_url(item.source, client)
+                        item.name = item.data['name']
+                        self._fetched.inc()
+                    except Exception as e:
+                        item.status, item.message = FAILED, str(e)
+                    finally:
+                        self._fetch_time.observe(time.perf_counter() - started)
+
+            await asyncio.gather(*(fetch(item) for item in items))
+
+        for item in items:
+            if item.status is None and not any(c.get('services') for c in item.data['centers']):
+                item.status, item.message = FAILED, 'هیچ مرکز فعالی برای این دکتر یافت نشد'
+
+    async def _insert(self, items: List[ImportItem]):
+        if not items:
+            return
+
+        async def _write(session) -> List[ImportItem]:
+            # تکراری‌ها (slug یا doctor_id) با یک پرس‌وجو، داخل همان تراکنش نوشتن
+            slugs = [item.data['extracted_slug'] for item in items]
+            external_ids = [str(item.data['doctor_id']) for item in items]
+            existing = (await session.execute(
+                select(Doctor.id, Doctor.slug, Doctor.doctor_id)
+                .filter(or_(Doctor.slug.in_(slugs), Doctor.doctor_id.in_(external_ids)))
+            )).all()
+            by_slug = {row.slug: row.id for row in existing}
+            by_external = {row.doctor_id: row.id for row in existing}
+
+            new_items, batch_ids = [], set()
+            for item in items:
+                external_id = str(item.data['doctor_id'])
+                found = by_slug.get(item.data['extracted_slug']) or by_external.get(external_id)
+                if found:
+                    item.status, item.doctor_id, item.message = EXISTS, found, 'قبلاً اضافه شده'
+                elif external_id in batch_ids:
+                    item.status, item.message = DUPLICATE, 'همان دکتر با آدرس دیگر در فایل'
+                else:
+                    batch_ids.add(external_id)
+                    new_items.append(item)
+            if not new_items:
+                return []
+
+            now = datetime.utcnow()
+            doctor_ids = (await session.execute(
+                insert(Doctor).returning(Doctor.id, sort_by_parameter_order=True),
+                [doctor_row(item.data, now) for item in new_items],
+            )).scalars().all()
+
+            center_rows, center_owner = [], []
+            for item, doctor_pk in zip(new_items, doctor_ids):
+                item.doctor_id = doctor_pk
+                for center_data in item.data['centers']:
+                    if center_data.get('services'):
+                        center_rows.append(center_row(doctor_pk, center_data, now))
+                        center_owner.append((item, center_data))
+            center_ids = (await session.execute(
+                insert(DoctorCenter).returning(DoctorCenter.id, sort_by_parameter_order=True),
+                center_rows,
+            )).scalars().all()
+
+            service_rows = []
+            for (item, center_data), center_pk in zip(center_owner, center_ids):
+                item.centers += 1
+                for service_data in center_data['services']:
+                    service_rows.append(service_row(center_pk, service_data, now))
+                    item.services += 1
+            if service_rows:
+                await session.execute(insert(DoctorService), service_rows)
+            return new_items
+
+        try:
+            added = await self.db_manager.run_write(_write)
+        except Exception as e:
+            logger.error(f"❌ خطا در نوشتن دسته‌ای دکترها: {e}")
+            for item in items:
+                if item.status is None:
+                    item.status, item.message = FAILED, f"خطا در ذخیره: {e}"
+            return
+
+        for item in added:
+            item.status = ADDED
+        if added:
+            self.db_manager.stats.adjust(
+                total_doctors=len(added), active_doctors=len(added),
+                total_centers=sum(item.centers for item in added),
+                total_services=sum(item.services for item in added),
+            )
+            self.db_manager.catalog.invalidate()
+            self.db_manager.search.invalidate()
+
+
+async def _main(path: str, concurrency: Optional[int], rate: Optional[float], dry_run: bool) -> int:
+    from pathlib import Path
+    from src.database.database import DatabaseManager
+    from src.utils.config import Config
+
+    config = Config()
+    settings = config.catalog_settings
+    sources = parse_sources(Path(path).read_text(encoding='utf-8'))
+    if len(sources) > settings.import_max_items:
+        print(f"❌ تعداد آدرس‌ها ({len(sources)}) بیش از سقف {settings.import_max_items} است")
+        return 2
+
+    db_manager = DatabaseManager(config.database_url, config.database_settings)
+    await db_manager._setup_database()
+    try:
+        importer = BulkDoctorImporter(
+            db_manager,
+            concurrency=concurrency or settings.import_concurrency,
+            rate=rate or settings.import_rate,
+        )
+        report = await importer.run(sources, dry_run=dry_run)
+    finally:
+        await db_manager.close()
+    if dry_run:
+        print("🧪 dry-run: چیزی ذخیره نشد")
+    print(report.format(limit=len(report.items)))
+    return 1 if report.counts.get(FAILED) else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="ورود دسته‌ای دکترها از فایل آدرس‌ها")
+    parser.add_argument('file', help="فایل متنی؛ هر خط یک لینک یا slug دکتر")
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--rate', type=float, help="حداکثر درخواست در ثانیه")
+    parser.add_argument('--dry-run', action='store_true', help="فقط دریافت و بررسی، بدون ذخیره")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.file, args.concurrency, args.rate, args.dry_run)))
@@ -0,0 +1,310 @@
+"""
+به‌روزرسانی دوره‌ای کاتالوگ دکترها بر اساس تفاوت با پروفایل سایت
+
+پروفایل دکترهای فعال با زمان‌بندی کند و همزمانی محدود دوباره استخراج
+می‌شود. مراکز (بر اساس center_id) و سرویس‌ها (بر اساس service_id) با
+دیتابیس مقایسه می‌شوند و فقط تغییرات اعمال می‌شوند: موارد جدید insert
+دسته‌ای، موارد تغییرکرده update و موارد حذف‌شده از سایت غیرفعال می‌شوند.
+حلقه بررسی نوبت فقط مراکز و سرویس‌های فعال را می‌خواند، پس دور بعدی
+بررسی خودبه‌خود از فهرست جدید استفاده می‌کند.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import insert, or_, select, update
+
+from src.api.bulk_import import RateLimiter, center_row, service_row
+from src.api.doctor_extractor import DoctorExtractor
+from src.database.models import Doctor, DoctorCenter, DoctorService
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("CatalogRefresh")
+
+DOCTOR_FIELDS = ('name', 'specialty', 'biography', 'image_url')
+CENTER_FIELDS = ('center_name', 'center_type', 'center_address', 'center_phone', 'user_center_id')
+SERVICE_FIELDS = ('service_name', 'user_center_id', 'price', 'duration')
+
+
+@dataclass
+class CatalogDiff:
+    """تعداد تغییرات اعمال‌شده"""
+    doctors_updated: int = 0
+    doctors_unchanged: int = 0  # پروفایل بدون تغییر (304 یا هش یکسان)؛ بدون parse و نوشتن
+    centers_added: int = 0
+    centers_updated: int = 0
+    centers_deactivated: int = 0
+    services_added: int = 0
+    services_updated: int = 0
+    services_deactivated: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return any(getattr(self, f.name) for f in fields(self) if f.name != 'doctors_unchanged')
+
+    def __iadd__(self, other: 'CatalogDiff') -> 'CatalogDiff':
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+        return self
+
+    def summary(self) -> str:
+        return (
+            f"مراکز +{self.centers_added} ~{self.centers_updated} -{self.centers_deactivated}، "
+            f"سرویس‌ها +{self.services_added} ~{self.services_updated} -{self.services_deactivated}"
+        )
+
+
+def _sync_fields(obj, values: Dict, names) -> bool:
+    """مقداردهی فقط ستون‌های تغییرکرده؛ True اگر چیزی تغییر کرد"""
+    changed = False
+    for name in names:
+        if getattr(obj, name) != values[name]:
+            setattr(obj, name, values[name])
+            changed = True
+    if not obj.is_active:
+        obj.is_active = True
+        changed = True
+    return changed
+
+
+async def mark_checked(db_manager, doctor_pks: List[int], checked_at: Optional[datetime] = None):
+    """ثبت زمان بررسی دکترهای بدون تغییر (یا ناموفق) با یک UPDATE"""
+    if not doctor_pks:
+        return
+
+    async def _write(session):
+        await session.execute(
+            update(Doctor).where(Doctor.id.in_(doctor_pks))
+            .values(last_checked=checked_at or datetime.utcnow())
+        )
+
+    await db_manager.run_write(_write)
+
+
+async def apply_profile(db_manager, doctor_pk: int, doctor_data: Dict) -> CatalogDiff:
+    """اعمال تفاوت پروفایل استخراج‌شده با دکتر، مراکز و سرویس‌های دیتابیس"""
+
+    async def _write(session) -> CatalogDiff:
+        diff = CatalogDiff()
+        now = datetime.utcnow()
+        doctor = await session.get(Doctor, doctor_pk)
+        if doctor is None:
+            return diff
+
+        incoming = {
+            'name': doctor_data['name'],
+            'specialty': doctor_data.get('specialty') or doctor.specialty,
+            'biography': doctor_data.get('biography') or doctor.biography,
+            'image_url': doctor_data.get('image_url') or doctor.image_url,
+        }
+        if any(getattr(doctor, name) != incoming[name] for name in DOCTOR_FIELDS):
+            for name in DOCTOR_FIELDS:
+                setattr(doctor, name, incoming[name])
+            diff.doctors_updated = 1
+        doctor.last_checked = now
+
+        centers = {
+            center.center_id: center for center in (await session.execute(
+                select(DoctorCenter).filter(DoctorCenter.doctor_id == doctor_pk)
+            )).scalars()
+        }
+        services: Dict[int, Dict[str, DoctorService]] = {}
+        if centers:
+            for service in (await session.execute(
+                select(DoctorService).filter(DoctorService.center_id.in_([c.id for c in centers.values()]))
+            )).scalars():
+                services.setdefault(service.center_id, {})[service.service_id] = service
+
+        # مرکز بدون سرویس قابل رزرو نیست و مثل مرکز حذف‌شده رفتار می‌شود
+        wanted = {
+            str(center_data['center_id']): center_data
+            for center_data in doctor_data['centers'] if center_data.get('services')
+        }
+        new_centers: List[Dict] = []
+        pending_services: List[tuple] = []  # (شناسه مرکز در دیتابیس، اطلاعات سرویس)
+
+        for center_id, center_data in wanted.items():
+            row = center_row(doctor_pk, center_data, now)
+            center = centers.get(center_id)
+            if center is None:
+                new_centers.append(row)
+                continue
+            if _sync_fields(center, row, CENTER_FIELDS):
+                diff.centers_updated += 1
+
+            existing = services.get(center.id, {})
+            wanted_services = {str(s['service_id']): s for s in center_data['services']}
+            for service_id, service_data in wanted_services.items():
+                service = existing.get(service_id)
+                if service is None:
+                    pending_services.append((center.id, service_data))
+                elif _sync_fields(service, service_row(center.id, service_data, now), SERVICE_FIELDS):
+                    diff.services_updated += 1
+            for service_id, service in existing.items():
+                if service_id not in wanted_services and service.is_active:
+                    service.is_active = False
+                    diff.services_deactivated += 1
+
+        for center_id, center in centers.items():
+            if center_id not in wanted and center.is_active:
+                center.is_active = False
+                diff.centers_deactivated += 1
+                for service in services.get(center.id, {}).values():
+                    if service.is_active:
+                        service.is_active = False
+                        diff.services_deactivated += 1
+
+        if new_centers:
+            new_ids = (await session.execute(
+                insert(DoctorCenter).returning(DoctorCenter.id, sort_by_parameter_order=True),
+                new_centers,
+            )).scalars().all()
+            diff.centers_added = len(new_ids)
+            for row, center_pk in zip(new_centers, new_ids):
+                for service_data in wanted[row['center_id']]['services']:
+                    pending_services.append((center_pk, service_data))
+        if pending_services:
+            await session.execute(
+                insert(DoctorService),
+                [service_row(center_pk, service_data, now) for center_pk, service_data in pending_services],
+            )
+            diff.services_added = len(pending_services)
+        return diff
+
+    diff = await db_manager.run_write(_write)
+    if diff.changed:
+        db_manager.stats.invalidate()
+        db_manager.catalog.invalidate(doctor_pk)
+        try:
+            await db_manager.search.refresh_doctor(doctor_pk)
+        except Exception as e:
+            logger.warning(f"⚠️ خطا در به‌روزرسانی ایندکس جستجو برای دکتر {doctor_pk}: {e}")
+    return diff
+
+
+class CatalogRefresher:
+    """
+    job پس‌زمینه به‌روزرسانی کاتالوگ
+
+    هر interval ثانیه حداکثر batch_size دکتر فعال که بیش از max_age از آخرین
+    به‌روزرسانی‌شان گذشته (قدیمی‌ترین اول) دوباره استخراج می‌شوند. دکتر ناموفق
+    به انتهای صف می‌رود و پس از نصف max_age دوباره امتحان می‌شود؛ وگرنه دکترهای
+    همیشه ناموفق (مثلاً 404 دائمی) ابتدای صف را برای همیشه پر می‌کنند.
+    """
+
+    def __init__(self, db_manager, extractor: Optional[DoctorExtractor] = None,
+                 interval: float = 3600.0, max_age: float = 86400.0, batch_size: int = 50,
+                 concurrency: int = 2, rate: float = 0.5,
+                 owns: Optional[Callable[[int], bool]] = None):
+        self.db_manager = db_manager
+        self.extractor = extractor or DoctorExtractor()
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.owns = owns or (lambda doctor_id: True)  # در حالت چندنمونه‌ای فقط دکترهای shardهای خودی
+        self.totals = CatalogDiff()
+        self._task: Optional[asyncio.Task] = None
+
+        self._refreshed = metrics.counter('catalog_refresh.doctors')
+        self._failed = metrics.counter('catalog_refresh.failures')
+        self._pass_time = metrics.histogram('catalog_refresh.pass_seconds')
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"🔄 به‌روزرسانی کاتالوگ هر {self.interval:.0f} ثانیه فعال شد")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ خطا در به‌روزرسانی کاتالوگ: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _stale_doctors(self) -> List[tuple]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+        async with self.db_manager.session_scope() as session:
+            rows = (await session.execute(
+                select(Doctor.id, Doctor.slug, Doctor.name)
+                .filter(Doctor.is_active == True)
+                .filter(or_(Doctor.last_checked.is_(None), Doctor.last_checked < cutoff))
+                .order_by(Doctor.last_checked.is_not(None), Doctor.last_checked)
+                .limit(self.batch_size * 4)
+            )).all()
+        return [row for row in rows if self.owns(row.id)][:self.batch_size]
+
+    async def refresh_stale(self) -> CatalogDiff:
+        """یک دور: استخراج همزمان و اعمال تفاوت‌ها؛ مجموع تغییرات این دور"""
+        doctors = await self._stale_doctors()
+        total = CatalogDiff()
+        if not doctors:
+            return total
+
+        started = time.perf_counter()
+        limiter = RateLimiter(self.rate)
+        slots = asyncio.Semaphore(self.concurrency)
+        failed: List[int] = []
+        unchanged: List[int] = []
+
+        async with httpx.AsyncClient(timeout=self.extractor.timeout) as client:
+            async def refresh(doctor):
+                nonlocal total
+                async with slots:
+                    await limiter.wait()
+                    try:
+                        data = await self.extractor.extract_doctor_from_url(f"dr/{doctor.slug}", client)
+                        if data.get('not_modified'):
+                            unchanged.append(doctor.id)
+                            self._refreshed.inc()
+                            return
+                        diff = await apply_profile(self.db_manager, doctor.id, data)
+                    except Exception as e:
+                        # خطای سایت نباید دکتر را غیرفعال کند؛ بعداً دوباره امتحان می‌شود
+                        failed.append(doctor.id)
+                        self._failed.inc()
+                        logger.warning(f"⚠️ به‌روزرسانی {doctor.name} ناموفق: {e}")
+                        return
+                    self._refreshed.inc()
+                    total += diff
+                    if diff.changed:
+                        logger.info(f"🔄 {doctor.name}: {diff.summary()}")
+
+            await asyncio.gather(*(refresh(doctor) for doctor in doctors))
+
+        await mark_checked(self.db_manager, unchanged)
+        await mark_checked(
+            self.db_manager, failed,
+            checked_at=datetime.utcnow() - timedelta(seconds=self.max_age / 2)
+        )
+        total.doctors_unchanged = len(unchanged)
+        self.totals += total
+        self._pass_time.observe(time.perf_counter() - started)
+        logger.info(
+            f"🔄 به‌روزرسانی کاتالوگ: {len(doctors) - len(failed)}/{len(doctors)} دکتر در "
+            f"{time.perf_counter() - started:.1f} ثانیه ({len(unchanged)} بدون تغییر)؛ {total.summary()}"
+        )
+        return total
+
+    def get_stats(self) -> Dict:
+        stats = {f.name: getattr(self.totals, f.name) for f in fields(self.totals)}
+        stats['refreshed'] = self._refreshed.value
+        stats['failures'] = self._failed.value
+        return stats
@@ -1,24 +1,61 @@
 """
 سرویس استخراج اطلاعات دکتر از لینک پذیرش24
+
+صفحه دکتر به‌صورت جریانی خوانده می‌شود و دریافت همان لحظه‌ای که اسکریپت
+__NEXT_DATA__ بسته شد متوقف می‌شود؛ فقط بایت‌های همان اسکریپت نگه داشته
+می‌شوند. parse کردن JSON (کار سنگین CPU) در process pool مشترک
+(src.utils.offload) انجام می‌شود و از درخت pageProps فقط زیرشاخه‌های
+موردنیاز نگه داشته می‌شوند.
+
+بنچمارک محلی (صفحه ساختگی، بدون اینترنت):
+    python -m src.api.doctor_extractor --bench
 """
+import asyncio
 import httpx
 import json
 import re
 import logging
-from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse, unquote
 from datetime import datetime
 import time
 import random
 
+from src.api.profile_cache import CachedProfile, ProfileCache, content_hash
+from src.utils.metrics import metrics
+from src.utils import offload
+from src.utils.offload import LoopLagMonitor, run_cpu
+
 logger = logging.getLogger(__name__)
 
+NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+SCRIPT_END = b'</script>'
+MAX_NEXT_DATA_BYTES = 16 * 1024 * 1024
+# تنها بخش‌هایی از pageProps که parse_doctor_data استفاده می‌کند
+PROFILE_KEYS = ('information', 'centers', 'expertises', 'slug')
+NEXT_DATA_PATTERN = re.compile(r'<script id="__NEXT_DATA__" type="application/json">(.*?)</script>', re.DOTALL)
+
+
+@dataclass
+class FetchedPage:
+    """نتیجه دریافت جریانی؛ raw برای پاسخ 304 خالی است"""
+    raw: Optional[bytearray]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    received: int = 0
+
+    @property
+    def not_modified(self) -> bool:
+        return self.raw is None
+
 
 class DoctorExtractor:
     """کلاس استخراج اطلاعات دکتر از صفحه پذیرش24"""
     
-    def __init__(self, timeout: int = 30):
+    def __init__(self, timeout: int = 30, cache: Optional[ProfileCache] = None):
         self.timeout = timeout
+        self.cache = cache  # کش پروفایل‌ها با اعتبارسنجی شرطی (اختیاری)
         self.base_url = "https://www.paziresh24.com"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
@@ -85,27 +122,53 @@ class DoctorExtractor:
             logger.error(f"❌ خطا در استخراج slug: {e}")
             raise ValueError(f"نمی‌توان slug را از URL استخراج کرد: {url}")
     
-    async def fetch_doctor_page(self, url: str) -> str:
-        """دریافت محتوای صفحه دکتر"""
+    async def fetch_doctor_page(self, url: str, client: Optional[httpx.AsyncClient] = None) -> str:
+        """دریافت محتوای صفحه دکتر (با client مشترک در صورت ارسال)"""
         try:
             normalized_url = self.normalize_doctor_url(url)
             logger.info(f"🔍 دریافت صفحه: {normalized_url}")
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            if client is not None:
                 response = await client.get(normalized_url, headers=self.headers)
-                response.raise_for_status()
-                
-                if response.status_code != 200:
-                    raise ValueError(f"خطا در دریافت صفحه: {response.status_code}")
-                
-                content = response.text
-                
-                # بررسی وجود __NEXT_DATA__
-                if '__NEXT_DATA__' not in content:
-                    raise ValueError("صفحه دکتر معتبر نیست - __NEXT_DATA__ یافت نشد")
-                
-                logger.info(f"✅ صفحه با موفقیت دریافت شد ({len(content)} کاراکتر)")
-                return content
+            else:
+                async with httpx.AsyncClient(timeout=self.timeout) as own_client:
+                    response = await own_client.get(normalized_url, headers=self.headers)
+            response.raise_for_status()
+            
+            if response.status_code != 200:
+                raise ValueError(f"خطا در دریافت صفحه: {response.status_code}")
+            
+            content = response.text
+            
+            # بررسی وجود __NEXT_DATA__
+            if '__NEXT_DATA__' not in content:
+                raise ValueError("صفحه دکتر معتبر نیست - __NEXT_DATA__ یافت نشد")
+            
+            logger.info(f"✅ صفحه با موفقیت دریافت شد ({len(content)} کاراکتر)")
+            return content
+            
+        except httpx.TimeoutException:
+            raise ValueError("زمان انتظار برای دریافت صفحه تمام شد")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise ValueError("صفحه دکتر یافت نشد (404)")
+            else:
+                raise ValueError(f"خطا در دریافت صفحه: {e.response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ خطا در دریافت صفحه: {e}")
+            raise ValueError(f"خطا در دریافت صفحه: {str(e)}")
+    
+    async def fetch_next_data(self, url: str, client: Optional[httpx.AsyncClient] = None,
+                              headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        """دریافت جریانی صفحه تا پایان اسکریپت __NEXT_DATA__ (headers: سرآیندهای شرطی)"""
+        try:
+            normalized_url = self.normalize_doctor_url(url)
+            logger.info(f"🔍 دریافت صفحه: {normalized_url}")
+            
+            if client is not None:
+                return await self._stream_next_data(client, normalized_url, headers)
+            async with httpx.AsyncClient(timeout=self.timeout) as own_client:
+                return await self._stream_next_data(own_client, normalized_url, headers)
                 
         except httpx.TimeoutException:
             raise ValueError("زمان انتظار برای دریافت صفحه تمام شد")
@@ -114,16 +177,78 @@ class DoctorExtractor:
                 raise ValueError("صفحه دکتر یافت نشد (404)")
             else:
                 raise ValueError(f"خطا در دریافت صفحه: {e.response.status_code}")
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"❌ خطا در دریافت صفحه: {e}")
             raise ValueError(f"خطا در دریافت صفحه: {str(e)}")
     
+    async def _stream_next_data(self, client: httpx.AsyncClient, url: str,
+                                headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        request_headers = {**self.headers, **headers} if headers else self.headers
+        async with client.stream('GET', url, headers=request_headers) as response:
+            if response.status_code == 304:
+                return FetchedPage(None)
+            response.raise_for_status()
+            
+            buffer = bytearray()
+            received = 0
+            in_script = False
+            search_from = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                buffer += chunk
+                if not in_script:
+                    marker = buffer.find(NEXT_DATA_MARKER)
+                    if marker < 0:
+                        # فقط انتهای بافر برای نشانگری که بین دو تکه بریده شده نگه داشته می‌شود
+                        del buffer[:max(0, len(buffer) - len(NEXT_DATA_MARKER))]
+                        continue
+                    tag_end = buffer.find(b'>', marker)
+                    if tag_end < 0:
+                        del buffer[:marker]
+                        continue
+                    del buffer[:tag_end + 1]
+                    in_script = True
+                
+                end = buffer.find(SCRIPT_END, search_from)
+                if end >= 0:
+                    metrics.counter('extractor.bytes_read').inc(received)
+                    logger.info(f"✅ __NEXT_DATA__ دریافت شد ({end} بایت از {received} بایت خوانده‌شده)")
+                    del buffer[end:]
+                    # json.loads مستقیم bytearray را می‌پذیرد؛ کپی اضافه لازم نیست
+                    return FetchedPage(
+                        buffer,
+                        etag=response.headers.get('etag'),
+                        last_modified=response.headers.get('last-modified'),
+                        received=received,
+                    )
+                if len(buffer) > MAX_NEXT_DATA_BYTES:
+                    raise ValueError("حجم __NEXT_DATA__ بیش از حد مجاز است")
+                search_from = max(0, len(buffer) - len(SCRIPT_END) + 1)
+        
+        raise ValueError("صفحه دکتر معتبر نیست - __NEXT_DATA__ یافت نشد")
+    
+    def parse_next_data(self, raw: Union[bytes, bytearray]) -> Dict:
+        """parse کردن JSON و استخراج دکتر (CPU-bound؛ خارج از event loop صدا زده می‌شود)"""
+        started = time.perf_counter()
+        try:
+            page_props = json.loads(raw).get('props', {}).get('pageProps', {})
+        except json.JSONDecodeError as e:
+            logger.error(f"❌ خطا در parse کردن JSON: {e}")
+            raise ValueError("خطا در parse کردن اطلاعات صفحه")
+        # بقیه درخت (نظرات، لینک‌ها و ...) همین‌جا آزاد می‌شود
+        trimmed = {'props': {'pageProps': {key: page_props[key] for key in PROFILE_KEYS if key in page_props}}}
+        del page_props
+        doctor_data = self.parse_doctor_data(trimmed)
+        metrics.histogram('extractor.parse_seconds').observe(time.perf_counter() - started)
+        return doctor_data
+    
     def extract_next_data(self, html_content: str) -> Dict:
         """استخراج __NEXT_DATA__ از HTML"""
         try:
             # پیدا کردن script tag حاوی __NEXT_DATA__
-            pattern = r'<script id="__NEXT_DATA__" type="application/json">(.*?)</script>'
-            match = re.search(pattern, html_content, re.DOTALL)
+            match = NEXT_DATA_PATTERN.search(html_content)
             
             if not match:
                 raise ValueError("__NEXT_DATA__ در صفحه یافت نشد")
@@ -264,7 +389,7 @@ class DoctorExtractor:
             # fallback
             return f"clinic-{int(time.time())}.{random.randint(10000000, 99999999)}"
     
-    async def extract_doctor_from_url(self, url: str) -> Dict:
+    async def extract_doctor_from_url(self, url: str, client: Optional[httpx.AsyncClient] = None) -> Dict:
         """استخراج کامل اطلاعات دکتر از URL"""
         try:
             logger.info(f"🚀 شروع استخراج اطلاعات دکتر از: {url}")
@@ -273,16 +398,42 @@ class DoctorExtractor:
             normalized_url = self.normalize_doctor_url(url)
             slug = self.extract_slug_from_url(url)
             
-            # 2. دریافت محتوای صفحه
-            html_content = await self.fetch_doctor_page(normalized_url)
-            
-            # 3. استخراج __NEXT_DATA__
-            next_data = self.extract_next_data(html_content)
-            
-            # 4. تجزیه اطلاعات دکتر
-            doctor_data = self.parse_doctor_data(next_data)
-            
-            # 5. اضافه کردن اطلاعات اضافی
+            # 2. دریافت جریانی صفحه تا پایان __NEXT_DATA__ (شرطی اگر در کش باشد)
+            cached = await self.cache.get(slug) if self.cache else None
+            page = await self.fetch_next_data(
+                normalized_url, client, cached.conditional_headers() if cached else None
+            )
+            
+            # 3. پروفایل بدون تغییر از کش؛ در غیر این صورت parse در thread جدا
+            digest = None if page.not_modified else content_hash(page.raw)
+            if cached is not None and (page.not_modified or digest == cached.content_hash):
+                self.cache.record_hit(cached, not_modified=page.not_modified)
+                if not page.not_modified and (page.etag, page.last_modified) != (cached.etag, cached.last_modified):
+                    # همان محتوا با اعتبارسنج جدید؛ دفعه بعد پاسخ 304 ممکن می‌شود
+                    cached.etag, cached.last_modified = page.etag, page.last_modified
+                    cached.page_bytes, cached.fetched_at = page.received, time.time()
+                    await self.cache.put(cached)
+                doctor_data = cached.profile
+                doctor_data['not_modified'] = True
+                logger.info(f"♻️ پروفایل {slug} تغییری نکرده است")
+            elif page.not_modified:
+                raise ValueError("پاسخ 304 بدون نسخه ذخیره‌شده")
+            else:
+                doctor_data = await run_cpu(parse_profile, page.raw)
+                if self.cache:
+                    self.cache.record_miss()
+                    await self.cache.put(CachedProfile(
+                        slug=slug,
+                        profile=doctor_data,
+                        content_hash=digest,
+                        etag=page.etag,
+                        last_modified=page.last_modified,
+                        page_bytes=page.received,
+                        fetched_at=time.time(),
+                    ))
+                doctor_data['not_modified'] = False
+            
+            # 4. اضافه کردن اطلاعات اضافی
             doctor_data['original_url'] = normalized_url
             doctor_data['extracted_slug'] = slug
             doctor_data['terminal_id'] = self.generate_terminal_id()
@@ -296,6 +447,17 @@ class DoctorExtractor:
             raise ValueError(f"خطا در استخراج اطلاعات دکتر: {str(e)}")
 
 
+_parser: Optional[DoctorExtractor] = None
+
+
+def parse_profile(raw: Union[bytes, bytearray]) -> Dict:
+    """parse در پردازه کمکی (run_cpu)؛ تابع سطح ماژول تا قابل pickle باشد"""
+    global _parser
+    if _parser is None:
+        _parser = DoctorExtractor()
+    return _parser.parse_next_data(raw)
+
+
 # تست سریع
 async def test_extractor():
     """تست سریع extractor"""
@@ -319,6 +481,89 @@ async def test_extractor():
             print(f"❌ خطا: {e}")
 
 
+def _synthetic_page(reviews: int = 3000) -> bytes:
+    """صفحه‌ای شبیه صفحه واقعی: head، __NEXT_DATA__ حجیم (نظرات و ...) و بدنه بعد از آن"""
+    centers = [{
+        'id': f'center-{i}', 'name': f'مطب شماره {i}', 'center_type_name': 'مطب', 'address': 'تهران، خیابان ' * 5,
+        'tell': '021000000', 'user_center_id': f'uc-{i}',
+        'services': [{'id': f's-{i}-{j}', 'alias_title': 'ویزیت', 'user_center_id': f'uc-{i}', 'free_price': 0}
+                     for j in range(3)],
+    } for i in range(3)]
+    page_props = {
+        'slug': 'دکتر-نمونه-0',
+        'information': {'id': 'd-1', 'display_name': 'دکتر نمونه', 'provider_id': 'p', 'user_id': 'u',
+                        'biography': 'بیوگرافی ' * 200},
+        'centers': centers,
+        'expertises': {'expertises': [{'alias_title': 'قلب و عروق'}]},
+        'reviews': [{'id': i, 'user': f'کاربر {i}', 'text': 'خیلی خوب بود ' * 20, 'rate': 5,
+                     'replies': [{'text': 'ممنون'}]} for i in range(reviews)],
+        'similarLinks': [{'title': f'دکتر {i}', 'url': f'/dr/x-{i}'} for i in range(500)],
+    }
+    next_data = json.dumps({'props': {'pageProps': page_props}, 'page': '/dr/[slug]'}, ensure_ascii=False)
+    head = '<html><head>' + '<link rel="preload" href="/_next/static/chunk.js">' * 1500 + '</head><body>'
+    tail = '<div>' + 'محتوای صفحه ' * 40000 + '</div><script src="/_next/app.js"></script></body></html>'
+    return (head + f'<script id="__NEXT_DATA__" type="application/json">{next_data}</script>' + tail).encode()
+
+
+async def _bench(rounds: int = 20, chunk_size: int = 16384) -> int:
+    import tracemalloc
+
+    page = _synthetic_page()
+
+    async def handler(request):
+        async def body():
+            for offset in range(0, len(page), chunk_size):
+                yield page[offset:offset + chunk_size]
+        return httpx.Response(200, content=body(), headers={'content-type': 'text/html; charset=utf-8'})
+
+    extractor = DoctorExtractor()
+    url = "dr/دکتر-نمونه-0"
+
+    async def old_path(client):
+        html = await extractor.fetch_doctor_page(url, client)
+        return extractor.parse_doctor_data(extractor.extract_next_data(html))
+
+    async def new_path(client):
+        return await extractor.extract_doctor_from_url(url, client)
+
+    logging.disable(logging.INFO)
+    print(f"page: {len(page) / 1024:.0f} KB, rounds: {rounds}")
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for name, path in (('full page + regex', old_path), ('streaming', new_path)):
+            await path(client)  # گرم کردن
+            started = time.perf_counter()
+            for _ in range(rounds):
+                result = await path(client)
+            elapsed = time.perf_counter() - started
+            # حافظه جدا اندازه‌گیری می‌شود چون tracemalloc خودش زمان را چند برابر می‌کند
+            tracemalloc.start()
+            await path(client)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {name}: {elapsed / rounds * 1000:.1f} ms/profile, peak {peak / 1024 / 1024:.1f} MB, "
+                  f"centers={len(result['centers'])}")
+
+        # پاسخگویی event loop هنگام parse همزمان: thread (GIL در json.loads) در برابر process pool
+        raw = (await extractor.fetch_next_data(url, client)).raw
+        await run_cpu(parse_profile, raw)  # گرم کردن pool
+        for name, parse in (('thread', lambda: asyncio.to_thread(parse_profile, raw)),
+                            ('process', lambda: run_cpu(parse_profile, raw))):
+            lag = LoopLagMonitor(interval=0.002, warn_threshold=float('inf'), name=f'bench.{name}')
+            await lag.start()
+            started = time.perf_counter()
+            await asyncio.gather(*(parse() for _ in range(rounds)))
+            elapsed = time.perf_counter() - started
+            await lag.stop()
+            stats = lag.get_stats()
+            print(f"  parse via {name}: {elapsed * 1000:.0f} ms for {rounds}, "
+                  f"loop lag p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms")
+    offload.shutdown()
+    return 0
+
+
 if __name__ == "__main__":
-    import asyncio
+    import sys
+    
+    if '--bench' in sys.argv:
+        sys.exit(asyncio.run(_bench()))
     asyncio.run(test_extractor())
\ No newline at end of file
@@ -9,6 +9,7 @@ from datetime import datetime
 
 from src.database.models import Doctor, DoctorCenter, DoctorService
 from src.api.doctor_extractor import DoctorExtractor
+from src.api.catalog_refresh import apply_profile, mark_checked
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +17,18 @@ logger = logging.getLogger(__name__)
 class DoctorManager:
     """کلاس مدیریت دکترها"""
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, extractor: Optional[DoctorExtractor] = None):
         self.db_manager = db_manager
-        self.extractor = DoctorExtractor()
+        self.extractor = extractor or DoctorExtractor()
+    
+    async def _doctor_changed(self, doctor_id: int):
+        """به‌روزرسانی کاتالوگ و ایندکس جستجو پس از commit تغییرات یک دکتر"""
+        self.db_manager.catalog.invalidate(doctor_id)
+        try:
+            await self.db_manager.search.refresh_doctor(doctor_id)
+        except Exception as e:
+            # ایندکس با max_age دوباره ساخته می‌شود؛ خطای آن نباید عملیات را خراب کند
+            logger.warning(f"⚠️ خطا در به‌روزرسانی ایندکس جستجو برای دکتر {doctor_id}: {e}")
     
     async def add_doctor_from_url(self, url: str, user_id: int = None) -> Tuple[bool, str, Optional[Doctor]]:
         """
@@ -36,8 +46,16 @@ class DoctorManager:
             except Exception as e:
                 return False, f"خطا در استخراج اطلاعات: {str(e)}", None
             
-            # 2. بررسی وجود دکتر قبلی
-            async with self.db_manager.session_scope() as session:
+            # مراکز بدون سرویس کنار گذاشته می‌شوند؛ بدون مرکز فعال دکتری ثبت نمی‌شود
+            centers = []
+            for center_data in doctor_data['centers']:
+                if not center_data.get('services'):
+                    logger.warning(f"⚠️ مرکز {center_data.get('center_name')} سرویسی ندارد، رد می‌شود")
+                    continue
+                centers.append(center_data)
+            
+            async def _add(session):
+                # 2. بررسی وجود دکتر قبلی (داخل تراکنش نوشتن)
                 existing_result = await session.execute(
                     select(Doctor).filter(
                         (Doctor.slug == doctor_data['extracted_slug']) |
@@ -45,9 +63,8 @@ class DoctorManager:
                     )
                 )
                 existing_doctor = existing_result.scalar_one_or_none()
-                
-                if existing_doctor:
-                    return False, f"دکتر {existing_doctor.name} قبلاً در سیستم موجود است", existing_doctor
+                if existing_doctor or not centers:
+                    return existing_doctor, None, 0
                 
                 # 3. ایجاد دکتر جدید
                 new_doctor = Doctor(
@@ -68,16 +85,8 @@ class DoctorManager:
                 await session.flush()  # برای دریافت ID
                 
                 # 4. اضافه کردن مراکز و سرویس‌ها
-                centers_added = 0
                 services_added = 0
-                
-                for center_data in doctor_data['centers']:
-                    # بررسی وجود سرویس‌ها
-                    if not center_data.get('services'):
-                        logger.warning(f"⚠️ مرکز {center_data.get('center_name')} سرویسی ندارد، رد می‌شود")
-                        continue
-                    
-                    # ایجاد مرکز
+                for center_data in centers:
                     new_center = DoctorCenter(
                         doctor_id=new_doctor.id,
                         center_id=center_data['center_id'],
@@ -92,11 +101,9 @@ class DoctorManager:
                     
                     session.add(new_center)
                     await session.flush()  # برای دریافت ID
-                    centers_added += 1
                     
-                    # اضافه کردن سرویس‌ها
                     for service_data in center_data['services']:
-                        new_service = DoctorService(
+                        session.add(DoctorService(
                             center_id=new_center.id,
                             service_id=service_data['service_id'],
                             service_name=service_data['service_name'],
@@ -105,20 +112,25 @@ class DoctorManager:
                             duration=service_data.get('duration', ''),
                             is_active=True,
                             created_at=datetime.utcnow()
-                        )
-                        
-                        session.add(new_service)
+                        ))
                         services_added += 1
-                
-                if centers_added == 0:
-                    # اگر هیچ مرکزی اضافه نشد، دکتر را حذف کن
-                    await session.delete(new_doctor)
-                    return False, "هیچ مرکز فعالی برای این دکتر یافت نشد", None
-                
-                # 5. ذخیره تغییرات
-                await session.commit()
-                
-                success_message = f"""
+                return None, new_doctor, services_added
+            
+            # 5. ذخیره از صف نوشتن تک‌نویسنده
+            existing_doctor, new_doctor, services_added = await self.db_manager.run_write(_add)
+            if existing_doctor:
+                return False, f"دکتر {existing_doctor.name} قبلاً در سیستم موجود است", existing_doctor
+            if new_doctor is None:
+                return False, "هیچ مرکز فعالی برای این دکتر یافت نشد", None
+            
+            centers_added = len(centers)
+            self.db_manager.stats.adjust(
+                total_doctors=1, active_doctors=1,
+                total_centers=centers_added, total_services=services_added
+            )
+            await self._doctor_changed(new_doctor.id)
+            
+            success_message = f"""
 ✅ دکتر با موفقیت اضافه شد!
 
 👨‍⚕️ **نام:** {new_doctor.name}
@@ -127,10 +139,10 @@ class DoctorManager:
 🔧 **سرویس‌ها:** {services_added} سرویس
 
 🔗 **لینک:** https://www.paziresh24.com/dr/{new_doctor.slug}/
-                """.strip()
-                
-                logger.info(f"✅ دکتر {new_doctor.name} با موفقیت اضافه شد ({centers_added} مرکز، {services_added} سرویس)")
-                return True, success_message, new_doctor
+            """.strip()
+            
+            logger.info(f"✅ دکتر {new_doctor.name} با موفقیت اضافه شد ({centers_added} مرکز، {services_added} سرویس)")
+            return True, success_message, new_doctor
                 
         except Exception as e:
             logger.error(f"❌ خطا در اضافه کردن دکتر: {e}")
@@ -169,23 +181,29 @@ class DoctorManager:
             logger.error(f"❌ خطا در دریافت دکترها: {e}")
             return []
     
+    @staticmethod
+    async def _set_active(session, doctor_id: int, is_active: bool) -> Optional[Doctor]:
+        """تغییر وضعیت دکتر داخل تراکنش نوشتن (بدون commit)"""
+        result = await session.execute(
+            select(Doctor).filter(Doctor.id == doctor_id)
+        )
+        doctor = result.scalar_one_or_none()
+        if doctor:
+            doctor.is_active = is_active
+        return doctor
+    
     async def update_doctor_status(self, doctor_id: int, is_active: bool) -> Tuple[bool, str]:
         """به‌روزرسانی وضعیت دکتر"""
         try:
-            async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(Doctor).filter(Doctor.id == doctor_id)
-                )
-                doctor = result.scalar_one_or_none()
-                
-                if not doctor:
-                    return False, "دکتر یافت نشد"
-                
-                doctor.is_active = is_active
-                await session.commit()
-                
-                status_text = "فعال" if is_active else "غیرفعال"
-                return True, f"وضعیت دکتر {doctor.name} به {status_text} تغییر یافت"
+            doctor = await self.db_manager.run_write(
+                lambda session: self._set_active(session, doctor_id, is_active)
+            )
+            if not doctor:
+                return False, "دکتر یافت نشد"
+            await self._doctor_changed(doctor.id)
+            
+            status_text = "فعال" if is_active else "غیرفعال"
+            return True, f"وضعیت دکتر {doctor.name} به {status_text} تغییر یافت"
                 
         except Exception as e:
             logger.error(f"❌ خطا در به‌روزرسانی وضعیت دکتر: {e}")
@@ -194,53 +212,44 @@ class DoctorManager:
     async def delete_doctor(self, doctor_id: int) -> Tuple[bool, str]:
         """حذف دکتر (soft delete)"""
         try:
-            async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(Doctor).filter(Doctor.id == doctor_id)
-                )
-                doctor = result.scalar_one_or_none()
-                
-                if not doctor:
-                    return False, "دکتر یافت نشد"
-                
-                doctor.is_active = False
-                await session.commit()
-                
-                return True, f"دکتر {doctor.name} حذف شد"
+            doctor = await self.db_manager.run_write(
+                lambda session: self._set_active(session, doctor_id, False)
+            )
+            if not doctor:
+                return False, "دکتر یافت نشد"
+            await self._doctor_changed(doctor.id)
+            
+            return True, f"دکتر {doctor.name} حذف شد"
                 
         except Exception as e:
             logger.error(f"❌ خطا در حذف دکتر: {e}")
             return False, f"خطا در حذف: {str(e)}"
     
     async def refresh_doctor_data(self, doctor_id: int) -> Tuple[bool, str]:
-        """به‌روزرسانی اطلاعات دکتر از سایت"""
+        """به‌روزرسانی اطلاعات دکتر، مراکز و سرویس‌ها از سایت (فقط تغییرات اعمال می‌شوند)"""
         try:
             async with self.db_manager.session_scope() as session:
                 result = await session.execute(
-                    select(Doctor).filter(Doctor.id == doctor_id)
+                    select(Doctor.slug).filter(Doctor.id == doctor_id)
                 )
-                doctor = result.scalar_one_or_none()
-                
-                if not doctor:
-                    return False, "دکتر یافت نشد"
-                
-                # دریافت اطلاعات جدید
-                doctor_url = f"https://www.paziresh24.com/dr/{doctor.slug}/"
-                try:
-                    new_data = await self.extractor.extract_doctor_from_url(doctor_url)
-                except Exception as e:
-                    return False, f"خطا در دریافت اطلاعات جدید: {str(e)}"
-                
-                # به‌روزرسانی اطلاعات اصلی
-                doctor.name = new_data['name']
-                doctor.specialty = new_data.get('specialty', doctor.specialty)
-                doctor.biography = new_data.get('biography', doctor.biography)
-                doctor.image_url = new_data.get('image_url', doctor.image_url)
-                doctor.last_checked = datetime.utcnow()
-                
-                await session.commit()
-                
-                return True, f"اطلاعات دکتر {doctor.name} به‌روزرسانی شد"
+                slug = result.scalar_one_or_none()
+            
+            if not slug:
+                return False, "دکتر یافت نشد"
+            
+            # دریافت اطلاعات جدید
+            doctor_url = f"https://www.paziresh24.com/dr/{slug}/"
+            try:
+                new_data = await self.extractor.extract_doctor_from_url(doctor_url)
+            except Exception as e:
+                return False, f"خطا در دریافت اطلاعات جدید: {str(e)}"
+            
+            if new_data.get('not_modified'):
+                await mark_checked(self.db_manager, [doctor_id])
+                return True, f"اطلاعات دکتر {new_data['name']} تغییری نکرده است"
+            
+            diff = await apply_profile(self.db_manager, doctor_id, new_data)
+            return True, f"اطلاعات دکتر {new_data['name']} به‌روزرسانی شد ({diff.summary()})"
                 
         except Exception as e:
             logger.error(f"❌ خطا در به‌روزرسانی دکتر: {e}")
@@ -261,34 +270,16 @@ class DoctorManager:
             return False, f"URL نامعتبر: {str(e)}"
     
     async def get_doctor_stats(self) -> Dict:
-        """دریافت آمار دکترها"""
+        """دریافت آمار دکترها (از snapshot آمار تجمیعی)"""
         try:
-            async with self.db_manager.session_scope() as session:
-                # تعداد دکترهای فعال
-                active_result = await session.execute(
-                    select(Doctor).filter(Doctor.is_active == True)
-                )
-                active_doctors = active_result.scalars().all()
-                
-                # تعداد مراکز
-                centers_result = await session.execute(
-                    select(DoctorCenter).filter(DoctorCenter.is_active == True)
-                )
-                total_centers = len(centers_result.scalars().all())
-                
-                # تعداد سرویس‌ها
-                services_result = await session.execute(
-                    select(DoctorService).filter(DoctorService.is_active == True)
-                )
-                total_services = len(services_result.scalars().all())
-                
-                return {
-                    'total_doctors': len(active_doctors),
-                    'total_centers': total_centers,
-                    'total_services': total_services,
-                    'doctors_with_subscriptions': len([d for d in active_doctors if d.subscription_count > 0])
-                }
-                
+            stats = await self.db_manager.stats.get()
+            return {
+                'total_doctors': stats['active_doctors'],
+                'total_centers': stats['total_centers'],
+                'total_services': stats['total_services'],
+                'doctors_with_subscriptions': stats['doctors_with_subscriptions']
+            }
+            
         except Exception as e:
             logger.error(f"❌ خطا در دریافت آمار: {e}")
             return {
@@ -0,0 +1,159 @@
+"""
+کش روی دیسک پروفایل‌های استخراج‌شده دکترها
+
+برای هر slug پروفایل parse‌شده همراه ETag / Last-Modified پاسخ و هش محتوای
+__NEXT_DATA__ ذخیره می‌شود. درخواست بعدی با If-None-Match / If-Modified-Since
+فرستاده می‌شود؛ پاسخ 304 یا محتوای با هش یکسان یعنی پروفایل تغییری نکرده و
+parse و نوشتن در دیتابیس لازم نیست. حجم کل فایل‌ها محدود است و قدیمی‌ترین
+ورودی‌ها (آخرین استفاده) حذف می‌شوند.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+from src.utils.offload import run_blocking
+
+logger = get_logger("ProfileCache")
+
+
+@dataclass
+class CachedProfile:
+    slug: str
+    profile: Dict
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    page_bytes: int = 0  # حجم دریافت‌شده در آخرین دریافت کامل (برای محاسبه صرفه‌جویی)
+    fetched_at: float = 0.0
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def content_hash(raw) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class ProfileCache:
+    """کش LRU محدود به حجم؛ هر ورودی یک فایل JSON"""
+
+    def __init__(self, directory: str = "data/profile_cache", max_bytes: int = 50 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._index: Optional[Dict[str, int]] = None  # نام فایل → حجم
+        self._total = 0
+        self._lock = asyncio.Lock()
+
+        self._hits = metrics.counter('profile_cache.hits')
+        self._misses = metrics.counter('profile_cache.misses')
+        self._not_modified = metrics.counter('profile_cache.not_modified')
+        self._bytes_saved = metrics.counter('profile_cache.bytes_saved')
+        self._evictions = metrics.counter('profile_cache.evictions')
+
+    @staticmethod
+    def _filename(slug: str) -> str:
+        return hashlib.sha1(slug.encode()).hexdigest() + '.json'
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index = {}
+        for path in self.directory.glob('*.json'):
+            self._index[path.name] = path.stat().st_size
+        self._total = sum(self._index.values())
+
+    # ==================== عملیات فایل (در thread) ====================
+
+    def _read(self, slug: str) -> Optional[CachedProfile]:
+        self._load_index()
+        path = self.directory / self._filename(slug)
+        if path.name not in self._index:
+            return None
+        try:
+            entry = CachedProfile(**json.loads(path.read_bytes()))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"⚠️ ورودی خراب کش پروفایل حذف شد ({slug}): {e}")
+            self._remove(path.name)
+            return None
+        os.utime(path)  # زمان آخرین استفاده برای LRU
+        return entry
+
+    def _write(self, entry: CachedProfile):
+        self._load_index()
+        path = self.directory / self._filename(entry.slug)
+        data = json.dumps(asdict(entry), ensure_ascii=False).encode()
+        tmp = path.with_suffix('.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)  # جایگزینی اتمی
+        self._total += len(data) - self._index.get(path.name, 0)
+        self._index[path.name] = len(data)
+        self._evict(keep=path.name)
+
+    def _remove(self, name: str):
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+        self._total -= self._index.pop(name, 0)
+
+    def _evict(self, keep: str):
+        if self._total <= self.max_bytes:
+            return
+        by_age = sorted(
+            (name for name in self._index if name != keep),
+            key=lambda name: (self.directory / name).stat().st_mtime if (self.directory / name).exists() else 0,
+        )
+        for name in by_age:
+            if self._total <= self.max_bytes:
+                break
+            self._remove(name)
+            self._evictions.inc()
+
+    # ==================== رابط async ====================
+
+    async def get(self, slug: str) -> Optional[CachedProfile]:
+        async with self._lock:
+            return await run_blocking(self._read, slug)
+
+    async def put(self, entry: CachedProfile):
+        async with self._lock:
+            try:
+                await run_blocking(self._write, entry)
+            except OSError as e:
+                # کش اختیاری است؛ خطای دیسک نباید استخراج را خراب کند
+                logger.warning(f"⚠️ خطا در نوشتن کش پروفایل: {e}")
+
+    def record_hit(self, entry: CachedProfile, not_modified: bool):
+        """پروفایل تغییری نکرده (304 یا هش یکسان)"""
+        self._hits.inc()
+        if not_modified:
+            self._not_modified.inc()
+            self._bytes_saved.inc(entry.page_bytes)
+
+    def record_miss(self):
+        self._misses.inc()
+
+    def get_stats(self) -> Dict:
+        hits, misses = self._hits.value, self._misses.value
+        return {
+            'entries': len(self._index) if self._index is not None else None,
+            'bytes': self._total,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'not_modified': self._not_modified.value,
+            'bytes_saved': self._bytes_saved.value,
+            'evictions': self._evictions.value,
+        }
@@ -0,0 +1,17 @@
+# هماهنگی چند نمونه برنامه (تقسیم کار با اجاره shard)
+__all__ = ['LeaseManager', 'shard_of', 'HashRing', 'WorkerSupervisor']
+
+def __getattr__(name):
+    if name == 'LeaseManager':
+        from .leases import LeaseManager
+        return LeaseManager
+    elif name == 'shard_of':
+        from .leases import shard_of
+        return shard_of
+    elif name == 'HashRing':
+        from .hashring import HashRing
+        return HashRing
+    elif name == 'WorkerSupervisor':
+        from .supervisor import WorkerSupervisor
+        return WorkerSupervisor
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -0,0 +1,45 @@
+"""
+حلقه هش سازگار (consistent hashing) برای تقسیم دکترها بین workerها
+"""
+import bisect
+import hashlib
+from typing import Dict, Hashable, Iterable, List
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    نگاشت پایدار کلید به گره
+
+    با افزودن یا حذف یک گره فقط حدود 1/N کلیدها جابه‌جا می‌شوند.
+    """
+
+    def __init__(self, nodes: Iterable[Hashable], replicas: int = 64):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, Hashable] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: Hashable):
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: Hashable):
+        points = [point for point, owner in self._owners.items() if owner == node]
+        for point in points:
+            del self._owners[point]
+        self._points = sorted(self._owners)
+
+    def node_for(self, key: Hashable) -> Hashable:
+        if not self._points:
+            raise LookupError("حلقه هش خالی است")
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[self._points[index]]
@@ -0,0 +1,215 @@
+"""
+تقسیم اهداف بررسی بین چند نمونه برنامه با اجاره shard در دیتابیس
+
+هر دکتر با doctor_id % num_shards به یک shard تعلق دارد. هر نمونه با heartbeat
+حضورش را در cluster_members ثبت می‌کند و به اندازه سهم منصفانه‌اش
+(ceil(num_shards / تعداد نمونه‌های زنده)) shard اجاره می‌کند. اجاره‌ای که تمدید
+نشود منقضی می‌شود و نمونه‌های دیگر آن را برمی‌دارند؛ نمونه‌ای که بیش از سهمش
+دارد، مازاد را آزاد می‌کند تا نمونه تازه‌وارد بتواند آن را بگیرد.
+"""
+import asyncio
+import math
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from sqlalchemy import select, update, delete, or_
+
+from src.database.models import ShardLease, ClusterMember
+from src.database.outbox import insert_ignore
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("Cluster")
+
+
+def shard_of(doctor_id: int, num_shards: int) -> int:
+    """shard یک دکتر (قابل محاسبه در SQL با عملگر %)"""
+    return doctor_id % num_shards
+
+
+class LeaseManager:
+    """مدیریت اجاره shardهای این نمونه"""
+
+    def __init__(self, db_manager, instance_id: Optional[str] = None, num_shards: int = 64,
+                 lease_ttl: float = 30.0, heartbeat_interval: float = 10.0):
+        if heartbeat_interval * 2 > lease_ttl:
+            raise ValueError("lease_ttl باید حداقل دو برابر heartbeat_interval باشد")
+        self.db_manager = db_manager
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.num_shards = num_shards
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+
+        self._owned: Set[int] = set()
+        self._valid_until = 0.0  # پایان اعتبار محلی اجاره‌ها (monotonic)
+        self._members = 1
+        self._task: Optional[asyncio.Task] = None
+
+        self._claimed = metrics.counter('cluster.shards_claimed')
+        self._released = metrics.counter('cluster.shards_released')
+        self._lost = metrics.counter('cluster.shards_lost')
+        self._owned_gauge = metrics.gauge('cluster.shards_owned')
+
+    async def start(self):
+        """ثبت shardها، اولین اجاره و شروع heartbeat"""
+        await self.db_manager.run_write(self._ensure_shards)
+        await self.tick()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(
+            f"🧩 نمونه {self.instance_id}: {len(self._owned)}/{self.num_shards} shard "
+            f"({self._members} نمونه فعال)"
+        )
+
+    async def stop(self):
+        """آزاد کردن اجاره‌ها تا نمونه‌های دیگر بلافاصله آن‌ها را بگیرند"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.db_manager.run_write(self._leave)
+        except Exception as e:
+            logger.warning(f"⚠️ خطا در آزادسازی اجاره‌ها: {e}")
+        self._owned = set()
+        self._owned_gauge.set(0)
+
+    def owned_shards(self) -> Set[int]:
+        """shardهای معتبر این نمونه؛ اگر heartbeat عقب بیفتد مجموعه خالی است"""
+        if time.monotonic() >= self._valid_until:
+            return set()
+        return set(self._owned)
+
+    def owns(self, doctor_id: int) -> bool:
+        return shard_of(doctor_id, self.num_shards) in self.owned_shards()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ خطا در heartbeat اجاره‌ها: {e}")
+
+    async def tick(self):
+        """یک دور heartbeat: تمدید، آزادسازی مازاد و اجاره shardهای آزاد"""
+        started = time.monotonic()
+        before = set(self._owned)
+        owned = await self.db_manager.run_write(self._rebalance)
+        self._owned = owned
+        self._valid_until = started + self.lease_ttl
+        self._owned_gauge.set(len(owned))
+
+        if owned != before:
+            gained, lost = owned - before, before - owned
+            logger.info(
+                f"🧩 shardها: {len(owned)} (+{len(gained)} / -{len(lost)}) "
+                f"برای {self._members} نمونه فعال"
+            )
+
+    async def _ensure_shards(self, session):
+        stmt = insert_ignore(self.db_manager.engine.dialect.name, ShardLease, ['shard'])
+        await session.execute(stmt, [
+            {'shard': shard, 'owner': None, 'expires_at': None, 'generation': 0}
+            for shard in range(self.num_shards)
+        ])
+
+    async def _rebalance(self, session) -> Set[int]:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+
+        # heartbeat عضویت
+        result = await session.execute(
+            update(ClusterMember)
+            .where(ClusterMember.instance_id == self.instance_id)
+            .values(heartbeat_at=now)
+        )
+        if not result.rowcount:
+            session.add(ClusterMember(
+                instance_id=self.instance_id, hostname=socket.gethostname(),
+                started_at=now, heartbeat_at=now
+            ))
+            await session.flush()
+
+        alive_after = now - timedelta(seconds=self.lease_ttl)
+        members = (await session.execute(
+            select(ClusterMember.instance_id).filter(ClusterMember.heartbeat_at > alive_after)
+        )).scalars().all()
+        self._members = max(1, len(members))
+        await session.execute(
+            delete(ClusterMember).where(ClusterMember.heartbeat_at < now - timedelta(seconds=self.lease_ttl * 10))
+        )
+
+        # تمدید اجاره‌های فعلی؛ اجاره‌ای که در این فاصله گرفته شده از دست رفته است
+        await session.execute(
+            update(ShardLease)
+            .where(ShardLease.owner == self.instance_id, ShardLease.expires_at > now)
+            .values(expires_at=expires_at)
+        )
+        owned = set((await session.execute(
+            select(ShardLease.shard).filter(
+                ShardLease.owner == self.instance_id, ShardLease.expires_at > now
+            )
+        )).scalars().all())
+        lost = self._owned - owned
+        if lost:
+            self._lost.inc(len(lost))
+            logger.warning(f"⚠️ اجاره {len(lost)} shard از دست رفت")
+
+        target = math.ceil(self.num_shards / self._members)
+
+        if len(owned) > target:
+            # آزادسازی مازاد برای نمونه‌های تازه‌وارد
+            extra = sorted(owned)[target:]
+            await session.execute(
+                update(ShardLease)
+                .where(ShardLease.shard.in_(extra), ShardLease.owner == self.instance_id)
+                .values(owner=None, expires_at=None)
+            )
+            owned -= set(extra)
+            self._released.inc(len(extra))
+
+        elif len(owned) < target:
+            free = (await session.execute(
+                select(ShardLease.shard)
+                .filter(or_(ShardLease.owner.is_(None), ShardLease.expires_at <= now))
+                .order_by(ShardLease.shard)
+                .limit(target - len(owned))
+            )).scalars().all()
+            for shard in free:
+                # compare-and-set: فقط اگر هنوز آزاد یا منقضی باشد
+                result = await session.execute(
+                    update(ShardLease)
+                    .where(
+                        ShardLease.shard == shard,
+                        or_(ShardLease.owner.is_(None), ShardLease.expires_at <= now)
+                    )
+                    .values(
+                        owner=self.instance_id,
+                        expires_at=expires_at,
+                        generation=ShardLease.generation + 1
+                    )
+                )
+                if result.rowcount:
+                    owned.add(shard)
+                    self._claimed.inc()
+
+        return owned
+
+    async def _leave(self, session):
+        await session.execute(
+            update(ShardLease)
+            .where(ShardLease.owner == self.instance_id)
+            .values(owner=None, expires_at=None)
+        )
+        await session.execute(
+            delete(ClusterMember).where(ClusterMember.instance_id == self.instance_id)
+        )
@@ -0,0 +1,120 @@
+"""
+حالت چند پردازه‌ای: ربات تلگرام در پردازه اصلی و بررسی نوبت‌ها در workerهای جدا
+
+هر worker با حلقه هش سازگار سهم خودش از دکترها را بررسی می‌کند و نوبت‌های
+پیدا شده را به صورت رویداد از طریق یک صف IPC محلی به پردازه ربات می‌فرستد.
+"""
+import asyncio
+import multiprocessing as mp
+import queue
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("Supervisor")
+
+SlotEvent = Dict  # {'worker', 'doctor_id', 'found_at', 'appointments': [dict]} یا {'type': 'round', 'worker', 'found_at'}
+
+
+class WorkerSupervisor:
+    """راه‌اندازی، پایش و راه‌اندازی مجدد workerهای بررسی نوبت"""
+
+    def __init__(self, num_workers: int = 2, hash_replicas: int = 64,
+                 queue_size: int = 10000, restart_delay: float = 5.0,
+                 config_path: str = "config/config.yaml",
+                 lease_owner: Optional[str] = None, num_shards: int = 64):
+        self.num_workers = max(1, num_workers)
+        self.hash_replicas = hash_replicas
+        self.queue_size = queue_size
+        self.restart_delay = restart_delay
+        self.config_path = config_path
+        self.lease_owner = lease_owner  # شناسه نمونه در حالت cluster؛ workerها فقط shardهای آن را بررسی می‌کنند
+        self.num_shards = num_shards
+
+        self._ctx = mp.get_context('spawn')  # fork با event loop و اتصال‌های باز امن نیست
+        self.events: Optional[mp.Queue] = None
+        self._stop_event = None
+        self._processes: Dict[int, mp.Process] = {}
+        self._died_at: Dict[int, float] = {}
+
+        self._events_received = metrics.counter('supervisor.events_received')
+        self._restarts = metrics.counter('supervisor.worker_restarts')
+        self._event_lag = metrics.histogram('supervisor.event_lag_seconds')
+
+    def start(self):
+        self.events = self._ctx.Queue(maxsize=self.queue_size)
+        self._stop_event = self._ctx.Event()
+        for index in range(self.num_workers):
+            self._spawn(index)
+        logger.info(f"🧵 {self.num_workers} worker بررسی نوبت راه‌اندازی شد")
+
+    def _spawn(self, index: int):
+        from src.cluster.workers import poller_main
+        process = self._ctx.Process(
+            target=poller_main,
+            args=(index, self.num_workers, self.hash_replicas, self.events, self._stop_event, self.config_path,
+                  self.lease_owner, self.num_shards),
+            name=f"slothunter-poller-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _check_workers(self):
+        """راه‌اندازی مجدد workerهایی که از کار افتاده‌اند (با تاخیر)"""
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive() or self._stop_event.is_set():
+                continue
+            died_at = self._died_at.setdefault(index, now)
+            if now - died_at < self.restart_delay:
+                continue
+            logger.warning(f"⚠️ worker {index} متوقف شده بود (کد {process.exitcode})، راه‌اندازی مجدد")
+            self._died_at.pop(index, None)
+            self._restarts.inc()
+            self._spawn(index)
+
+    def _get_event(self, timeout: float) -> Optional[SlotEvent]:
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def consume(self, handler: Callable[[SlotEvent], Awaitable[None]]):
+        """دریافت رویدادهای workerها و تحویل به handler تا زمان توقف"""
+        loop = asyncio.get_running_loop()
+        while not self._stop_event.is_set():
+            event = await loop.run_in_executor(None, self._get_event, 1.0)
+            self._check_workers()
+            if event is None:
+                continue
+            self._events_received.inc()
+            self._event_lag.observe(max(0.0, time.time() - event.get('found_at', time.time())))
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"❌ خطا در پردازش رویداد دکتر {event.get('doctor_id')}: {e}")
+
+    async def stop(self, timeout: float = 10.0):
+        if self._stop_event is None:
+            return
+        self._stop_event.set()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            await loop.run_in_executor(None, process.join, max(0.1, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._processes.clear()
+        logger.info("🛑 workerهای بررسی نوبت متوقف شدند")
+
+    def get_stats(self) -> Dict:
+        return {
+            'workers': self.num_workers,
+            'alive': sum(1 for process in self._processes.values() if process.is_alive()),
+            'events_received': self._events_received.value,
+            'restarts': self._restarts.value,
+            'event_lag': self._event_lag.summary(),
+        }
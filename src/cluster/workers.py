@@ -0,0 +1,182 @@
+"""
+پردازه worker بررسی نوبت در حالت supervisor
+"""
+import asyncio
+import queue
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Set
+
+import httpx
+from sqlalchemy import select
+
+from src.cluster.hashring import HashRing
+from src.cluster.leases import shard_of
+from src.database.database import DatabaseManager
+from src.database.models import ShardLease
+from src.main import SlotHunter
+from src.utils.config import Config
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("Worker")
+
+
+class LeaseView:
+    """
+    نمای فقط‌خواندنی اجاره‌های نمونه اصلی برای worker
+
+    اجاره‌ها را پردازه اصلی (LeaseManager) تمدید می‌کند؛ worker فقط هر
+    refresh_interval ثانیه shardهای معتبر آن نمونه را از دیتابیس می‌خواند.
+    با همان رابط LeaseManager (num_shards، owned_shards، owns) در monitor_loop
+    استفاده می‌شود.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, owner: str, num_shards: int,
+                 refresh_interval: float = 5.0):
+        self.db_manager = db_manager
+        self.owner = owner
+        self.num_shards = num_shards
+        self.refresh_interval = refresh_interval
+        self._owned: Set[int] = set()
+        self._valid_until: Optional[datetime] = None  # زودترین انقضای اجاره‌های خوانده‌شده
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # تا انقضای اجاره‌های خوانده‌شده همان مجموعه معتبر می‌ماند
+                logger.warning(f"⚠️ خطا در خواندن اجاره‌ها: {e}")
+
+    async def refresh(self):
+        now = datetime.utcnow()
+        async with self.db_manager.session_scope() as session:
+            rows = (await session.execute(
+                select(ShardLease.shard, ShardLease.expires_at)
+                .filter(ShardLease.owner == self.owner, ShardLease.expires_at > now)
+            )).all()
+        self._owned = {row.shard for row in rows}
+        self._valid_until = min((row.expires_at for row in rows), default=None)
+
+    def owned_shards(self) -> Set[int]:
+        if self._valid_until is None or datetime.utcnow() >= self._valid_until:
+            return set()
+        return set(self._owned)
+
+    def owns(self, doctor_id: int) -> bool:
+        return shard_of(doctor_id, self.num_shards) in self.owned_shards()
+
+
+class PollerWorker(SlotHunter):
+    """نوبت‌یاب بدون ربات: فقط دکترهای سهم خود را بررسی و نتیجه را به صف می‌فرستد"""
+
+    def __init__(self, db_manager: DatabaseManager, index: int, ring: HashRing, events, stop_event,
+                 config: Optional[Config] = None, leases: Optional[LeaseView] = None):
+        self.index = index  # پیش از super().__init__ برای نام فایل لاگ
+        super().__init__(db_manager, config)
+        self.ring = ring
+        self.events = events
+        self.stop_event = stop_event
+        self.leases = leases
+        self._dropped = metrics.counter('worker.events_dropped')
+
+    def _log_file(self, path: Optional[str]) -> Optional[str]:
+        # هر پردازه فایل خودش را rotate می‌کند؛ چرخاندن یک فایل مشترک از چند پردازه
+        # باعث می‌شود بقیه در فایل چرخیده‌شده بنویسند و خطوط گم شوند
+        if not path:
+            return None
+        path = Path(path)
+        return str(path.with_name(f"{path.stem}.worker-{self.index}{path.suffix}"))
+
+    async def _reconcile_counters(self):
+        pass  # اصلاح شمارنده‌ها با maintenance_loop پردازه اصلی است
+
+    def owns(self, doctor_id: int) -> bool:
+        return self.ring.node_for(doctor_id) == self.index and super().owns(doctor_id)
+
+    def _emit(self, event: dict) -> bool:
+        """ارسال بدون انتظار؛ صف پر نباید حلقه بررسی و کلاینت HTTP را متوقف کند"""
+        try:
+            self.events.put_nowait(event)
+            return True
+        except queue.Full:
+            self._dropped.inc()
+            return False
+
+    async def publish_alert(self, doctor, appointments):
+        sent = self._emit({
+            'worker': self.index,
+            'doctor_id': doctor.id,
+            'found_at': time.time(),
+            'appointments': [asdict(apt) for apt in appointments],
+        })
+        if not sent:
+            # دور بعدی بررسی همین نوبت‌ها را دوباره پیدا می‌کند
+            self.logger.warning(
+                f"⚠️ صف رویدادها پر است؛ نوبت‌های {doctor.name} حذف شد ({self._dropped.value} مورد تا کنون)"
+            )
+
+    def _round_finished(self):
+        super()._round_finished()
+        self._emit({'type': 'round', 'worker': self.index, 'found_at': time.time()})
+
+    async def run(self):
+        await self.db_manager._setup_database()
+        if self.leases:
+            await self.leases.start()
+        self.running = True
+        self.http_client = httpx.AsyncClient(timeout=self.config.api_timeout)
+        self.logger.info(f"🧵 worker {self.index} شروع شد")
+
+        monitor = asyncio.create_task(self.monitor_loop())
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.stop_event.wait)
+        finally:
+            self.running = False
+            monitor.cancel()
+            try:
+                await monitor
+            except asyncio.CancelledError:
+                pass
+            if self.leases:
+                await self.leases.stop()
+            await self.http_client.aclose()
+            await self.db_manager.close()
+            self.logger.info(f"🛑 worker {self.index} متوقف شد")
+
+
+def poller_main(index: int, num_workers: int, hash_replicas: int, events, stop_event,
+                config_path: str = "config/config.yaml", lease_owner: Optional[str] = None,
+                num_shards: int = 64):
+    """نقطه ورود پردازه worker"""
+    config = Config(config_path)
+    # worker فقط می‌خواند؛ صف نوشتن تنها در پردازه اصلی اجرا می‌شود تا نویسنده SQLite یکی بماند
+    settings = config.database_settings.model_copy(update={'write_queue': False})
+    db_manager = DatabaseManager(config.database_url, settings)
+    ring = HashRing(range(num_workers), replicas=hash_replicas)
+    leases = LeaseView(db_manager, lease_owner, num_shards) if lease_owner else None
+    worker = PollerWorker(db_manager, index, ring, events, stop_event, config=config, leases=leases)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
@@ -1,4 +1,4 @@
-from .models import Base, User, Doctor, Subscription, AppointmentLog
+from .models import Base, User, Doctor, Subscription, AppointmentLog, NotificationOutbox, ShardLease, ClusterMember
 from .database import DatabaseManager, db_session
 
-__all__ = ['Base', 'User', 'Doctor', 'Subscription', 'AppointmentLog', 'DatabaseManager', 'db_session']
\ No newline at end of file
+__all__ = ['Base', 'User', 'Doctor', 'Subscription', 'AppointmentLog', 'NotificationOutbox', 'ShardLease', 'ClusterMember', 'DatabaseManager', 'db_session']
\ No newline at end of file
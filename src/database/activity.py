@@ -0,0 +1,155 @@
+"""
+بافر نوشتن‌تأخیری (write-behind) برای پروفایل و فعالیت کاربران
+
+هر تعامل کاربر (/start، پیام، دکمه) فقط در حافظه ثبت می‌شود؛ چند تعامل یک
+کاربر در یک رکورد ادغام می‌شوند و هر چند ثانیه (یا با رسیدن به سقف تعداد)
+در یک UPDATE دسته‌ای نوشته می‌شوند. هنگام توقف، باقی‌مانده بافر نوشته می‌شود.
+
+بافر فقط کاربران موجود را به‌روز می‌کند؛ ساخت کاربر تنها با /start است، پس
+تعامل کسی که هنوز /start نزده ردیفی نمی‌سازد.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, update
+
+from .models import User
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("UserActivity")
+
+PROFILE_FIELDS = ('username', 'first_name', 'last_name', 'last_activity')
+
+
+def update_users():
+    """UPDATE پروفایل و زمان فعالیت بر اساس telegram_id (executemany؛ بدون ساخت کاربر)"""
+    table = User.__table__
+    # نام پارامترها نباید با نام ستون‌ها یکی باشد
+    return (
+        update(table)
+        .where(table.c.telegram_id == bindparam('b_telegram_id'))
+        .values({name: bindparam(f'b_{name}') for name in PROFILE_FIELDS})
+    )
+
+
+class UserActivityBuffer:
+    """ادغام به‌روزرسانی‌های کاربران در حافظه و نوشتن دسته‌ای"""
+
+    def __init__(self, db_manager, flush_interval: float = 5.0,
+                 max_pending: int = 500, chunk_size: int = 200):
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self._pending: Dict[int, dict] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._recorded = metrics.counter('activity.recorded')
+        self._coalesced = metrics.counter('activity.coalesced')
+        self._flushed = metrics.counter('activity.rows_flushed')
+        self._flush_errors = metrics.counter('activity.flush_errors')
+        self._flush_time = metrics.histogram('activity.flush_seconds')
+        self._depth = metrics.gauge('activity.pending')
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, telegram_user, seen_at: Optional[datetime] = None):
+        """ثبت تعامل یک کاربر تلگرام (بدون دسترسی به دیتابیس)"""
+        if telegram_user is None:
+            return
+        self._recorded.inc()
+        if telegram_user.id in self._pending:
+            self._coalesced.inc()
+        self._pending[telegram_user.id] = {
+            'telegram_id': telegram_user.id,
+            'username': telegram_user.username,
+            'first_name': telegram_user.first_name,
+            'last_name': telegram_user.last_name,
+            'last_activity': seen_at or datetime.utcnow(),
+        }
+        self._depth.set(len(self._pending))
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """توقف حلقه و نوشتن باقی‌مانده بافر"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"❌ {len(self._pending)} به‌روزرسانی کاربر هنگام توقف نوشته نشد: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ خطا در نوشتن فعالیت کاربران: {e}")
+
+    async def flush(self) -> int:
+        """نوشتن همه رکوردهای بافر در UPDATEهای دسته‌ای"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            rows, self._pending = list(self._pending.values()), {}
+            self._depth.set(0)
+
+            started = time.perf_counter()
+            try:
+                await self.db_manager.run_write(lambda session: self._write(session, rows))
+            except Exception:
+                self._flush_errors.inc()
+                self._restore(rows)
+                raise
+            self._flush_time.observe(time.perf_counter() - started)
+            self._flushed.inc(len(rows))
+            logger.debug(f"👥 فعالیت {len(rows)} کاربر نوشته شد")
+            return len(rows)
+
+    async def _write(self, session, rows: List[dict]):
+        stmt = update_users()
+        params = [{f'b_{name}': value for name, value in row.items()} for row in rows]
+        for i in range(0, len(params), self.chunk_size):
+            await session.execute(stmt, params[i:i + self.chunk_size])
+
+    def _restore(self, rows: List[dict]):
+        """برگرداندن رکوردهای ناموفق به بافر بدون بازنویسی تعامل‌های جدیدتر"""
+        for row in rows:
+            self._pending.setdefault(row['telegram_id'], row)
+        self._depth.set(len(self._pending))
+
+    def get_stats(self) -> Dict:
+        return {
+            'pending': len(self._pending),
+            'recorded': self._recorded.value,
+            'coalesced': self._coalesced.value,
+            'rows_flushed': self._flushed.value,
+            'flush_errors': self._flush_errors.value,
+            'flush_p95': round(self._flush_time.percentile(95), 4),
+        }
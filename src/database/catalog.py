@@ -0,0 +1,170 @@
+"""
+مدل‌های خواندنی کاتالوگ دکترها برای منوهای ربات
+
+لیست دکترهای فعال (فقط ستون‌های موردنیاز دکمه‌ها) و کارت هر دکتر یک بار از
+دیتابیس ساخته و در حافظه نگه داشته می‌شوند. صفحه‌بندی keyset روی شناسه دکتر
+است (بعد از / قبل از یک شناسه)، پس صفحه‌ها با اضافه شدن دکتر جابه‌جا نمی‌شوند.
+هر تغییر دکتر نسخه کاتالوگ را بالا می‌برد و مدل‌های قدیمی کنار گذاشته می‌شوند؛
+max_age تغییرات پردازه‌ها و نمونه‌های دیگر را پوشش می‌دهد.
+"""
+import asyncio
+import bisect
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from .models import Doctor
+from src.utils.metrics import metrics
+
+
+@dataclass(frozen=True)
+class DoctorSummary:
+    """یک سطر لیست دکترها"""
+    id: int
+    name: str
+    specialty: Optional[str]
+
+
+@dataclass(frozen=True)
+class CenterSummary:
+    name: str
+    address: Optional[str]
+    phone: Optional[str]
+
+
+@dataclass(frozen=True)
+class DoctorCard:
+    """اطلاعات ثابت کارت یک دکتر"""
+    id: int
+    name: str
+    specialty: Optional[str]
+    slug: str
+    is_active: bool
+    centers: Tuple[CenterSummary, ...]
+
+
+@dataclass(frozen=True)
+class DoctorPage:
+    """یک صفحه از لیست دکترها با نشانگرهای keyset"""
+    doctors: Tuple[DoctorSummary, ...]
+    total: int
+    start: int  # شماره ترتیبی اولین دکتر صفحه (از ۱)
+    before_id: Optional[int]  # نشانگر صفحه قبل؛ None یعنی صفحه اول
+    after_id: Optional[int]  # نشانگر صفحه بعد؛ None یعنی صفحه آخر
+    version: int
+
+
+class DoctorCatalog:
+    """لیست و کارت‌های دکترها با نسخه‌بندی و invalidate روی تغییرات"""
+
+    def __init__(self, db_manager, max_age: float = 300.0):
+        self.db_manager = db_manager
+        self.max_age = max_age
+        self.version = 0
+        self._doctors: Optional[Tuple[DoctorSummary, ...]] = None
+        self._ids: Tuple[int, ...] = ()  # شناسه‌های مرتب برای جستجوی دودویی نشانگرها
+        self._loaded_at = float('-inf')
+        self._cards: Dict[int, Tuple[DoctorCard, float]] = {}
+        self._lock = asyncio.Lock()
+
+        self._hits = metrics.counter('catalog.hits')
+        self._loads = metrics.counter('catalog.loads')
+
+    def invalidate(self, doctor_id: Optional[int] = None):
+        """تغییر یک دکتر (یا کل کاتالوگ در صورت None)"""
+        self.version += 1
+        self._doctors = None
+        if doctor_id is None:
+            self._cards.clear()
+        else:
+            self._cards.pop(doctor_id, None)
+
+    @property
+    def _list_fresh(self) -> bool:
+        return self._doctors is not None and time.monotonic() - self._loaded_at < self.max_age
+
+    async def _summaries(self) -> Tuple[Tuple[DoctorSummary, ...], Tuple[int, ...]]:
+        if self._list_fresh:
+            self._hits.inc()
+            return self._doctors, self._ids
+        async with self._lock:
+            if self._list_fresh:
+                return self._doctors, self._ids  # درخواست همزمان دیگری بارگذاری کرده است
+            version = self.version
+            self._loads.inc()
+            async with self.db_manager.session_scope() as session:
+                rows = (await session.execute(
+                    select(Doctor.id, Doctor.name, Doctor.specialty)
+                    .filter(Doctor.is_active == True)
+                    .order_by(Doctor.id)
+                )).all()
+            doctors = tuple(DoctorSummary(row.id, row.name, row.specialty) for row in rows)
+            ids = tuple(doctor.id for doctor in doctors)
+            if version == self.version:  # در حین بارگذاری تغییری ثبت نشده است
+                self._doctors, self._ids = doctors, ids
+                self._loaded_at = time.monotonic()
+            return doctors, ids
+
+    async def page(self, limit: int, after_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> DoctorPage:
+        """صفحه‌ای از دکترهای فعال بعد از after_id یا قبل از before_id"""
+        doctors, ids = await self._summaries()
+        if before_id is not None:
+            end = bisect.bisect_left(ids, before_id)
+            start = max(0, end - limit)
+        else:
+            start = bisect.bisect_right(ids, after_id) if after_id is not None else 0
+            end = min(len(ids), start + limit)
+        chunk = doctors[start:end]
+        return DoctorPage(
+            doctors=chunk,
+            total=len(doctors),
+            start=start + 1,
+            before_id=chunk[0].id if chunk and start > 0 else None,
+            after_id=chunk[-1].id if chunk and end < len(doctors) else None,
+            version=self.version,
+        )
+
+    async def card(self, doctor_id: int) -> Optional[DoctorCard]:
+        """کارت یک دکتر؛ None اگر دکتر وجود نداشته باشد"""
+        entry = self._cards.get(doctor_id)
+        if entry is not None and time.monotonic() - entry[1] < self.max_age:
+            self._hits.inc()
+            return entry[0]
+
+        version = self.version
+        self._loads.inc()
+        async with self.db_manager.session_scope() as session:
+            doctor = (await session.execute(
+                select(Doctor)
+                .options(selectinload(Doctor.centers))
+                .filter(Doctor.id == doctor_id)
+            )).scalar_one_or_none()
+            if doctor is None:
+                return None
+            card = DoctorCard(
+                id=doctor.id,
+                name=doctor.name,
+                specialty=doctor.specialty,
+                slug=doctor.slug,
+                is_active=bool(doctor.is_active),
+                centers=tuple(
+                    CenterSummary(center.center_name, center.center_address, center.center_phone)
+                    for center in doctor.centers
+                ),
+            )
+        if version == self.version:
+            self._cards[doctor_id] = (card, time.monotonic())
+        return card
+
+    def get_stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'doctors': len(self._doctors) if self._doctors is not None else None,
+            'cards': len(self._cards),
+            'hits': self._hits.value,
+            'loads': self._loads.value,
+        }
@@ -0,0 +1,85 @@
+"""
+نگهداری شمارنده active_subscriber_count دکترها
+
+شمارنده در همان تراکنشی که اشتراک تغییر می‌کند به‌روز می‌شود؛ reconcile
+به‌صورت دوره‌ای آن را با شمارش واقعی مقایسه و اصلاح می‌کند.
+"""
+from typing import Dict
+
+from sqlalchemy import select, update, func, case
+
+from .models import Doctor, Subscription, User
+from src.utils.logger import get_logger
+
+logger = get_logger("Counters")
+
+
+async def adjust_subscriber_count(session, doctor_id: int, delta: int):
+    """تغییر اتمیک شمارنده یک دکتر (داخل تراکنش جاری)"""
+    await session.execute(
+        update(Doctor)
+        .where(Doctor.id == doctor_id)
+        .values(active_subscriber_count=case(
+            (Doctor.active_subscriber_count + delta < 0, 0),
+            else_=Doctor.active_subscriber_count + delta
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def decrement_for_users(session, user_ids_subquery):
+    """
+    کم کردن شمارنده دکترها برای اشتراک‌های فعال کاربرانی که غیرفعال می‌شوند
+
+    باید قبل از غیرفعال کردن اشتراک‌ها و در همان تراکنش صدا زده شود.
+    """
+    result = await session.execute(
+        select(Subscription.doctor_id, func.count(Subscription.id))
+        .join(User, User.id == Subscription.user_id)
+        .filter(
+            Subscription.user_id.in_(user_ids_subquery),
+            Subscription.is_active == True,
+            User.is_active == True
+        )
+        .group_by(Subscription.doctor_id)
+    )
+    for doctor_id, count in result.all():
+        await adjust_subscriber_count(session, doctor_id, -count)
+
+
+async def actual_subscriber_counts(session) -> Dict[int, int]:
+    result = await session.execute(
+        select(Subscription.doctor_id, func.count(Subscription.id))
+        .join(User, User.id == Subscription.user_id)
+        .filter(Subscription.is_active == True, User.is_active == True)
+        .group_by(Subscription.doctor_id)
+    )
+    return dict(result.all())
+
+
+async def reconcile_subscriber_counts(db_manager) -> int:
+    """
+    اصلاح شمارنده‌هایی که با شمارش واقعی فرق دارند
+
+    Returns:
+        تعداد دکترهای اصلاح‌شده
+    """
+    async def _reconcile(session) -> int:
+        actual = await actual_subscriber_counts(session)
+        stored = dict((await session.execute(
+            select(Doctor.id, Doctor.active_subscriber_count)
+        )).all())
+        fixed = 0
+        for doctor_id, count in stored.items():
+            expected = actual.get(doctor_id, 0)
+            if (count or 0) != expected:
+                await session.execute(
+                    update(Doctor).where(Doctor.id == doctor_id).values(active_subscriber_count=expected)
+                )
+                fixed += 1
+        return fixed
+
+    fixed = await db_manager.run_write(_reconcile)
+    if fixed:
+        logger.warning(f"⚠️ شمارنده مشترکین {fixed} دکتر اصلاح شد")
+    return fixed
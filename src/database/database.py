@@ -2,46 +2,173 @@
 مدیریت دیتابیس
 """
 import os
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Optional, TypeVar
 
 from .models import Base
+from .writer import WriteQueue
+from .stats import StatsSnapshot
+from .activity import UserActivityBuffer
+from .identity import IdentityCache
+from .catalog import DoctorCatalog
+from .search import DoctorSearchIndex
 from src.utils.logger import get_logger
+from src.utils.metrics import metrics
 
 logger = get_logger("Database")
 
 
-from src.utils.config import Config
+from src.utils.config import Config, DatabaseConfig
+
+T = TypeVar('T')
+
+# گزینه اجرای اختصاصی برای شروع تراکنش با BEGIN IMMEDIATE
+SQLITE_IMMEDIATE = 'sqlite_immediate'
+
+# درایور async هر دیالکت
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    تبدیل آدرس دیتابیس به درایور async
+
+    postgres:// و postgresql:// به postgresql+asyncpg و sqlite:// به sqlite+aiosqlite تبدیل می‌شوند.
+    """
+    if database_url.startswith("postgres://"):
+        database_url = "postgresql://" + database_url[len("postgres://"):]
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver:
+        url = url.set(drivername=driver)
+    return url.render_as_string(hide_password=False)
+
+
+def _install_sqlite_profile(engine, settings: DatabaseConfig):
+    """اعمال pragmaهای SQLite روی هر اتصال و کنترل دستی BEGIN"""
+    lock_wait = metrics.histogram('db.lock_wait_seconds')
+    pragmas = {
+        'journal_mode': settings.sqlite_journal_mode,
+        'synchronous': settings.sqlite_synchronous,
+        'busy_timeout': settings.sqlite_busy_timeout_ms,
+        'cache_size': -abs(settings.sqlite_cache_size_kb),  # مقدار منفی یعنی کیلوبایت
+        'mmap_size': settings.sqlite_mmap_size_mb * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    }
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # درایور sqlite3 خودش BEGIN نمی‌فرستد تا savepoint و BEGIN IMMEDIATE درست کار کنند
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _on_begin(conn):
+        if conn.get_execution_options().get(SQLITE_IMMEDIATE):
+            # قفل نوشتن از ابتدای تراکنش؛ زمان انتظار برای قفل اندازه‌گیری می‌شود
+            started = time.perf_counter()
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            lock_wait.observe(time.perf_counter() - started)
+        else:
+            conn.exec_driver_sql("BEGIN")
+
 
 class DatabaseManager:
     """مدیر دیتابیس"""
     
-    def __init__(self, database_url: str = None):
-        if database_url is None:
+    def __init__(self, database_url: str = None, settings: Optional[DatabaseConfig] = None):
+        if database_url is None or settings is None:
             # خواندن از کانفیگ
-            database_url = Config().database_url
+            config = Config()
+            database_url = database_url or config.database_url
+            settings = settings or config.database_settings
         
-        self.database_url = database_url
+        self.database_url = async_database_url(database_url)
+        self.settings = settings
         self.engine = None
         self.SessionLocal = None
+        self.writer: Optional[WriteQueue] = None
+        self.stats = StatsSnapshot(self)  # آمار تجمیعی برای داشبورد ادمین
+        self.activity = UserActivityBuffer(
+            self,
+            flush_interval=settings.activity_flush_interval,
+            max_pending=settings.activity_max_pending,
+        )
+        self.identities = IdentityCache(
+            self,
+            max_size=settings.identity_cache_size,
+            ttl=settings.identity_cache_ttl,
+        )
+        self.catalog = DoctorCatalog(self)  # لیست و کارت دکترها برای منوهای ربات
+        self.search = DoctorSearchIndex(self)  # جستجوی نام، تخصص و مراکز
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.database_url.startswith("sqlite")
+
+    @property
+    def is_postgresql(self) -> bool:
+        return self.database_url.startswith("postgresql")
+
+    @property
+    def safe_url(self) -> str:
+        """آدرس دیتابیس بدون رمز عبور برای لاگ"""
+        return make_url(self.database_url).render_as_string(hide_password=True)
+
+    def _engine_options(self) -> Dict:
+        """تنظیمات pool و درایور بر اساس نوع دیتابیس"""
+        options = {}
+        if ":memory:" not in self.database_url:
+            options.update(
+                pool_size=self.settings.pool_size,
+                max_overflow=self.settings.max_overflow,
+                pool_timeout=self.settings.pool_timeout,
+            )
+        if self.is_postgresql:
+            options.update(
+                pool_pre_ping=True,
+                pool_recycle=self.settings.pool_recycle,
+                connect_args={
+                    # کش prepared statementهای asyncpg برای هر اتصال
+                    'prepared_statement_cache_size': self.settings.statement_cache_size,
+                    'server_settings': {'application_name': 'slothunter'},
+                },
+            )
+        return options
     
     async def _setup_database(self):
         """تنظیم دیتابیس"""
         try:
             # ایجاد پوشه data در صورت عدم وجود
-            if self.database_url.startswith("sqlite+aiosqlite:///"):
+            database = make_url(self.database_url).database
+            if self.is_sqlite and database and database != ":memory:":
                 from pathlib import Path
-                db_path = Path(self.database_url.replace("sqlite+aiosqlite:///", "")).resolve()
+                db_path = Path(database).resolve()
                 db_path.parent.mkdir(parents=True, exist_ok=True)
             
             # ایجاد engine
             self.engine = create_async_engine(
                 self.database_url,
                 echo=False,  # تغییر به True برای debug
+                **self._engine_options()
             )
+            if self.is_sqlite:
+                _install_sqlite_profile(self.engine, self.settings)
             
             # ایجاد session factory
             self.SessionLocal = sessionmaker(
@@ -50,11 +177,27 @@ class DatabaseManager:
                 expire_on_commit=False,
             )
             
-            # ایجاد جداول
-            async with self.engine.begin() as conn:
+            # ایجاد جداول (با قفل نوشتن از ابتدا تا پردازه‌های همزمان به بن‌بست نخورند)
+            ddl_engine = self.engine.execution_options(**{SQLITE_IMMEDIATE: True}) if self.is_sqlite else self.engine
+            async with ddl_engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+
+            # SQLite فقط یک نویسنده همزمان دارد: همه نوشتن‌ها از یک صف عبور می‌کنند
+            if self.is_sqlite and self.settings.write_queue:
+                writer_sessions = sessionmaker(
+                    bind=self.engine.execution_options(**{SQLITE_IMMEDIATE: True}),
+                    class_=AsyncSession,
+                    expire_on_commit=False,
+                )
+                self.writer = WriteQueue(
+                    writer_sessions,
+                    batch_size=self.settings.write_batch_size,
+                    max_delay=self.settings.write_max_delay,
+                )
+                await self.writer.start()
+            await self.activity.start()
             
-            logger.info(f"✅ دیتابیس با موفقیت راه‌اندازی شد: {self.database_url}")
+            logger.info(f"✅ دیتابیس با موفقیت راه‌اندازی شد: {self.safe_url}")
             
         except Exception as e:
             logger.error(f"❌ خطا در راه‌اندازی دیتابیس: {e}")
@@ -79,8 +222,31 @@ class DatabaseManager:
         finally:
             await session.close()
     
+    async def run_write(self, fn: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """
+        اجرای یک نوشتن؛ در صورت فعال بودن صف نوشتن از آن عبور می‌کند
+
+        fn یک session می‌گیرد و نباید commit کند.
+        """
+        if self.writer is not None and self.writer.running:
+            return await self.writer.submit(fn)
+        async with self.session_scope() as session:
+            return await fn(session)
+
+    def get_write_stats(self) -> Dict:
+        """آمار نوشتن و انتظار برای قفل"""
+        stats = self.writer.get_stats() if self.writer else {}
+        lock_wait = metrics.histogram('db.lock_wait_seconds')
+        stats['lock_wait_p95'] = round(lock_wait.percentile(95), 4)
+        stats['lock_wait_max'] = round(lock_wait.percentile(100), 4)
+        return stats
+
     async def close(self):
         """بستن اتصال دیتابیس"""
+        await self.activity.stop()  # قبل از صف نوشتن تا باقی‌مانده بافر از آن عبور کند
+        if self.writer:
+            await self.writer.stop()
+            self.writer = None
         if self.engine:
             await self.engine.dispose()
             logger.info("🔒 اتصال دیتابیس بسته شد")
@@ -0,0 +1,93 @@
+"""
+کش هویت کاربران: telegram_id → (شناسه کاربر، ادمین، فعال)
+
+تقریباً هر handler با پیدا کردن کاربر از روی telegram_id شروع می‌شود؛ این کش
+LRU با TTL آن رفت‌وبرگشت دیتابیس را حذف می‌کند. هر نوشتنی که این فیلدها را
+تغییر دهد باید رکورد مربوط را invalidate کند؛ TTL تغییرات سایر پردازه‌ها را پوشش می‌دهد.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+
+from .models import User
+from src.utils.metrics import metrics
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """اطلاعات هویتی موردنیاز handlerها"""
+    user_pk: int
+    telegram_id: int
+    is_admin: bool
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserIdentity':
+        return cls(user.id, user.telegram_id, bool(user.is_admin), bool(user.is_active))
+
+
+class IdentityCache:
+    """کش LRU محدود با انقضای زمانی برای هویت کاربران"""
+
+    def __init__(self, db_manager, max_size: int = 10000, ttl: float = 300.0):
+        self.db_manager = db_manager
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, Tuple[UserIdentity, float]]' = OrderedDict()
+
+        self._hits = metrics.counter('identity.hits')
+        self._misses = metrics.counter('identity.misses')
+        self._evictions = metrics.counter('identity.evictions')
+
+    async def get(self, telegram_id: int) -> Optional[UserIdentity]:
+        """هویت کاربر؛ None اگر کاربر ثبت نشده باشد (نتیجه منفی کش نمی‌شود)"""
+        entry = self._entries.get(telegram_id)
+        if entry is not None:
+            identity, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(telegram_id)
+                self._hits.inc()
+                return identity
+            del self._entries[telegram_id]
+
+        self._misses.inc()
+        async with self.db_manager.session_scope() as session:
+            row = (await session.execute(
+                select(User.id, User.telegram_id, User.is_admin, User.is_active)
+                .filter(User.telegram_id == telegram_id)
+            )).one_or_none()
+        if row is None:
+            return None
+        identity = UserIdentity(row.id, row.telegram_id, bool(row.is_admin), bool(row.is_active))
+        self.put(identity)
+        return identity
+
+    def put(self, identity: UserIdentity):
+        self._entries[identity.telegram_id] = (identity, time.monotonic() + self.ttl)
+        self._entries.move_to_end(identity.telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions.inc()
+
+    def invalidate(self, telegram_id: int):
+        self._entries.pop(telegram_id, None)
+
+    def invalidate_many(self, telegram_ids: Iterable[int]):
+        for telegram_id in telegram_ids:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        hits, misses = self._hits.value, self._misses.value
+        return {
+            'size': len(self._entries),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'evictions': self._evictions.value,
+        }
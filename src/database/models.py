@@ -54,6 +54,11 @@ class Doctor(Base):
     is_active = Column(Boolean, default=True)
     last_checked = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # تعداد اشتراک‌های فعال کاربران فعال؛ همراه با هر تغییر اشتراک به‌روز می‌شود
+    active_subscriber_count = Column(Integer, default=0, server_default='0', nullable=False)
+    __table_args__ = (
+        Index('ix_doctors_is_active', 'is_active', 'id'),
+    )
     
     # روابط
     centers = relationship("DoctorCenter", back_populates="doctor", cascade="all, delete-orphan")
@@ -65,8 +70,8 @@ class Doctor(Base):
     
     @property
     def subscription_count(self):
-        """تعداد مشترکین فعال"""
-        return len([sub for sub in self.subscriptions if sub.is_active])
+        """تعداد مشترکین فعال (ستون نگهداری‌شده، بدون بارگذاری اشتراک‌ها)"""
+        return self.active_subscriber_count or 0
 
 
 class DoctorCenter(Base):
@@ -83,6 +88,9 @@ class DoctorCenter(Base):
     user_center_id = Column(String(100), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index('ix_doctor_centers_doctor_id', 'doctor_id'),
+    )
     
     # روابط
     doctor = relationship("Doctor", back_populates="centers")
@@ -105,6 +113,9 @@ class DoctorService(Base):
     duration = Column(String(20))  # مدت زمان ویزیت
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index('ix_doctor_services_center_id', 'center_id'),
+    )
     
     # روابط
     center = relationship("DoctorCenter", back_populates="services")
@@ -126,6 +137,8 @@ class Subscription(Base):
     __table_args__ = (
         UniqueConstraint('user_id', 'doctor_id', name='uq_subscription_user_doctor'),
         Index('ix_subscriptions_user_active', 'user_id', 'is_active'),
+        # fanout: مشترکین فعال یک دکتر بدون مراجعه به جدول
+        Index('ix_subscriptions_doctor_active', 'doctor_id', 'is_active', 'user_id'),
     )
     
     # روابط
@@ -146,9 +159,61 @@ class AppointmentLog(Base):
     appointment_count = Column(Integer, default=1)  # تعداد نوبت‌های پیدا شده
     notified_users = Column(Integer, default=0)  # تعداد کاربران اطلاع‌رسانی شده
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index('ix_appointment_logs_doctor_id', 'doctor_id'),
+    )
     
     # روابط
     doctor = relationship("Doctor", back_populates="appointment_logs")
     
     def __repr__(self):
         return f"<AppointmentLog(doctor_id={self.doctor_id}, date={self.appointment_date})>"
+
+
+class NotificationOutbox(Base):
+    """صندوق خروجی اطلاع‌رسانی - یک رکورد برای هر (چت، نوبت)"""
+    __tablename__ = 'notification_outbox'
+    
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    doctor_id = Column(Integer, ForeignKey('doctors.id'), nullable=False)
+    idempotency_key = Column(String(255), unique=True, nullable=False)
+    payload = Column(Text, nullable=False)  # اطلاعات نوبت به صورت JSON
+    status = Column(String(20), default='pending', nullable=False)  # pending, sent, failed
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    __table_args__ = (
+        Index('ix_notification_outbox_status_id', 'status', 'id'),
+        Index('ix_notification_outbox_chat_status', 'chat_id', 'status'),
+    )
+    
+    def __repr__(self):
+        return f"<NotificationOutbox(chat_id={self.chat_id}, key={self.idempotency_key}, status={self.status})>"
+
+
+class ShardLease(Base):
+    """اجاره یک shard از اهداف بررسی توسط یک نمونه برنامه"""
+    __tablename__ = 'shard_leases'
+    
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String(64))  # شناسه نمونه؛ None یعنی آزاد
+    expires_at = Column(DateTime)
+    generation = Column(Integer, default=0, nullable=False)  # با هر تغییر مالک افزایش می‌یابد
+    
+    def __repr__(self):
+        return f"<ShardLease(shard={self.shard}, owner={self.owner}, expires_at={self.expires_at})>"
+
+
+class ClusterMember(Base):
+    """نمونه‌های فعال برنامه برای تقسیم shardها"""
+    __tablename__ = 'cluster_members'
+    
+    instance_id = Column(String(64), primary_key=True)
+    hostname = Column(String(255))
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<ClusterMember(instance_id={self.instance_id}, heartbeat_at={self.heartbeat_at})>"
@@ -0,0 +1,218 @@
+"""
+صندوق خروجی پایدار اطلاع‌رسانی‌ها (Notification Outbox)
+"""
+import json
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.orm import selectinload
+
+from .models import Doctor, NotificationOutbox, User
+from src.utils.logger import get_logger
+
+logger = get_logger("Outbox")
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+def slot_key(chat_id: int, doctor_id: int, appointment) -> str:
+    """کلید یکتایی هر (چت، نوبت)"""
+    return (
+        f"{chat_id}:{doctor_id}:{appointment.center_id or ''}:"
+        f"{appointment.service_id or ''}:{appointment.from_time}"
+    )
+
+
+def insert_ignore(dialect_name: str, model, index_elements: List[str]):
+    """INSERT با نادیده گرفتن رکوردهای تکراری (SQLite و PostgreSQL)"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
+class OutboxStore:
+    """دسترسی به جدول notification_outbox"""
+
+    def __init__(self, db_manager, key_chunk_size: int = 500):
+        self.db_manager = db_manager
+        self.key_chunk_size = key_chunk_size
+
+    async def add(self, doctor_id: int, chat_ids: Iterable[int], appointments) -> Tuple[int, int]:
+        """
+        ثبت نوبت‌های یک دکتر برای مشترکین
+
+        Returns:
+            Tuple[تعداد رکورد جدید، تعداد تکراری‌های نادیده گرفته‌شده]
+        """
+        rows: Dict[str, dict] = {}
+        now = datetime.utcnow()
+        for chat_id in chat_ids:
+            for apt in appointments:
+                key = slot_key(chat_id, doctor_id, apt)
+                rows[key] = {
+                    'chat_id': chat_id,
+                    'doctor_id': doctor_id,
+                    'idempotency_key': key,
+                    'payload': json.dumps(asdict(apt), ensure_ascii=False),
+                    'status': STATUS_PENDING,
+                    'attempts': 0,
+                    'created_at': now,
+                }
+        if not rows:
+            return 0, 0
+
+        async def _add(session) -> Tuple[int, int]:
+            # حذف کلیدهایی که قبلاً ثبت (و احتمالاً ارسال) شده‌اند
+            keys = list(rows)
+            existing = set()
+            for i in range(0, len(keys), self.key_chunk_size):
+                result = await session.execute(
+                    select(NotificationOutbox.idempotency_key).filter(
+                        NotificationOutbox.doctor_id == doctor_id,
+                        NotificationOutbox.idempotency_key.in_(keys[i:i + self.key_chunk_size])
+                    )
+                )
+                existing.update(result.scalars().all())
+
+            new_rows = [row for key, row in rows.items() if key not in existing]
+            if new_rows:
+                stmt = insert_ignore(
+                    self.db_manager.engine.dialect.name, NotificationOutbox, ['idempotency_key']
+                )
+                await session.execute(stmt, new_rows)
+            return len(new_rows), len(existing)
+
+        return await self.db_manager.run_write(_add)
+
+    async def fetch_pending(self, after_id: int, limit: int,
+                            shards: Optional[Set[int]] = None, num_shards: int = 0) -> List[NotificationOutbox]:
+        """
+        رکوردهای در انتظار بعد از یک شناسه (به ترتیب ثبت)؛ در صورت نیاز فقط shardهای داده‌شده
+
+        رکوردهای کاربران غیرفعال برداشته نمی‌شوند؛ با /start دوباره ارسال از سر گرفته می‌شود.
+        """
+        query = select(NotificationOutbox).join(
+            User, User.telegram_id == NotificationOutbox.chat_id
+        ).filter(
+            NotificationOutbox.status == STATUS_PENDING,
+            NotificationOutbox.id > after_id,
+            User.is_active == True
+        )
+        if shards is not None:
+            query = query.filter((NotificationOutbox.doctor_id % num_shards).in_(shards))
+        async with self.db_manager.session_scope() as session:
+            result = await session.execute(
+                query.order_by(NotificationOutbox.id).limit(limit)
+            )
+            return result.scalars().all()
+
+    async def mark_sent(self, ids: List[int]):
+        """علامت‌گذاری دسته‌ای رکوردهای ارسال‌شده"""
+        if not ids:
+            return
+        await self.db_manager.run_write(lambda session: session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .values(
+                status=STATUS_SENT,
+                sent_at=datetime.utcnow(),
+                attempts=NotificationOutbox.attempts + 1
+            )
+        ))
+
+    async def mark_failed(self, ids: List[int], error: str):
+        """علامت‌گذاری دسته‌ای رکوردهای ناموفق"""
+        if not ids:
+            return
+        await self.db_manager.run_write(lambda session: session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .values(
+                status=STATUS_FAILED,
+                last_error=error[:500],
+                attempts=NotificationOutbox.attempts + 1
+            )
+        ))
+
+    async def mark_retry(self, ids: List[int], error: str, max_attempts: int):
+        """
+        ثبت یک تلاش ناموفق موقت؛ رکورد در انتظار می‌ماند تا سقف max_attempts
+
+        Returns:
+            تعداد رکوردهایی که به سقف رسیده و ناموفق شدند
+        """
+        if not ids:
+            return 0
+
+        async def _retry(session) -> int:
+            await session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(ids))
+                .values(attempts=NotificationOutbox.attempts + 1, last_error=error[:500])
+            )
+            result = await session.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id.in_(ids),
+                    NotificationOutbox.attempts >= max_attempts
+                )
+                .values(status=STATUS_FAILED)
+            )
+            return result.rowcount or 0
+
+        return await self.db_manager.run_write(_retry)
+
+    async def fail_chats(self, chat_ids: List[int], error: str) -> int:
+        """لغو همه رکوردهای در انتظار چت‌های غیرقابل دسترس"""
+        if not chat_ids:
+            return 0
+        result = await self.db_manager.run_write(lambda session: session.execute(
+            update(NotificationOutbox)
+            .where(
+                NotificationOutbox.chat_id.in_(chat_ids),
+                NotificationOutbox.status == STATUS_PENDING
+            )
+            .values(status=STATUS_FAILED, last_error=error[:500])
+        ))
+        return result.rowcount or 0
+
+    async def backlog(self) -> Tuple[int, Optional[float]]:
+        """تعداد رکوردهای در انتظار و عمر قدیمی‌ترین (ثانیه)"""
+        async with self.db_manager.session_scope() as session:
+            result = await session.execute(
+                select(func.count(NotificationOutbox.id), func.min(NotificationOutbox.created_at))
+                .filter(NotificationOutbox.status == STATUS_PENDING)
+            )
+            count, oldest = result.one()
+        age = (datetime.utcnow() - oldest).total_seconds() if oldest else None
+        return count or 0, age
+
+    async def purge(self, retention_days: int) -> int:
+        """حذف رکوردهای نهایی‌شده قدیمی‌تر از مدت نگهداری"""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        result = await self.db_manager.run_write(lambda session: session.execute(
+            delete(NotificationOutbox).where(
+                NotificationOutbox.status != STATUS_PENDING,
+                NotificationOutbox.created_at < cutoff
+            )
+        ))
+        return result.rowcount or 0
+
+    async def load_doctors(self, doctor_ids: Iterable[int]) -> Dict[int, Doctor]:
+        """بارگذاری دکترها با مراکزشان برای ساخت متن پیام"""
+        doctor_ids = list(doctor_ids)
+        if not doctor_ids:
+            return {}
+        async with self.db_manager.session_scope() as session:
+            result = await session.execute(
+                select(Doctor)
+                .options(selectinload(Doctor.centers))
+                .filter(Doctor.id.in_(doctor_ids))
+            )
+            return {doctor.id: doctor for doctor in result.scalars().all()}
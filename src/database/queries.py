@@ -0,0 +1,63 @@
+"""
+کوئری‌های پرتکرار مانیتور، fanout و handlerها
+
+کد برنامه و تست طرح اجرا (tests/test_query_plans.py) هر دو از همین
+سازنده‌ها استفاده می‌کنند تا کوئری بررسی‌شده همان کوئری اجراشده باشد.
+"""
+from typing import Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from .models import Doctor, DoctorCenter, Subscription, User
+
+
+def active_doctors_query(shards: Optional[Set[int]] = None, num_shards: int = 0):
+    """دکترهای فعالی که مشترک فعال دارند (با مراکز و سرویس‌ها)؛ در صورت نیاز فقط shardهای داده‌شده"""
+    # شمارنده نگهداری‌شده به جای بارگذاری اشتراک‌ها
+    query = (
+        select(Doctor)
+        .options(selectinload(Doctor.centers).selectinload(DoctorCenter.services))
+        .filter(Doctor.is_active == True, Doctor.active_subscriber_count > 0)
+    )
+    if shards is not None:
+        query = query.filter((Doctor.id % num_shards).in_(shards))
+    return query
+
+
+def subscriber_chat_ids_query(doctor_id: int):
+    """شناسه تلگرام مشترکین فعال یک دکتر"""
+    return (
+        select(User.telegram_id)
+        .join(Subscription, Subscription.user_id == User.id)
+        .filter(
+            Subscription.doctor_id == doctor_id,
+            Subscription.is_active == True,
+            User.is_active == True
+        )
+    )
+
+
+def user_query(telegram_id: int):
+    """کاربر با شناسه تلگرام"""
+    return select(User).filter(User.telegram_id == telegram_id)
+
+
+def user_subscriptions_query(user_pk: int):
+    """اشتراک‌های فعال یک کاربر با دکترهایشان"""
+    return (
+        select(Subscription)
+        .options(selectinload(Subscription.doctor))
+        .filter(Subscription.user_id == user_pk, Subscription.is_active == True)
+    )
+
+
+def subscription_query(user_pk: int, doctor_id: int, active_only: bool = True):
+    """اشتراک یک کاربر روی یک دکتر"""
+    query = select(Subscription).filter(
+        Subscription.user_id == user_pk,
+        Subscription.doctor_id == doctor_id
+    )
+    if active_only:
+        query = query.filter(Subscription.is_active == True)
+    return query
@@ -0,0 +1,309 @@
+"""
+ایندکس جستجوی دکترها در حافظه (نام، تخصص و نام مراکز)
+
+متن‌ها قبل از ایندکس و جستجو یکسان‌سازی می‌شوند: ی/ي و ک/ك عربی، اعراب،
+کشیده، نیم‌فاصله و ارقام فارسی/عربی. هر کلمه پرس‌وجو با پیشوند روی واژگان
+مرتب ایندکس (جستجوی دودویی) تطبیق داده می‌شود و نتیجه کلمه‌ها اشتراک گرفته
+می‌شود. با تغییر هر دکتر فقط سطرهای همان دکتر به‌روز می‌شوند.
+
+بنچمارک:
+    python -m src.database.search --bench [--doctors 5000]
+"""
+import asyncio
+import bisect
+import heapq
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from .models import Doctor, DoctorCenter
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("DoctorSearch")
+
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا', 'آ': 'ا',
+    'ؤ': 'و',
+    'ـ': None,  # کشیده
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670\u06d6-\u06ed]')  # اعراب و علائم قرآنی
+_ZWNJ = '\u200c'  # نیم‌فاصله
+_TOKEN = re.compile(r'[\w\u200c]+')
+STOPWORDS = {'دکتر', 'dr', 'دكتر', 'متخصص', 'فوق', 'و'}
+
+
+def normalize(text: str) -> str:
+    """یکسان‌سازی نویسه‌های فارسی/عربی و حروف کوچک لاتین"""
+    return _DIACRITICS.sub('', (text or '').translate(_CHAR_MAP)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """کلمه‌های ایندکس؛ کلمه‌های نیم‌فاصله‌دار هم جدا و هم چسبیده ثبت می‌شوند"""
+    tokens = []
+    for word in _TOKEN.findall(normalize(text)):
+        parts = [part for part in word.split(_ZWNJ) if part]
+        if len(parts) > 1:
+            tokens.append(''.join(parts))
+        tokens.extend(parts)
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    id: int
+    name: str
+    specialty: Optional[str]
+    score: float
+
+
+class DoctorSearchIndex:
+    """ایندکس معکوس کلمه → دکترها با تطبیق پیشوندی"""
+
+    def __init__(self, db_manager=None, max_age: float = 600.0):
+        self.db_manager = db_manager
+        self.max_age = max_age
+        self._postings: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []  # مرتب، برای پیدا کردن بازه پیشوندها
+        self._name_postings: Dict[str, Set[int]] = {}  # فقط کلمه‌های نام، برای رتبه‌بندی
+        self._doc_tokens: Dict[int, Set[str]] = {}
+        self._docs: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._name_order: Optional[Dict[int, int]] = None  # ترتیب الفبایی نام‌ها؛ با تغییرات بازسازی می‌شود
+        self._loaded_at = float('-inf')
+        self._lock = asyncio.Lock()
+
+        self._queries = metrics.counter('search.queries')
+        self._query_time = metrics.histogram('search.query_seconds')
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ==================== به‌روزرسانی ====================
+
+    def upsert(self, doctor_id: int, name: str, specialty: Optional[str] = None,
+               center_names: Iterable[str] = ()):
+        """افزودن یا جایگزینی یک دکتر در ایندکس"""
+        self.remove(doctor_id)
+        name_tokens = set(tokenize(name))
+        tokens = name_tokens | set(tokenize(specialty or ''))
+        for center_name in center_names:
+            tokens.update(tokenize(center_name))
+
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+            posting.add(doctor_id)
+        for token in name_tokens:
+            self._name_postings.setdefault(token, set()).add(doctor_id)
+        self._doc_tokens[doctor_id] = tokens
+        self._docs[doctor_id] = (name, specialty)
+        self._name_order = None
+
+    def remove(self, doctor_id: int):
+        for token in self._doc_tokens.pop(doctor_id, ()):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(doctor_id)
+            name_posting = self._name_postings.get(token)
+            if name_posting is not None:
+                name_posting.discard(doctor_id)
+                if not name_posting:
+                    del self._name_postings[token]
+            if not posting:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    del self._vocabulary[index]
+        self._docs.pop(doctor_id, None)
+        self._name_order = None
+
+    def clear(self):
+        self._postings.clear()
+        self._vocabulary.clear()
+        self._name_postings.clear()
+        self._doc_tokens.clear()
+        self._docs.clear()
+        self._name_order = None
+
+    # ==================== جستجو ====================
+
+    def _prefix_matches(self, prefix: str) -> Tuple[Set[int], Set[int]]:
+        """(دکترهای دارای کلمه‌ای با این پیشوند، دکترهایی که نامشان این پیشوند را دارد)"""
+        matched: Set[int] = set()
+        in_name: Set[int] = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for index in range(start, len(self._vocabulary)):
+            token = self._vocabulary[index]
+            if not token.startswith(prefix):
+                break
+            matched |= self._postings[token]
+            in_name |= self._name_postings.get(token, set())
+        return matched, in_name
+
+    def search(self, text: str, limit: int = 10) -> List[SearchHit]:
+        """دکترهایی که همه کلمه‌های پرس‌وجو (به‌صورت پیشوند) را دارند"""
+        started = time.perf_counter()
+        self._queries.inc()
+        try:
+            query_tokens = list(dict.fromkeys(tokenize(text)))
+            if not query_tokens:
+                return []
+
+            candidates: Optional[Set[int]] = None
+            boosts: List[Set[int]] = []  # کلمه کامل و تطبیق در نام امتیاز بیشتری دارند
+            for token in query_tokens:
+                matched, in_name = self._prefix_matches(token)
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    break
+                boosts.append(self._postings.get(token, set()))
+                boosts.append(in_name)
+
+            hits = []
+            if candidates:
+                if self._name_order is None:
+                    ordered = sorted(self._docs, key=lambda doctor_id: (self._docs[doctor_id][0], doctor_id))
+                    self._name_order = {doctor_id: position for position, doctor_id in enumerate(ordered)}
+                scores = Counter()
+                for ids in boosts:
+                    scores.update(ids & candidates)
+                # دسته‌بندی بر اساس امتیاز و مرتب‌سازی الفبایی فقط تا پر شدن limit
+                buckets: Dict[int, List[int]] = {}
+                for doctor_id, score in scores.items():
+                    buckets.setdefault(score, []).append(doctor_id)
+                buckets[0] = candidates.difference(scores)
+                for score in sorted(buckets, reverse=True):
+                    top = heapq.nsmallest(limit - len(hits), buckets[score], key=self._name_order.__getitem__)
+                    hits.extend(SearchHit(doctor_id, *self._docs[doctor_id], score=float(score))
+                                for doctor_id in top)
+                    if len(hits) >= limit:
+                        break
+            return hits
+        finally:
+            self._query_time.observe(time.perf_counter() - started)
+
+    # ==================== بارگذاری از دیتابیس ====================
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self._loaded_at < self.max_age
+
+    async def ensure_loaded(self):
+        if self.is_fresh:
+            return
+        async with self._lock:
+            if self.is_fresh:
+                return
+            await self._load_all()
+
+    async def _load_all(self):
+        started = time.perf_counter()
+        async with self.db_manager.session_scope() as session:
+            doctors = (await session.execute(
+                select(Doctor.id, Doctor.name, Doctor.specialty).filter(Doctor.is_active == True)
+            )).all()
+            centers = (await session.execute(
+                select(DoctorCenter.doctor_id, DoctorCenter.center_name)
+                .join(Doctor, Doctor.id == DoctorCenter.doctor_id)
+                .filter(Doctor.is_active == True)
+            )).all()
+        center_names: Dict[int, List[str]] = {}
+        for doctor_id, center_name in centers:
+            center_names.setdefault(doctor_id, []).append(center_name)
+
+        self.clear()
+        for doctor in doctors:
+            self.upsert(doctor.id, doctor.name, doctor.specialty, center_names.get(doctor.id, ()))
+        self._loaded_at = time.monotonic()
+        logger.info(
+            f"🔎 ایندکس جستجو: {len(self._docs)} دکتر، {len(self._vocabulary)} کلمه "
+            f"در {time.perf_counter() - started:.3f} ثانیه"
+        )
+
+    def invalidate(self):
+        """تغییرات گسترده (مثل ورود دسته‌ای): بازسازی کامل در جستجوی بعدی"""
+        self._loaded_at = float('-inf')
+
+    async def refresh_doctor(self, doctor_id: int):
+        """به‌روزرسانی یک دکتر پس از افزودن/تغییر (فقط اگر ایندکس ساخته شده باشد)"""
+        if self._loaded_at == float('-inf'):
+            return  # هنوز ساخته نشده؛ اولین جستجو کل ایندکس را می‌سازد
+        async with self.db_manager.session_scope() as session:
+            doctor = (await session.execute(
+                select(Doctor.id, Doctor.name, Doctor.specialty, Doctor.is_active)
+                .filter(Doctor.id == doctor_id)
+            )).one_or_none()
+            center_names = (await session.execute(
+                select(DoctorCenter.center_name).filter(DoctorCenter.doctor_id == doctor_id)
+            )).scalars().all()
+        if doctor is None or not doctor.is_active:
+            self.remove(doctor_id)
+        else:
+            self.upsert(doctor.id, doctor.name, doctor.specialty, center_names)
+
+    def get_stats(self) -> Dict:
+        return {
+            'doctors': len(self._docs),
+            'tokens': len(self._vocabulary),
+            'queries': self._queries.value,
+            'query_p95_ms': round(self._query_time.percentile(95) * 1000, 3),
+        }
+
+
+def _bench(num_doctors: int) -> int:
+    import random
+
+    first = ['علی', 'محمد', 'رضا', 'مریم', 'زهرا', 'سارا', 'حسین', 'فاطمه', 'مهدی', 'نرگس']
+    last = ['احمدی', 'محمدی', 'کریمی', 'رضایی', 'حسینی', 'موسوی', 'کاظمی', 'صادقی', 'جعفری', 'رحیمی']
+    specialties = ['قلب و عروق', 'پوست و مو', 'اطفال', 'زنان و زایمان', 'ارتوپدی', 'چشم‌پزشکی', 'مغز و اعصاب']
+    cities = ['تهران', 'مشهد', 'اصفهان', 'شیراز', 'تبریز', 'كرج']
+
+    rng = random.Random(42)
+    index = DoctorSearchIndex()
+    started = time.perf_counter()
+    for doctor_id in range(1, num_doctors + 1):
+        name = f"دکتر {rng.choice(first)} {rng.choice(last)}{doctor_id % 97}"
+        centers = [f"مطب {rng.choice(cities)} {rng.randint(1, 400)}" for _ in range(rng.randint(1, 3))]
+        index.upsert(doctor_id, name, rng.choice(specialties), centers)
+    build = time.perf_counter() - started
+
+    queries = ['علي', 'محمدی', 'قلب', 'پوست مو', 'مریم کاظ', 'چشم پزشکی', 'کرج', 'ز', 'رحیمی۱']
+    timings = []
+    for _ in range(200):
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"doctors: {len(index)}, tokens: {len(index._vocabulary)}, build: {build:.3f}s")
+    print(f"query p50: {timings[len(timings) // 2] * 1000:.3f} ms, "
+          f"p95: {timings[int(len(timings) * 0.95)] * 1000:.3f} ms, max: {timings[-1] * 1000:.3f} ms")
+    for query in queries[:4]:
+        print(f"  {query!r}: {[hit.name for hit in index.search(query, limit=3)]}")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="بنچمارک ایندکس جستجوی دکترها")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--doctors', type=int, default=5000)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        sys.exit(0)
+    sys.exit(_bench(args.doctors))
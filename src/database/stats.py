@@ -0,0 +1,121 @@
+"""
+آمار تجمیعی سیستم با COUNT/GROUP BY در SQL و snapshot در حافظه
+
+snapshot یک بار با کوئری‌های تجمیعی ساخته می‌شود، با رویدادهای برنامه
+(ثبت‌نام، لغو اشتراک، کاربر جدید، دکتر جدید) به‌صورت افزایشی به‌روز می‌ماند و
+هر max_age ثانیه یک بار از دیتابیس بازسازی می‌شود تا انحراف احتمالی اصلاح شود.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import select, func, case
+
+from .models import User, Doctor, DoctorCenter, DoctorService, Subscription, AppointmentLog, NotificationOutbox
+from src.utils.logger import get_logger
+
+logger = get_logger("Stats")
+
+
+async def collect_stats(session) -> Dict[str, int]:
+    """محاسبه همه شمارنده‌ها با چند کوئری تجمیعی (بدون بارگذاری سطرها)"""
+    users = (await session.execute(
+        select(
+            func.count(User.id),
+            func.sum(case((User.is_active == True, 1), else_=0)),
+        )
+    )).one()
+    doctors = (await session.execute(
+        select(
+            func.count(Doctor.id),
+            func.sum(case((Doctor.is_active == True, 1), else_=0)),
+        )
+    )).one()
+    total_centers = await session.scalar(
+        select(func.count(DoctorCenter.id)).filter(DoctorCenter.is_active == True)
+    )
+    total_services = await session.scalar(
+        select(func.count(DoctorService.id)).filter(DoctorService.is_active == True)
+    )
+    subscriptions = (await session.execute(
+        select(
+            func.count(Subscription.id),
+            func.count(func.distinct(Subscription.doctor_id)),
+        ).filter(Subscription.is_active == True)
+    )).one()
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    appointments_today = await session.scalar(
+        select(func.coalesce(func.sum(AppointmentLog.appointment_count), 0))
+        .filter(AppointmentLog.created_at >= today)
+    )
+    outbox = dict((await session.execute(
+        select(NotificationOutbox.status, func.count(NotificationOutbox.id))
+        .filter(NotificationOutbox.created_at >= today)
+        .group_by(NotificationOutbox.status)
+    )).all())
+
+    return {
+        'all_users': users[0] or 0,
+        'total_users': users[1] or 0,
+        'total_doctors': doctors[0] or 0,
+        'active_doctors': doctors[1] or 0,
+        'total_centers': total_centers or 0,
+        'total_services': total_services or 0,
+        'total_subscriptions': subscriptions[0] or 0,
+        'doctors_with_subscriptions': subscriptions[1] or 0,
+        'appointments_today': appointments_today or 0,
+        'notifications_today': outbox.get('sent', 0),
+        'notifications_pending': outbox.get('pending', 0),
+    }
+
+
+class StatsSnapshot:
+    """snapshot آمار برای پاسخ فوری به داشبورد ادمین"""
+
+    def __init__(self, db_manager, max_age: float = 300.0):
+        self.db_manager = db_manager
+        self.max_age = max_age
+        self._stats: Optional[Dict[str, int]] = None
+        self._computed_at = float('-inf')
+        self._computed_day = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self._stats is None
+            or time.monotonic() - self._computed_at > self.max_age
+            or self._computed_day != datetime.utcnow().date()  # شمارنده‌های «امروز»
+        )
+
+    async def get(self) -> Dict:
+        """آمار فعلی؛ فقط در صورت کهنه بودن از دیتابیس بازسازی می‌شود"""
+        if self.is_stale:
+            await self.refresh()
+        stats = dict(self._stats)
+        stats['age_seconds'] = int(time.monotonic() - self._computed_at)
+        return stats
+
+    async def refresh(self):
+        async with self._lock:
+            if self._stats is not None and not self.is_stale:
+                return  # درخواست همزمان دیگری بازسازی کرده است
+            started = time.perf_counter()
+            async with self.db_manager.session_scope() as session:
+                self._stats = await collect_stats(session)
+            self._computed_at = time.monotonic()
+            self._computed_day = datetime.utcnow().date()
+            logger.debug(f"📊 آمار در {time.perf_counter() - started:.3f} ثانیه بازسازی شد")
+
+    def adjust(self, **deltas: int):
+        """به‌روزرسانی افزایشی؛ اگر snapshot هنوز ساخته نشده نیازی نیست"""
+        if self._stats is None:
+            return
+        for key, delta in deltas.items():
+            self._stats[key] = max(0, self._stats.get(key, 0) + delta)
+
+    def invalidate(self):
+        """تغییری که به‌صورت افزایشی قابل محاسبه نیست: بازسازی در درخواست بعدی"""
+        self._computed_at = float('-inf')
@@ -0,0 +1,48 @@
+"""
+عملیات دسته‌ای روی کاربران
+"""
+from typing import Iterable, List
+
+from sqlalchemy import select, update
+
+from .models import User, Subscription
+from .counters import decrement_for_users
+from src.utils.logger import get_logger
+
+logger = get_logger("Users")
+
+
+async def deactivate_chats(db_manager, telegram_ids: Iterable[int], chunk_size: int = 500) -> int:
+    """
+    غیرفعال کردن کاربران (و اشتراک‌هایشان) بر اساس شناسه تلگرام
+
+    Returns:
+        تعداد کاربرانی که غیرفعال شدند
+    """
+    telegram_ids: List[int] = list(telegram_ids)
+    deactivated = 0
+    for i in range(0, len(telegram_ids), chunk_size):
+        chunk = telegram_ids[i:i + chunk_size]
+
+        async def _deactivate(session, chunk=chunk) -> int:
+            user_ids = select(User.id).filter(User.telegram_id.in_(chunk)).scalar_subquery()
+            await decrement_for_users(session, user_ids)
+            await session.execute(
+                update(Subscription)
+                .where(Subscription.user_id.in_(user_ids), Subscription.is_active == True)
+                .values(is_active=False)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(
+                update(User)
+                .where(User.telegram_id.in_(chunk), User.is_active == True)
+                .values(is_active=False)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount or 0
+
+        deactivated += await db_manager.run_write(_deactivate)
+        db_manager.identities.invalidate_many(chunk)
+    if deactivated:
+        db_manager.stats.invalidate()
+    return deactivated
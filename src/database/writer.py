@@ -0,0 +1,165 @@
+"""
+صف نوشتن تک‌نویسنده برای SQLite
+
+همه نوشتن‌ها به ترتیب از یک task عبور می‌کنند و چند نوشتن پشت سر هم
+در یک تراکنش commit می‌شوند؛ هر نوشتن داخل savepoint خودش اجرا می‌شود تا
+خطای یکی بقیه دسته را خراب نکند. خواندن‌ها همچنان همزمان انجام می‌شوند.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("DBWriter")
+
+T = TypeVar('T')
+WriteFn = Callable[[AsyncSession], Awaitable[T]]
+
+
+@dataclass
+class WriteJob:
+    """یک درخواست نوشتن در صف"""
+    fn: WriteFn
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+class WriteQueue:
+    """
+    صف نوشتن با commit دسته‌ای
+
+    نکته: داخل یک WriteFn نباید دوباره submit صدا زده شود (بن‌بست).
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession],
+                 batch_size: int = 64, max_delay: float = 0.02):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+
+        self._writes = metrics.counter('db.writes_committed')
+        self._write_errors = metrics.counter('db.write_errors')
+        self._batches = metrics.counter('db.write_batches')
+        self._batch_size = metrics.histogram('db.write_batch_size')
+        self._queue_wait = metrics.histogram('db.write_queue_wait_seconds')
+        self._commit_time = metrics.histogram('db.write_commit_seconds')
+        self._depth = metrics.gauge('db.write_queue_depth')
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"✍️ صف نوشتن دیتابیس شروع شد (دسته {self.batch_size})")
+
+    async def stop(self):
+        """اجرای نوشتن‌های باقی‌مانده و توقف"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        try:
+            await self._task
+        finally:
+            self._task = None
+        logger.info("🛑 صف نوشتن دیتابیس متوقف شد")
+
+    async def submit(self, fn: WriteFn) -> T:
+        """ثبت یک نوشتن و انتظار برای commit آن"""
+        if not self.running:
+            raise RuntimeError("صف نوشتن دیتابیس شروع نشده است")
+        job = WriteJob(fn=fn, future=asyncio.get_running_loop().create_future())
+        await self._queue.put(job)
+        self._depth.set(self._queue.qsize())
+        return await job.future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            job = await self._queue.get()
+            if job is None:
+                break
+            jobs = [job]
+
+            # جمع کردن نوشتن‌های رسیده در فاصله کوتاه برای یک commit مشترک
+            deadline = time.monotonic() + self.max_delay
+            while len(jobs) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    job = self._queue.get_nowait() if timeout <= 0 else \
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                jobs.append(job)
+
+            self._depth.set(self._queue.qsize())
+            await self._commit_batch(jobs)
+
+    async def _commit_batch(self, jobs: List[WriteJob]):
+        now = time.monotonic()
+        for job in jobs:
+            self._queue_wait.observe(now - job.submitted_at)
+
+        outcomes = []
+        session = self._session_factory()
+        try:
+            for job in jobs:
+                try:
+                    async with session.begin_nested():
+                        outcomes.append((job, await job.fn(session), None))
+                except Exception as e:
+                    self._write_errors.inc()
+                    outcomes.append((job, None, e))
+
+            started = time.perf_counter()
+            await session.commit()
+            self._commit_time.observe(time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"❌ خطا در commit دسته نوشتن ({len(jobs)} مورد): {e}")
+            await session.rollback()
+            self._write_errors.inc(len(jobs))
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+        finally:
+            await session.close()
+
+        self._batches.inc()
+        self._batch_size.observe(len(jobs))
+        for job, result, error in outcomes:
+            if job.future.done():
+                continue
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                self._writes.inc()
+                job.future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        """آمار توان نوشتن"""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            'writes': self._writes.value,
+            'errors': self._write_errors.value,
+            'batches': self._batches.value,
+            'writes_per_second': round(self._writes.value / elapsed, 2) if elapsed else 0.0,
+            'avg_batch_size': round(self._batch_size.summary()['avg'], 1),
+            'queue_wait_p95': round(self._queue_wait.percentile(95), 4),
+            'commit_p95': round(self._commit_time.percentile(95), 4),
+        }
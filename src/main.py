@@ -5,18 +5,28 @@
 import asyncio
 import signal
 import sys
+import time
 from pathlib import Path
+from typing import Optional
 
 # اضافه کردن مسیر پروژه به Python path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.utils.config import Config
 from src.utils.logger import setup_logger
+from src.utils import offload
 from src.api.enhanced_paziresh_client import EnhancedPazireshAPI
 from src.telegram_bot.bot import SlotHunterBot
 from src.database.database import DatabaseManager
-from src.database.models import Doctor as DBDoctor, DoctorCenter, DoctorService, Subscription
+from src.database.models import Doctor as DBDoctor, DoctorService, Subscription
+from src.database.counters import reconcile_subscriber_counts
+from src.database.queries import active_doctors_query
+from src.cluster.leases import LeaseManager
+from src.api.catalog_refresh import CatalogRefresher
+from src.cluster.supervisor import WorkerSupervisor
+from src.api.models import Appointment
 from src.utils.logger import notify_admin_critical_error
+from src.utils.metrics import metrics
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 import httpx
@@ -24,20 +34,45 @@ import httpx
 class SlotHunter:
     """کلاس اصلی نوبت‌یاب - نسخه بهینه شده"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, config: Config = None):
         self.db_manager = db_manager
-        self.config = Config()
+        self.config = config or Config()
+        log_settings = self.config.logging_settings
         self.logger = setup_logger(
-            level=self.config.log_level,
-            log_file=self.config.log_file
+            level=log_settings.level,
+            log_file=self._log_file(log_settings.file),
+            max_size=log_settings.max_size,
+            backup_count=log_settings.backup_count,
+            json_format=log_settings.json_format,
+            rate_limit=log_settings.rate_limit,
+            rate_burst=log_settings.rate_burst
         )
         self.running = False
         self.telegram_bot = None
         self.http_client = None
+        self.leases = None
+        self.supervisor = None
+        self.refresher = None
+        self._last_reconcile = 0.0
+        self._stopped = False
+        self._with_slots: set = set()  # دکترهایی که در آخرین بررسی نوبت داشتند
         
+        workers = self.config.workers_settings
+        offload.configure(threads=workers.offload_threads, processes=workers.offload_processes)
+        self.loop_lag = (
+            offload.LoopLagMonitor(workers.loop_lag_interval, workers.loop_lag_warn)
+            if workers.loop_lag_interval > 0 else None
+        )
+        
+    def _log_file(self, path: Optional[str]) -> Optional[str]:
+        """فایل لاگ این پردازه"""
+        return path
+
     async def start(self):
         """شروع نوبت‌یاب"""
         self.logger.info("🚀 شروع P24_SlotHunter - نسخه بهینه شده")
+        if self.loop_lag:
+            await self.loop_lag.start()
         
         # بررسی تنظیمات
         if not self.config.telegram_bot_token:
@@ -53,9 +88,28 @@ class SlotHunter:
             await notify_admin_critical_error(f"خطا در راه‌اندازی دیتابیس: {e}")
             return
         
+        # تقسیم کار با نمونه‌های دیگر
+        cluster = self.config.cluster_settings
+        if cluster.enabled:
+            try:
+                self.leases = LeaseManager(
+                    self.db_manager,
+                    instance_id=cluster.instance_id or None,
+                    num_shards=cluster.num_shards,
+                    lease_ttl=cluster.lease_ttl,
+                    heartbeat_interval=cluster.heartbeat_interval
+                )
+                await self.leases.start()
+            except Exception as e:
+                self.logger.error(f"❌ خطا در راه‌اندازی هماهنگی نمونه‌ها: {e}")
+                await notify_admin_critical_error(f"خطا در راه‌اندازی هماهنگی نمونه‌ها: {e}")
+                return
+        
         # راه‌اندازی ربات تلگرام
         try:
-            self.telegram_bot = SlotHunterBot(self.config.telegram_bot_token, self.db_manager)
+            self.telegram_bot = SlotHunterBot(
+                self.config.telegram_bot_token, self.db_manager, self.config, leases=self.leases
+            )
             await self.telegram_bot.initialize()
             self.logger.info("✅ ربات تلگرام راه‌اندازی شد")
         except Exception as e:
@@ -82,18 +136,52 @@ class SlotHunter:
         self.running = True
         self.http_client = httpx.AsyncClient(timeout=self.config.api_timeout)
         
+        # همگام‌سازی دوره‌ای مراکز و سرویس‌ها با سایت
+        catalog = self.config.catalog_settings
+        if catalog.refresh_interval > 0:
+            self.refresher = CatalogRefresher(
+                self.db_manager,
+                extractor=self.telegram_bot.extractor,
+                interval=catalog.refresh_interval,
+                max_age=catalog.refresh_max_age,
+                batch_size=catalog.refresh_batch_size,
+                concurrency=catalog.refresh_concurrency,
+                rate=catalog.refresh_rate,
+                owns=self.owns
+            )
+            await self.refresher.start()
+        
         # نمایش تنظیمات بهینه سازی
         self.logger.info(f"⚙️ تنظیمات بهینه سازی:")
         self.logger.info(f"   🕐 فاصله بررسی: {self.config.check_interval} ثانیه")
         self.logger.info(f"   📅 روزهای بررسی: {self.config.days_ahead} روز")
         self.logger.info(f"   ⏱️ تاخیر بین درخواست‌ها: {self.config.request_delay} ثانیه")
         
-        # شروع همزمان ربات و نظارت
+        # شروع همزمان ربات و نظارت؛ در cluster فقط یک نمونه آپدیت‌ها را می‌گیرد
+        workers = self.config.workers_settings
+        receive_updates = not cluster.enabled or cluster.bot_instance
         try:
-            await asyncio.gather(
-                self.telegram_bot.start_polling(),
-                self.monitor_loop()
-            )
+            if workers.mode == 'supervisor':
+                # بررسی نوبت‌ها در پردازه‌های جدا؛ این پردازه فقط ربات و ارسال را اجرا می‌کند
+                self.supervisor = WorkerSupervisor(
+                    num_workers=workers.pollers,
+                    hash_replicas=workers.hash_replicas,
+                    queue_size=workers.queue_size,
+                    config_path=str(self.config.config_path),
+                    lease_owner=self.leases.instance_id if self.leases else None,
+                    num_shards=cluster.num_shards
+                )
+                self.supervisor.start()
+                await asyncio.gather(
+                    self.telegram_bot.run(receive_updates),
+                    self.supervisor.consume(self.handle_slot_event),
+                    self.maintenance_loop()
+                )
+            else:
+                await asyncio.gather(
+                    self.telegram_bot.run(receive_updates),
+                    self.monitor_loop()
+                )
         finally:
             if self.http_client:
                 await self.http_client.aclose()
@@ -103,15 +191,15 @@ class SlotHunter:
         while self.running:
             try:
                 # دریافت دکترهای فعال با مراکز و سرویس‌هایشان
+                await self._reconcile_counters()
+                
+                # فقط دکترهایی که مشترک فعال دارند؛ با اجاره فقط shardهای این نمونه
+                if self.leases:
+                    query = active_doctors_query(self.leases.owned_shards(), self.leases.num_shards)
+                else:
+                    query = active_doctors_query()
                 async with self.db_manager.session_scope() as session:
-                    result = await session.execute(
-                        select(DBDoctor)
-                        .options(
-                            selectinload(DBDoctor.centers).selectinload(DoctorCenter.services),
-                            selectinload(DBDoctor.subscriptions)
-                        )
-                        .filter(DBDoctor.is_active == True)
-                    )
+                    result = await session.execute(query)
                     active_doctors = result.scalars().all()
                 
                 if active_doctors:
@@ -119,14 +207,13 @@ class SlotHunter:
                     
                     # بررسی همه دکترها
                     for doctor in active_doctors:
-                        # فقط دکترهایی که مشترک دارند را بررسی کن
-                        active_subscriptions = [sub for sub in doctor.subscriptions if sub.is_active]
-                        if active_subscriptions:
-                            await self.check_doctor(doctor)
-                        else:
-                            self.logger.debug(f"⏭️ {doctor.name} مشترک ندارد، رد شد")
+                        if not self.owns(doctor.id):
+                            continue  # متعلق به نمونه یا worker دیگری است
+                        await self.check_doctor(doctor)
                 else:
                     self.logger.debug("📭 هیچ دکتر فعالی برای بررسی وجود ندارد")
+                self._round_finished()
+                self._log_stats()
                 
                 # صبر تا دور بعدی
                 self.logger.info(f"⏰ صبر {self.config.check_interval} ثانیه تا دور بعدی...")
@@ -140,14 +227,31 @@ class SlotHunter:
                 await notify_admin_critical_error(f"خطا در حلقه نظارت: {e}")
                 await asyncio.sleep(60)  # صبر بیشتر در صورت خطا
     
+    async def maintenance_loop(self):
+        """حالت supervisor: اصلاح شمارنده‌ها و گزارش آمار در پردازه اصلی (بررسی نوبت با workerهاست)"""
+        while self.running:
+            try:
+                await self._reconcile_counters()
+                self._log_stats()
+                workers = self.supervisor.get_stats()
+                self.logger.info(
+                    f"🧵 workerها: {workers['alive']}/{workers['workers']} فعال، "
+                    f"{workers['events_received']} رویداد، {workers['restarts']} راه‌اندازی مجدد، "
+                    f"تاخیر رویداد p95 {workers['event_lag']['p95']:.2f}s"
+                )
+            except Exception as e:
+                self.logger.error(f"❌ خطا در نگهداری دوره‌ای: {e}")
+            await asyncio.sleep(self.config.check_interval)
+    
     async def check_doctor(self, doctor: DBDoctor):
         """بررسی نوبت‌های یک دکتر - نسخه بهینه شده"""
         try:
             if not doctor.centers:
-                self.logger.warning(f"⚠️ {doctor.name} هیچ مرکزی ندارد")
+                self.logger.warning(f"⚠️ {doctor.name} هیچ مرکزی ندارد", extra={'doctor_id': doctor.id})
                 return
             
             # استفاده از API پیشرفته با تنظیمات بهینه
+            started = time.perf_counter()
             api = EnhancedPazireshAPI(
                 doctor, 
                 client=self.http_client,
@@ -156,33 +260,197 @@ class SlotHunter:
                 request_delay=self.config.request_delay
             )
             appointments = await api.get_all_available_appointments(days_ahead=self.config.days_ahead)
+            # فیلدهای ساختاریافته برای خروجی JSON
+            fields = {
+                'doctor_id': doctor.id,
+                'endpoint': api.BASE_URL,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                'appointments': len(appointments),
+            }
             
             if appointments:
-                self.logger.info(f"🎯 {len(appointments)} نوبت برای {doctor.name} پیدا شد!")
+                self.logger.info(f"🎯 {len(appointments)} نوبت برای {doctor.name} پیدا شد!", extra=fields)
                 
                 # نمایش در لاگ
                 for apt in appointments[:3]:
-                    self.logger.info(f"  ⏰ {apt.time_str}")
+                    self.logger.info(f"  ⏰ {apt.time_str}", extra={'doctor_id': doctor.id})
                 
-                # اطلاع‌رسانی با ربات تلگرام
-                if self.telegram_bot:
-                    await self.telegram_bot.send_appointment_alert(doctor, appointments)
+                self._with_slots.add(doctor.id)
+                await self.publish_alert(doctor, appointments)
             else:
-                self.logger.debug(f"📅 هیچ نوبتی برای {doctor.name} موجود نیست")
+                self.logger.debug(f"📅 هیچ نوبتی برای {doctor.name} موجود نیست", extra=fields)
+                if doctor.id in self._with_slots:
+                    # نوبت‌ها تمام شد: لیست خالی تا پیام‌های زنده به‌روز شوند
+                    self._with_slots.discard(doctor.id)
+                    await self.publish_alert(doctor, [])
                 
         except Exception as e:
-            self.logger.error(f"❌ خطا در بررسی {doctor.name}: {e}")
+            self.logger.error(f"❌ خطا در بررسی {doctor.name}: {e}", extra={'doctor_id': doctor.id})
+    
+    def _log_stats(self):
+        """گزارش دوره‌ای آمار اجزای پردازه در لاگ"""
+        if self.telegram_bot:
+            stats = self.telegram_bot.notifier.get_stats()
+            if stats['alerts_delivered']:
+                self.logger.info(
+                    f"📊 اطلاع‌رسانی: {stats['alerts_delivered']} هشدار در {stats['messages_sent']} پیام "
+                    f"و {stats['messages_edited']} ویرایش "
+                    f"({stats['reduction_percent']}% کاهش)"
+                )
+            fairness = self.telegram_bot.notifier.get_fairness_report()
+            if fairness.get('users'):
+                self.logger.info(
+                    f"⚖️ تاخیر تحویل ({fairness['policy']}): p95 میانه کاربران "
+                    f"{fairness['user_p95_median']}s، بدترین {fairness['user_p95_max']}s"
+                )
+            if stats['dead_chats_pruned']:
+                self.logger.info(f"🧹 چت‌های غیرقابل دسترس حذف‌شده: {stats['dead_chats_pruned']}")
+            if stats['outbox_backlog']:
+                self.logger.info(
+                    f"📮 صندوق خروجی: {stats['outbox_backlog']} اعلان در انتظار "
+                    f"(قدیمی‌ترین {stats['outbox_oldest_age']} ثانیه)"
+                )
+
+        write_stats = self.db_manager.get_write_stats()
+        if write_stats.get('writes'):
+            self.logger.info(
+                f"💾 نوشتن دیتابیس: {write_stats['writes_per_second']}/ثانیه، "
+                f"میانگین دسته {write_stats['avg_batch_size']}، "
+                f"انتظار قفل p95 {write_stats['lock_wait_p95']}s"
+            )
+
+        activity_stats = self.db_manager.activity.get_stats()
+        if activity_stats['recorded']:
+            self.logger.info(
+                f"👥 فعالیت کاربران: {activity_stats['recorded']} تعامل، "
+                f"{activity_stats['coalesced']} ادغام‌شده، "
+                f"{activity_stats['rows_flushed']} سطر نوشته‌شده"
+            )
+
+        if self.telegram_bot:
+            update_stats = self.telegram_bot.get_update_stats()
+            slowest = sorted(
+                update_stats['handlers'].items(), key=lambda item: item[1]['p95'], reverse=True
+            )[:3]
+            if slowest:
+                self.logger.info(
+                    "⏱️ handlerها (p95): "
+                    + "، ".join(f"{name} {stats['p95']:.3f}s" for name, stats in slowest)
+                    + f"؛ صف آپدیت p95 {update_stats['queue_wait_p95']}s"
+                )
+            slow_routes = list(update_stats['callbacks'].items())[:3]
+            if slow_routes:
+                self.logger.info(
+                    "🔀 کندترین دکمه‌ها (p95): "
+                    + "، ".join(
+                        f"{name} {stats['p95']:.3f}s ({stats['errors']} خطا)"
+                        for name, stats in slow_routes
+                    )
+                )
+
+        identity_stats = self.db_manager.identities.get_stats()
+        if identity_stats['hits'] or identity_stats['misses']:
+            self.logger.info(
+                f"🪪 کش هویت: {identity_stats['size']} کاربر، "
+                f"نرخ hit {identity_stats['hit_rate']:.0%}"
+            )
+        
+        search_stats = self.db_manager.search.get_stats()
+        if search_stats['queries']:
+            self.logger.info(
+                f"🔎 جستجو: {search_stats['queries']} پرس‌وجو روی {search_stats['doctors']} دکتر، "
+                f"p95 {search_stats['query_p95_ms']} میلی‌ثانیه"
+            )
+        
+        if self.loop_lag:
+            lag = self.loop_lag.get_stats()
+            self.logger.info(
+                f"⏱️ تاخیر event loop: p50 {lag['p50_ms']}، p99 {lag['p99_ms']}، "
+                f"بیشینه {lag['max_ms']} میلی‌ثانیه ({lag['stalls']} توقف)"
+            )
+        
+        profile_cache = self.telegram_bot.extractor.cache if self.telegram_bot else None
+        if profile_cache is not None:
+            cache_stats = profile_cache.get_stats()
+            if cache_stats['hits'] or cache_stats['misses']:
+                self.logger.info(
+                    f"♻️ کش پروفایل: نرخ hit {cache_stats['hit_rate']:.0%}، "
+                    f"{cache_stats['not_modified']} پاسخ 304، "
+                    f"{cache_stats['bytes_saved'] / 1024:.0f} KB صرفه‌جویی"
+                )
     
+    def _round_finished(self):
+        """ثبت زمان پایان دور بررسی (برای «آخرین بررسی» در گزارش ادمین)"""
+        metrics.gauge('monitor.last_round_at').set(time.time())
+    
+    async def _reconcile_counters(self):
+        """اصلاح دوره‌ای شمارنده مشترکین دکترها"""
+        if time.monotonic() - self._last_reconcile < self.config.counter_reconcile_interval and self._last_reconcile:
+            return
+        self._last_reconcile = time.monotonic()
+        try:
+            await reconcile_subscriber_counts(self.db_manager)
+        except Exception as e:
+            self.logger.error(f"❌ خطا در اصلاح شمارنده مشترکین: {e}")
+
+    def owns(self, doctor_id: int) -> bool:
+        """آیا بررسی این دکتر با این نمونه است"""
+        return self.leases is None or self.leases.owns(doctor_id)
+
+    async def publish_alert(self, doctor, appointments):
+        """اطلاع‌رسانی با ربات تلگرام"""
+        if self.telegram_bot:
+            await self.telegram_bot.send_appointment_alert(doctor, appointments)
+
+    async def handle_slot_event(self, event: dict):
+        """رویداد نوبت رسیده از workerها در حالت supervisor"""
+        if event.get('type') == 'round':
+            # پایان یک دور بررسی در worker
+            metrics.gauge('monitor.last_round_at').set(event['found_at'])
+            return
+        if not self.owns(event['doctor_id']):
+            return  # اجاره shard در این فاصله به نمونه دیگری رسیده است
+        async with self.db_manager.session_scope() as session:
+            result = await session.execute(
+                select(DBDoctor)
+                .options(selectinload(DBDoctor.centers))
+                .filter(DBDoctor.id == event['doctor_id'])
+            )
+            doctor = result.scalar_one_or_none()
+        if doctor is None:
+            return
+        appointments = [Appointment(**apt) for apt in event['appointments']]
+        await self.publish_alert(doctor, appointments)
+
     async def stop(self):
         """توقف نوبت‌یاب"""
+        if self._stopped:
+            return
+        self._stopped = True
         self.logger.info("🛑 در حال توقف...")
         self.running = False
         
+        if self.supervisor:
+            await self.supervisor.stop()
+        
+        if self.refresher:
+            await self.refresher.stop()
+        
         if self.telegram_bot:
             await self.telegram_bot.stop()
         
+        if self.leases:
+            await self.leases.stop()
+        
         if self.http_client:
             await self.http_client.aclose()
+        
+        # پس از توقف ربات، notifier و workerها: خالی کردن بافر فعالیت و صف نوشتن
+        await self.db_manager.close()
+        
+        if self.loop_lag:
+            await self.loop_lag.stop()
+        offload.shutdown()
 
 
 def signal_handler(signum, frame):
@@ -199,20 +467,22 @@ async def main():
     signal.signal(signal.SIGTERM, signal_handler)
     
     # ایجاد و اجرای نوبت‌یاب
-    config = Config()
-    db_manager = DatabaseManager(config.database_url)
-    hunter = SlotHunter(db_manager)
+    config = await Config.load_async()
+    db_manager = DatabaseManager(config.database_url, config.database_settings)
+    hunter = SlotHunter(db_manager, config)
     
     try:
         await hunter.start()
     except KeyboardInterrupt:
-        await hunter.stop()
+        pass
     except Exception as e:
         print(f"❌ خطای غیرمنتظره: {e}")
         try:
             await notify_admin_critical_error(f"خطای غیرمنتظره: {e}")
         except Exception:
             pass
+    finally:
+        await hunter.stop()
 
 
 if __name__ == "__main__":
@@ -2,12 +2,20 @@
 New Telegram Bot - معماری جدید و ساده
 """
 import asyncio
-import random
+import secrets
+from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from typing import Optional
-from telegram.error import RetryAfter, TimedOut, NetworkError
 
 from src.telegram_bot.unified_handlers import UnifiedTelegramHandlers
+from src.telegram_bot.notifier import AlertNotifier
+from src.telegram_bot.update_processor import ChatSerialUpdateProcessor, instrument_handler, handler_latency_report
+from src.database.outbox import OutboxStore
+from src.api.bulk_import import BulkDoctorImporter
+from src.api.doctor_extractor import DoctorExtractor
+from src.api.doctor_manager import DoctorManager
+from src.api.profile_cache import ProfileCache
+from src.utils.config import Config
 from src.utils.logger import get_logger
 
 logger = get_logger("NewTelegramBot")
@@ -16,17 +24,63 @@ logger = get_logger("NewTelegramBot")
 class SlotHunterBot:
     """ربات جدید با معماری ساده و قابل اعتماد"""
     
-    def __init__(self, token: str, db_manager):
+    def __init__(self, token: str, db_manager, config: Optional[Config] = None, leases=None):
         self.token = token
         self.db_manager = db_manager
+        self.config = config or Config()
         self.application: Optional[Application] = None
-        self.handlers = UnifiedTelegramHandlers(db_manager)
+        self.settings = self.config.telegram_settings
+        self.webhook = None  # WebhookReceiver در حالت webhook
+        self.update_processor = ChatSerialUpdateProcessor(
+            workers=self.settings.concurrent_updates,
+            max_pending=self.settings.max_pending_updates
+        )
+        catalog_settings = self.config.catalog_settings
+        # یک extractor مشترک تا کش پروفایل بین افزودن، ورود و به‌روزرسانی دوره‌ای یکی باشد
+        self.extractor = DoctorExtractor(cache=ProfileCache(
+            catalog_settings.profile_cache_dir,
+            max_bytes=catalog_settings.profile_cache_max_mb * 1024 * 1024
+        ) if catalog_settings.profile_cache_max_mb > 0 else None)
+        self.handlers = UnifiedTelegramHandlers(
+            db_manager,
+            admin_chat_id=self.config.admin_chat_id,
+            page_size=self.config.doctors_page_size,
+            importer=BulkDoctorImporter(
+                db_manager,
+                extractor=self.extractor,
+                concurrency=catalog_settings.import_concurrency,
+                rate=catalog_settings.import_rate
+            ),
+            import_max_items=catalog_settings.import_max_items,
+            doctor_manager=DoctorManager(db_manager, self.extractor)
+        )
+        self.notifier = AlertNotifier(
+            OutboxStore(db_manager),
+            coalesce_window=self.config.coalesce_window,
+            max_delay=self.config.max_coalesce_delay,
+            edit_window=self.config.live_edit_window,
+            batch_size=self.config.outbox_batch_size,
+            poll_interval=self.config.outbox_poll_interval,
+            retention_days=self.config.outbox_retention_days,
+            max_deliveries=self.config.outbox_max_attempts,
+            fanout_order=self.config.fanout_order,
+            leases=leases
+        )
     
     async def initialize(self):
         """راه‌اندازی ربات"""
         try:
             # ایجاد Application
-            self.application = Application.builder().token(self.token).build()
+            builder = (
+                Application.builder()
+                .token(self.token)
+                .concurrent_updates(self.update_processor)
+            )
+            if self.settings.mode == 'webhook':
+                builder = builder.updater(None)  # آپدیت‌ها از WebhookReceiver به صف می‌رسند
+            self.application = builder.build()
+            self.notifier.attach(self.application.bot)
+            await self.notifier.start()
             
             # اضافه کردن handlers
             self._setup_handlers()
@@ -42,21 +96,47 @@ class SlotHunterBot:
         app = self.application
         
         # Command handlers
-        app.add_handler(CommandHandler("start", self.handlers.start_command))
-        app.add_handler(CommandHandler("help", self.handlers.help_command))
-        app.add_handler(CommandHandler("doctors", self.handlers.doctors_command))
+        app.add_handler(CommandHandler("start", instrument_handler("start", self.handlers.start_command)))
+        app.add_handler(CommandHandler("help", instrument_handler("help", self.handlers.help_command)))
+        app.add_handler(CommandHandler("doctors", instrument_handler("doctors", self.handlers.doctors_command)))
+        app.add_handler(CommandHandler("search", instrument_handler("search", self.handlers.search_command)))
+        app.add_handler(CommandHandler("stats", instrument_handler("stats", self.handlers.stats_command)))
+        app.add_handler(CommandHandler("report", instrument_handler("report", self.handlers.report_command)))
+        import_handler = instrument_handler("import", self.handlers.import_command)
+        app.add_handler(CommandHandler("import", import_handler))
+        app.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(r'^/import'), import_handler))
         
         # Message handler for persistent menu
         app.add_handler(MessageHandler(
             filters.TEXT & ~filters.COMMAND, 
-            self.handlers.handle_text_message
+            instrument_handler("text", self.handlers.handle_text_message)
         ))
         
         # Callback handler
-        app.add_handler(CallbackQueryHandler(self.handlers.handle_callback))
+        app.add_handler(CallbackQueryHandler(instrument_handler("callback", self.handlers.handle_callback)))
         
         logger.info("✅ Handlers تنظیم شدند")
     
+    async def run(self, receive_updates: bool = True):
+        """دریافت آپدیت‌ها با polling یا webhook بر اساس تنظیمات؛ بدون آن فقط ارسال اطلاع‌رسانی"""
+        if not receive_updates:
+            await self.start_sender_only()
+        elif self.settings.mode == 'webhook':
+            await self.start_webhook()
+        else:
+            await self.start_polling()
+    
+    async def start_sender_only(self):
+        """فقط ارسال اطلاع‌رسانی‌ها؛ آپدیت‌ها را نمونه دیگری از cluster می‌گیرد"""
+        try:
+            logger.info("📤 این نمونه آپدیت دریافت نمی‌کند (cluster.bot_instance=false)؛ فقط ارسال اطلاع‌رسانی")
+            await self.application.initialize()
+            
+            # نگه داشتن ربات زنده
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+    
     async def start_polling(self):
         """شروع polling"""
         try:
@@ -74,82 +154,90 @@ class SlotHunterBot:
         finally:
             await self.stop()
     
+    async def start_webhook(self):
+        """شروع سرور webhook و ثبت آدرس آن در تلگرام"""
+        from src.telegram_bot.webhook import WebhookReceiver
+        
+        try:
+            if not self.settings.webhook_url:
+                raise ValueError("برای حالت webhook مقدار telegram.webhook_url لازم است")
+            secret = self.settings.webhook_secret
+            if not secret or secret.startswith("${"):
+                secret = secrets.token_urlsafe(32)  # فقط تلگرام (با setWebhook همین اجرا) آن را می‌داند
+            
+            logger.info("🔄 شروع webhook...")
+            await self.application.initialize()
+            await self.application.start()
+            self.webhook = WebhookReceiver(
+                self._enqueue_update,
+                secret,
+                host=self.settings.webhook_listen,
+                port=self.settings.webhook_port,
+                path=self.settings.webhook_path
+            )
+            await self.webhook.start()
+            await self.application.bot.set_webhook(
+                url=self.settings.webhook_url,
+                secret_token=secret,
+                max_connections=self.settings.webhook_max_connections,
+                allowed_updates=Update.ALL_TYPES
+            )
+            
+            # نگه داشتن ربات زنده
+            await asyncio.Event().wait()
+            
+        except Exception as e:
+            logger.error(f"❌ خطا در webhook: {e}")
+            raise
+        finally:
+            await self.stop()
+    
+    async def _enqueue_update(self, data: dict):
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+    
     async def stop(self):
         """توقف ربات"""
         try:
+            await self.notifier.stop()
+            if self.webhook:
+                await self.webhook.stop()
+                self.webhook = None
             if self.application:
-                await self.application.updater.stop()
-                await self.application.stop()
+                if self.application.updater and self.application.updater.running:
+                    await self.application.updater.stop()
+                if self.application.running:
+                    await self.application.stop()
                 await self.application.shutdown()
             logger.info("🛑 ربات متوقف شد")
         except Exception as e:
             logger.error(f"❌ خطا در توقف ربات: {e}")
     
+    def get_update_stats(self) -> dict:
+        """آمار پردازش آپدیت‌ها و زمان اجرای هر handler"""
+        stats = self.update_processor.get_stats()
+        stats['handlers'] = handler_latency_report()
+        stats['callbacks'] = self.handlers.callbacks.get_stats()
+        return stats
+    
     async def send_appointment_alert(self, doctor, appointments):
-        """ارسال اطلاع‌رسانی نوبت"""
+        """ثبت اطلاع‌رسانی نوبت در صندوق خروجی (ارسال توسط notifier)"""
         try:
-            from src.telegram_bot.messages import MessageFormatter
-            from src.database.models import Subscription, User
-            from sqlalchemy import select
-            from sqlalchemy.orm import selectinload
+            from src.database.queries import subscriber_chat_ids_query
             
-            # دریافت مشترکین این دکتر با eager loading
+            # فقط شناسه تلگرام مشترکین لازم است
             async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(Subscription)
-                    .options(selectinload(Subscription.user))
-                    .filter(
-                        Subscription.doctor_id == doctor.id,
-                        Subscription.is_active == True
-                    )
-                )
-                subscriptions = result.scalars().all()
-                
-                if not subscriptions:
-                    logger.info(f"📭 هیچ مشترکی برای {doctor.name} وجود ندارد")
-                    return
-                
-                # ایجاد پیام
-                message_text = MessageFormatter.appointment_alert_message(doctor, appointments)
-                
-                # ارسال به همه مشترکین با مدیریت نرخ و backoff
-                sent_count = 0
-                base_delay = 0.15
-                max_delay = 5.0
-                for idx, subscription in enumerate(subscriptions, 1):
-                    delay = base_delay + random.uniform(0, 0.15)
-                    attempts = 0
-                    while True:
-                        try:
-                            await self.application.bot.send_message(
-                                chat_id=subscription.user.telegram_id,
-                                text=message_text,
-                                parse_mode='HTML'
-                            )
-                            sent_count += 1
-                            await asyncio.sleep(delay)
-                            break
-                        except RetryAfter as e:
-                            wait_time = getattr(e, 'retry_after', 2)
-                            logger.warning(f"⏳ Telegram rate limit (RetryAfter {wait_time}s) for {subscription.user.telegram_id}")
-                            await asyncio.sleep(wait_time + random.uniform(0, 0.5))
-                        except TimedOut:
-                            attempts += 1
-                            backoff = min(base_delay * (2 ** attempts), max_delay)
-                            logger.warning(f"⏱️ TimedOut, retrying in {backoff:.2f}s (attempt {attempts})")
-                            await asyncio.sleep(backoff)
-                            continue
-                        except NetworkError as e:
-                            attempts += 1
-                            backoff = min(base_delay * (2 ** attempts), max_delay)
-                            logger.warning(f"🌐 NetworkError: {e}. retrying in {backoff:.2f}s (attempt {attempts})")
-                            await asyncio.sleep(backoff)
-                            continue
-                        except Exception as e:
-                            logger.error(f"❌ خطا در ارسال به {subscription.user.telegram_id}: {e}")
-                            break
-                
-                logger.info(f"📤 پیام به {sent_count}/{len(subscriptions)} مشترک ارسال شد")
+                result = await session.execute(subscriber_chat_ids_query(doctor.id))
+                chat_ids = result.scalars().all()
+            
+            if not chat_ids:
+                logger.info(f"📭 هیچ مشترکی برای {doctor.name} وجود ندارد")
+                return
+            
+            new_count = await self.notifier.publish(doctor, chat_ids, appointments)
+            if new_count:
+                logger.info(f"📥 {new_count} اعلان جدید برای {doctor.name} ({len(chat_ids)} مشترک) در صف قرار گرفت")
+            else:
+                logger.debug(f"🔁 نوبت‌های {doctor.name} قبلاً اعلام شده‌اند")
                 
         except Exception as e:
-            logger.error(f"❌ خطا در ارسال اطلاع‌رسانی: {e}")
\ No newline at end of file
+            logger.error(f"❌ خطا در ارسال اطلاع‌رسانی: {e}")
@@ -5,11 +5,11 @@ import asyncio
 import html
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from sqlalchemy import select
 from typing import List
 from datetime import datetime
 
-from src.database.models import User, Doctor, Subscription
+from src.database.models import Doctor
+from src.database.queries import subscription_query
 from src.api.doctor_manager import DoctorManager
 from src.api.enhanced_paziresh_client import EnhancedPazireshAPI
 from src.telegram_bot.messages import MessageFormatter
@@ -24,9 +24,9 @@ ADD_DOCTOR_URL = 1
 class DoctorHandlers:
     """کلاس handlers مربوط به دکترها (HTML)"""
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, doctor_manager: DoctorManager = None):
         self.db_manager = db_manager
-        self.doctor_manager = DoctorManager(db_manager)
+        self.doctor_manager = doctor_manager or DoctorManager(db_manager)
         # API client را در هر متد جداگانه ایجاد می‌کنیم
     
     # ==================== Add Doctor Conversation ====================
@@ -185,21 +185,11 @@ class DoctorHandlers:
                 return
             
             # بررسی اشتراک کاربر
+            user = await self.db_manager.identities.get(user_id)
             async with self.db_manager.session_scope() as session:
-                user_result = await session.execute(
-                    select(User).filter(User.telegram_id == user_id)
-                )
-                user = user_result.scalar_one_or_none()
-                
                 is_subscribed = False
                 if user:
-                    sub_result = await session.execute(
-                        select(Subscription).filter(
-                            Subscription.user_id == user.id,
-                            Subscription.doctor_id == doctor.id,
-                            Subscription.is_active == True
-                        )
-                    )
+                    sub_result = await session.execute(subscription_query(user.user_pk, doctor.id))
                     is_subscribed = sub_result.scalar_one_or_none() is not None
             
             # ساخت متن اطلاعات (HTML)
@@ -271,13 +261,15 @@ class DoctorHandlers:
             logger.error(f"❌ خطا در نمایش اطلاعات دکتر: {e}")
             await query.edit_message_text(f"❌ خطا: {html.escape(str(e))}")
     
-    async def check_doctor_appointments(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def check_doctor_appointments(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                        doctor_id: int = None):
         """بررسی نوبت‌های خالی دکتر"""
         try:
             query = update.callback_query
             await query.answer()
             
-            doctor_id = int(query.data.split("_")[-1])
+            if doctor_id is None:
+                doctor_id = int(query.data.split("_")[-1])
             
             # ارسال پیام در حال بررسی
             await query.edit_message_text(
@@ -451,13 +443,7 @@ class DoctorHandlers:
     async def _is_admin(self, user_id: int) -> bool:
         """بررسی دسترسی ادمین"""
         try:
-            async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(User).filter(
-                        User.telegram_id == user_id,
-                        User.is_admin == True
-                    )
-                )
-                return result.scalar_one_or_none() is not None
+            user = await self.db_manager.identities.get(user_id)
+            return bool(user and user.is_admin)
         except:
             return False
@@ -68,6 +68,7 @@ class MessageFormatter:
 
 🔍 <b>دستورات اصلی:</b>
 • <b>مشاهده دکترها</b> - لیست دکترهای موجود
+• <b>جستجو</b> - اسم دکتر، تخصص یا مرکز رو بفرست (یا /search)
 • <b>ثبت‌نام در دکتر</b> - برای رصد نوبت‌های خالی
 • <b>لغو ثبت‌نام</b> - وقتی دیگه نیاز نداری
 
@@ -126,6 +127,7 @@ class MessageFormatter:
 🏥 <b>مطب/کلینیک:</b> {escape_html(center_name)}
 📍 <b>آدرس:</b> {escape_html(center_address)}
 📞 <b>تلفن:</b> {escape_html(center_phone)}
+👥 <b>مشترکین فعال:</b> {doctor.subscription_count}
 
 🔗 <b>لینک مستقیم پذیرش۲۴:</b>
 https://www.paziresh24.com/dr/{escape_html(doctor.slug)}/
@@ -186,6 +188,59 @@ https://www.paziresh24.com/dr/{escape_html(doctor.slug)}/
 
         return message
 
+    @staticmethod
+    def appointments_taken_message(doctor: Doctor) -> str:
+        """ویرایش پیام هشدار وقتی همه نوبت‌های اعلام‌شده گرفته شده‌اند"""
+        return f"""
+⌛ <b>نوبت‌ها تمام شد</b>
+
+👨‍⚕️ <b>دکتر:</b> {escape_html(doctor.name)}
+
+نوبت‌های خالی این دکتر گرفته شدند. به محض پیدا شدن نوبت جدید خبرت می‌کنم.
+"""
+
+    @staticmethod
+    def coalesced_alert_message(entries: List[tuple], max_length: int = 4000) -> str:
+        """پیام ادغام‌شده نوبت‌های چند دکتر در یک پیام"""
+        if not entries:
+            return ""
+        if len(entries) == 1:
+            doctor, appointments = entries[0]
+            if not appointments:
+                return MessageFormatter.appointments_taken_message(doctor)
+            return MessageFormatter.appointment_alert_message(doctor, appointments)
+
+        message = f"\n🎉 <b>نوبت خالی برای {len(entries)} دکتر پیدا شد!</b>\n"
+        footer = "\n🏃‍♂️ <b>سریع باش! نوبت‌ها خیلی زود تموم میشن!</b>\n"
+
+        for index, (doctor, appointments) in enumerate(entries):
+            center_name = doctor.centers[0].center_name if doctor.centers else "مطب شخصی"
+            section = f"\n👨‍⚕️ <b>{escape_html(doctor.name)}</b> - 🏥 {escape_html(center_name)}\n"
+
+            if not appointments:
+                section += "   ⌛ نوبت‌ها تمام شد\n"
+
+            dates_dict = {}
+            for apt in appointments:
+                dates_dict.setdefault(apt.time_str.split(' ')[0], []).append(apt)
+
+            for date_str, date_appointments in sorted(dates_dict.items()):
+                times = [apt.time_str.split(' ')[1] for apt in date_appointments[:5]]
+                section += f"   🗓️ {escape_html(date_str)}: {escape_html('، '.join(times))}"
+                if len(date_appointments) > 5:
+                    section += f" (+{len(date_appointments) - 5})"
+                section += "\n"
+
+            section += f"   🔗 https://www.paziresh24.com/dr/{escape_html(doctor.slug)}/\n"
+
+            # جلوگیری از عبور از محدودیت طول پیام تلگرام
+            if len(message) + len(section) + len(footer) > max_length:
+                message += f"\n... و {len(entries) - index} دکتر دیگر\n"
+                break
+            message += section
+
+        return message + footer
+
     @staticmethod
     def subscription_success_message(doctor: Doctor) -> str:
         """پیام موفقیت اشتراک"""
@@ -265,6 +320,7 @@ https://www.paziresh24.com/dr/{escape_html(doctor.slug)}/
 👨‍⚕️ <b>دکترها:</b> {stats.get('total_doctors', 0)}
 📝 <b>ثبت‌نام‌ها:</b> {stats.get('total_subscriptions', 0)}
 🎯 <b>نوبت‌های پیدا شده امروز:</b> {stats.get('appointments_found_today', 0)}
+📨 <b>اعلان‌های امروز:</b> {stats.get('notifications_today', 0)} (در انتظار: {stats.get('notifications_pending', 0)})
 
 ⏰ <b>آخرین بررسی:</b> {escape_html(stats.get('last_check', 'نامشخص'))}
 🔄 <b>وضعیت سیستم:</b> {escape_html(stats.get('system_status', 'فعال'))}
@@ -287,7 +343,8 @@ https://www.paziresh24.com/dr/{escape_html(doctor.slug)}/
 👥 <b>کاربران فعال:</b> {stats.get('total_users', 0)}
 👨‍⚕️ <b>کل دکترها:</b> {stats.get('total_doctors', 0)}
 ✅ <b>دکترهای فعال:</b> {stats.get('active_doctors', 0)}
-📝 <b>ثبت‌نام‌های فعال:</b> {stats.get('total_subscriptions', 0)}
+🏥 <b>مراکز / سرویس‌ها:</b> {stats.get('total_centers', 0)} / {stats.get('total_services', 0)}
+📝 <b>ثبت‌نام‌های فعال:</b> {stats.get('total_subscriptions', 0)} ({stats.get('doctors_with_subscriptions', 0)} دکتر)
 🎯 <b>نوبت‌های پیدا شده امروز:</b> {stats.get('appointments_today', 0)}
 
 ⏰ <b>آخرین بررسی:</b> در حال اجرا
@@ -0,0 +1,698 @@
+"""
+سرویس اطلاع‌رسانی نوبت‌ها - صندوق خروجی پایدار و ادغام هشدارهای هر چت
+
+تضمین تحویل «حداقل یک‌بار» (at-least-once) است: وضعیت رکوردهای outbox بلافاصله
+بعد از ارسال هر پیام ثبت می‌شود، اما اگر پردازه بین send_message و mark_sent
+از کار بیفتد، همان هشدار بعد از ری‌استارت دوباره فرستاده می‌شود.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import timezone
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut, NetworkError
+
+from src.api.models import Appointment
+from src.database.outbox import OutboxStore
+from src.database.users import deactivate_chats
+from src.telegram_bot.messages import MessageFormatter
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("Notifier")
+
+# متن خطاهای BadRequest که یعنی چت دیگر قابل دسترس نیست
+PERMANENT_FAILURE_MARKERS = (
+    'chat not found',
+    'user not found',
+    'user is deactivated',
+    'bot was blocked',
+    'bot was kicked',
+    'peer_id_invalid',
+    'chat_write_forbidden',
+)
+
+
+def is_transient_failure(error: Exception) -> bool:
+    """آیا خطا موقت است (timeout، محدودیت نرخ، قطعی شبکه) و ارسال بعداً تکرار شود"""
+    if isinstance(error, (BadRequest, Forbidden)):
+        return False  # در PTB زیرکلاس NetworkError هستند
+    return isinstance(error, (RetryAfter, TimedOut, NetworkError))
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """آیا خطای ارسال دائمی است (کاربر ربات را بلاک کرده یا چت وجود ندارد)"""
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        message = str(error).lower()
+        return any(marker in message for marker in PERMANENT_FAILURE_MARKERS)
+    return False
+
+
+def _slot_id(appointment) -> tuple:
+    """شناسه یک نوبت مستقل از چت (همان اجزای کلید outbox)"""
+    return appointment.center_id, appointment.service_id, appointment.from_time
+
+
+@dataclass
+class PendingAlerts:
+    """هشدارهای در انتظار ارسال برای یک چت"""
+    chat_id: int
+    first_at: float
+    last_at: float
+    entries: Dict[int, tuple] = field(default_factory=dict)  # doctor.id -> (doctor, appointments)
+    alert_count: int = 0
+    outbox_ids: List[int] = field(default_factory=list)
+    produced_at: Optional[float] = None  # زمان (epoch) ثبت قدیمی‌ترین هشدار این دسته
+
+
+@dataclass
+class LiveAlert:
+    """آخرین پیام هشدار ارسال‌شده به یک چت (قابل ویرایش در پنجره زمانی)"""
+    message_id: int
+    sent_at: float
+    entries: Dict[int, tuple]
+    text: str
+
+
+class FanoutOrderer:
+    """
+    ترتیب ارسال دسته‌های آماده در هر دور fanout
+
+    سیاست‌ها:
+        fifo          ترتیب ثبت (همان ترتیب دیتابیس)
+        rotate        چرخش نقطه شروع در هر دور
+        random        ترتیب تصادفی
+        least_recent  اول کسانی که مدت بیشتری در نیمه اول صف نبوده‌اند
+    """
+
+    POLICIES = ('fifo', 'rotate', 'random', 'least_recent')
+
+    def __init__(self, policy: str = 'least_recent'):
+        if policy not in self.POLICIES:
+            logger.warning(f"⚠️ سیاست ترتیب ارسال نامعتبر: {policy} - از fifo استفاده می‌شود")
+            policy = 'fifo'
+        self.policy = policy
+        self._rotation = 0
+        self._last_head_at: Dict[int, float] = {}
+
+    def order(self, batches: List[PendingAlerts]) -> List[PendingAlerts]:
+        count = len(batches)
+        if count < 2 or self.policy == 'fifo':
+            ordered = list(batches)
+        elif self.policy == 'rotate':
+            base = sorted(batches, key=lambda p: p.chat_id)
+            shift = self._rotation % count
+            ordered = base[shift:] + base[:shift]
+            # گام نسبت طلایی تا نقطه شروع در دورهای متوالی پخش شود
+            self._rotation += int(count * 0.618) or 1
+        elif self.policy == 'random':
+            ordered = random.sample(batches, count)
+        else:
+            ordered = sorted(batches, key=lambda p: self._last_head_at.get(p.chat_id, 0.0))
+
+        now = time.monotonic()
+        for pending in ordered[:max(1, count // 2)]:
+            self._last_head_at[pending.chat_id] = now
+        return ordered
+
+    def forget(self, chat_id: int):
+        self._last_head_at.pop(chat_id, None)
+
+
+class AlertNotifier:
+    """
+    ارسال هشدار نوبت با ادغام پیام‌های هر چت
+
+    هشدارهایی که در فاصله coalesce_window از هم برای یک چت می‌رسند در یک پیام
+    ادغام می‌شوند؛ اولین هشدار هیچ‌وقت بیش از max_delay منتظر نمی‌ماند.
+    اگر در edit_window ثانیه پس از ارسال، فقط لیست نوبت‌های همان دکترها تغییر کند،
+    پیام قبلی با edit_message_text به‌روز می‌شود.
+
+    هر (چت، نوبت) ابتدا با کلید یکتا در صندوق خروجی دیتابیس ثبت می‌شود و
+    drain loop رکوردهای در انتظار را دسته‌ای برمی‌دارد؛ بعد از ری‌استارت،
+    رکوردهای ارسال‌نشده از سر گرفته می‌شوند. نتیجه هر پیام بلافاصله بعد از
+    ارسالش ثبت می‌شود، پس فقط پیامی که در همان فاصله کوتاه قطع شده ممکن است
+    تکراری برسد (حداقل یک‌بار، نه دقیقاً یک‌بار).
+    """
+
+    def __init__(self, outbox: OutboxStore, coalesce_window: float = 3.0, max_delay: float = 15.0,
+                 edit_window: float = 600.0, batch_size: int = 200, poll_interval: float = 2.0,
+                 retention_days: int = 14, fanout_order: str = 'least_recent', leases=None,
+                 base_delay: float = 0.15, max_backoff: float = 5.0, max_attempts: int = 5,
+                 max_deliveries: int = 5):
+        self.bot = None
+        self.outbox = outbox
+        self.coalesce_window = max(0.0, coalesce_window)
+        self.max_delay = max(max_delay, self.coalesce_window)
+        self.edit_window = edit_window
+        self.base_delay = base_delay
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.max_deliveries = max(1, max_deliveries)  # سقف دورهای ارسال یک رکورد outbox
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self.orderer = FanoutOrderer(fanout_order)
+        self.leases = leases  # LeaseManager در حالت چند نمونه‌ای؛ فقط shardهای خودی ارسال می‌شوند
+        self._shards: Optional[set] = None
+
+        self._pending: Dict[int, PendingAlerts] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._sender_task: Optional[asyncio.Task] = None
+        self._live: Dict[tuple, LiveAlert] = {}  # (chat_id, doctor.id) -> آخرین پیام
+
+        # وضعیت drain صندوق خروجی
+        self._drain_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._cursor = 0  # بزرگ‌ترین شناسه outbox که به بافر تحویل شده
+        self._in_flight: set = set()  # شناسه‌های تحویل‌شده به بافر که هنوز نتیجه‌شان ثبت نشده
+        self._sent_ids: List[int] = []
+        self._failed_ids: List[int] = []
+        self._retry_ids: List[int] = []  # خطای موقت: در انتظار می‌مانند تا دور بعدی drain
+        self._last_purge = 0.0
+        self._doctors: Dict[int, object] = {}  # آخرین شیء هر دکتر برای ساخت پیام
+        self._snapshots: Dict[int, list] = {}  # آخرین لیست کامل نوبت‌های هر دکتر
+        # چت‌های غیرقابل دسترس تا وقتی کاربرشان در دیتابیس غیرفعال شود؛ بعد از آن
+        # فیلتر User.is_active (مشترکین و outbox) جایشان را می‌گیرد و /start دوباره کافی است
+        self._dead_chats: set = set()  # در انتظار غیرفعال‌سازی
+        self._deactivating: set = set()  # در حال غیرفعال‌سازی
+        self._user_latency: Dict[int, deque] = {}  # chat_id -> تاخیرهای اخیر تحویل (ثانیه)
+
+        self._alerts_produced = metrics.counter('notifier.alerts_produced')
+        self._alerts_delivered = metrics.counter('notifier.alerts_delivered')
+        self._messages_sent = metrics.counter('notifier.messages_sent')
+        self._messages_edited = metrics.counter('notifier.messages_edited')
+        self._edits_skipped = metrics.counter('notifier.edits_skipped_unchanged')
+        self._send_failures = metrics.counter('notifier.send_failures')
+        self._dead_chats_pruned = metrics.counter('notifier.dead_chats_pruned')
+        self._coalesce_delay = metrics.histogram('notifier.coalesce_delay_seconds')
+        self._delivery_latency = metrics.histogram('notifier.delivery_latency_seconds')
+        self._outbox_enqueued = metrics.counter('outbox.rows_enqueued')
+        self._outbox_duplicates = metrics.counter('outbox.duplicates_skipped')
+        self._outbox_sent = metrics.counter('outbox.rows_sent')
+        self._outbox_failed = metrics.counter('outbox.rows_failed')
+        self._outbox_retried = metrics.counter('outbox.rows_retried')
+        self._outbox_backlog = metrics.gauge('outbox.backlog')
+        self._outbox_age = metrics.gauge('outbox.oldest_pending_age_seconds')
+
+    def attach(self, bot):
+        """اتصال به شیء bot تلگرام"""
+        self.bot = bot
+
+    async def start(self):
+        """شروع task ارسال"""
+        if self._sender_task is None:
+            self._ready = asyncio.Queue()
+            self._wake = asyncio.Event()
+            self._sender_task = asyncio.create_task(self._sender_loop())
+            self._drain_task = asyncio.create_task(self._drain_loop())
+            logger.info(
+                f"📬 اطلاع‌رسانی فعال شد (پنجره ادغام {self.coalesce_window}s، سقف تاخیر {self.max_delay}s)"
+            )
+
+    async def stop(self, timeout: float = 10.0):
+        """ارسال هشدارهای باقی‌مانده و توقف"""
+        if self._sender_task is None:
+            return
+        self._drain_task.cancel()
+        self._drain_task = None
+        try:
+            await asyncio.wait_for(self.flush_all(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self._ready.qsize()} پیام در صف ارسال باقی ماند (در outbox می‌ماند)")
+        self._sender_task.cancel()
+        self._sender_task = None
+        try:
+            await self._record_outcomes()
+        except Exception as e:
+            logger.error(f"❌ خطا در ثبت وضعیت outbox: {e}")
+
+    # ==================== Outbox ====================
+
+    async def publish(self, doctor, chat_ids: List[int], appointments) -> int:
+        """
+        ثبت نوبت‌های یک دکتر برای مشترکین در صندوق خروجی
+
+        Returns:
+            تعداد (چت، نوبت)های جدید که باید اعلام شوند
+        """
+        self._doctors[doctor.id] = doctor
+        self._snapshots[doctor.id] = list(appointments)
+        inserted, duplicates = await self.outbox.add(doctor.id, chat_ids, appointments)
+        self._outbox_enqueued.inc(inserted)
+        self._outbox_duplicates.inc(duplicates)
+        if inserted and self._wake is not None:
+            self._wake.set()
+        self._schedule_shrink_edits(doctor, chat_ids, appointments)
+        return inserted
+
+    def _schedule_shrink_edits(self, doctor, chat_ids: List[int], appointments):
+        """
+        ویرایش پیام‌های زنده‌ای که نوبت گرفته‌شده نشان می‌دهند
+
+        کوچک شدن لیست رکورد جدیدی در outbox نمی‌سازد؛ برای چت‌هایی که پیام
+        این دکتر هنوز در edit_window است، لیست فعلی مستقیماً به بافر می‌رود.
+        """
+        if self._ready is None or self.edit_window <= 0:
+            return
+        current = {_slot_id(apt) for apt in appointments}
+        now = time.monotonic()
+        for chat_id in chat_ids:
+            live = self._live.get((chat_id, doctor.id))
+            if live is None or now - live.sent_at > self.edit_window:
+                continue
+            _, shown = live.entries.get(doctor.id, (None, []))
+            if any(_slot_id(apt) not in current for apt in shown):
+                self.enqueue(chat_id, doctor, list(appointments))
+
+    async def _drain_loop(self):
+        """برداشتن دسته‌ای رکوردهای در انتظار و تحویل به بافر ادغام"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ خطا در drain صندوق خروجی: {e}")
+
+    async def _drain_once(self):
+        await self._record_outcomes()
+
+        shards, num_shards = None, 0
+        if self.leases is not None:
+            shards, num_shards = self.leases.owned_shards(), self.leases.num_shards
+            if shards != self._shards:
+                # shard تازه ممکن است رکوردهای قبل از cursor داشته باشد
+                self._shards, self._cursor = shards, 0
+            if not shards:
+                return
+
+        rows = await self.outbox.fetch_pending(self._cursor, self.batch_size, shards, num_shards)
+        if not rows and self._cursor:
+            # برگشت به ابتدا تا رکوردهایی که دیرتر commit شده‌اند جا نمانند
+            self._cursor = 0
+            rows = await self.outbox.fetch_pending(0, self.batch_size, shards, num_shards)
+        if rows:
+            self._cursor = rows[-1].id
+            groups = defaultdict(list)
+            for row in rows:
+                if row.id in self._in_flight:
+                    continue
+                self._in_flight.add(row.id)
+                groups[(row.chat_id, row.doctor_id)].append(row)
+
+            missing = {doctor_id for _, doctor_id in groups if doctor_id not in self._doctors}
+            if missing:
+                self._doctors.update(await self.outbox.load_doctors(missing))
+
+            for (chat_id, doctor_id), group in groups.items():
+                ids = [row.id for row in group]
+                doctor = self._doctors.get(doctor_id)
+                if doctor is None or self._is_dead(chat_id):
+                    self._failed_ids.extend(ids)
+                    continue
+                # لیست کامل فعلی (در صورت وجود) به جای فقط نوبت‌های جدید
+                appointments = self._snapshots.get(doctor_id) or [
+                    Appointment(**json.loads(row.payload)) for row in group
+                ]
+                produced_at = min(
+                    row.created_at.replace(tzinfo=timezone.utc).timestamp()
+                    for row in group if row.created_at
+                ) if any(row.created_at for row in group) else None
+                self.enqueue(chat_id, doctor, appointments, outbox_ids=ids, produced_at=produced_at)
+
+            # دسته کامل بود: احتمالاً رکوردهای بیشتری در انتظارند
+            if len(rows) == self.batch_size:
+                self._wake.set()
+
+        count, age = await self.outbox.backlog()
+        self._outbox_backlog.set(count)
+        self._outbox_age.set(age or 0.0)
+
+        if time.monotonic() - self._last_purge > 3600:
+            self._last_purge = time.monotonic()
+            purged = await self.outbox.purge(self.retention_days)
+            if purged:
+                logger.info(f"🧹 {purged} رکورد قدیمی از صندوق خروجی حذف شد")
+
+    async def _record_outcomes(self):
+        """ثبت دسته‌ای نتیجه ارسال‌ها و غیرفعال‌سازی چت‌های مرده در دیتابیس"""
+        if self._dead_chats:
+            chat_ids, self._dead_chats = list(self._dead_chats), set()
+            self._deactivating.update(chat_ids)
+            try:
+                deactivated = await deactivate_chats(self.outbox.db_manager, chat_ids)
+                await self.outbox.fail_chats(chat_ids, "chat unreachable")
+            except Exception:
+                self._dead_chats.update(chat_ids)  # دور بعدی دوباره تلاش می‌شود
+                raise
+            finally:
+                self._deactivating.difference_update(chat_ids)
+            self._dead_chats_pruned.inc(len(chat_ids))
+            logger.info(f"🧹 {len(chat_ids)} چت غیرقابل دسترس حذف شد ({deactivated} کاربر غیرفعال شد)")
+        if self._sent_ids:
+            ids, self._sent_ids = self._sent_ids, []
+            await self.outbox.mark_sent(ids)
+            self._in_flight.difference_update(ids)
+            self._outbox_sent.inc(len(ids))
+        if self._failed_ids:
+            ids, self._failed_ids = self._failed_ids, []
+            await self.outbox.mark_failed(ids, "delivery failed")
+            self._in_flight.difference_update(ids)
+            self._outbox_failed.inc(len(ids))
+        if self._retry_ids:
+            ids, self._retry_ids = self._retry_ids, []
+            exhausted = await self.outbox.mark_retry(ids, "transient delivery failure", self.max_deliveries)
+            # آزاد از in_flight تا drain بعدی دوباره برشان دارد
+            self._in_flight.difference_update(ids)
+            self._outbox_retried.inc(len(ids) - exhausted)
+            self._outbox_failed.inc(exhausted)
+
+    # ==================== Coalescing ====================
+
+    def enqueue(self, chat_id: int, doctor, appointments, outbox_ids: Optional[List[int]] = None,
+                produced_at: Optional[float] = None):
+        """افزودن هشدار یک دکتر به بافر چت"""
+        if self._ready is None:
+            raise RuntimeError("Notifier شروع نشده است")
+        if self._is_dead(chat_id):
+            return
+
+        now = time.monotonic()
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            pending = PendingAlerts(chat_id=chat_id, first_at=now, last_at=now)
+            self._pending[chat_id] = pending
+            self._timers[chat_id] = asyncio.create_task(self._flush_when_due(chat_id))
+
+        # هشدار جدیدتر همان دکتر جایگزین قبلی می‌شود
+        pending.entries[doctor.id] = (doctor, appointments)
+        pending.last_at = now
+        pending.alert_count += 1
+        pending.outbox_ids.extend(outbox_ids or [])
+        produced_at = produced_at or time.time()
+        if pending.produced_at is None or produced_at < pending.produced_at:
+            pending.produced_at = produced_at
+        self._alerts_produced.inc()
+
+    def _due_at(self, pending: PendingAlerts) -> float:
+        return min(pending.last_at + self.coalesce_window, pending.first_at + self.max_delay)
+
+    async def _flush_when_due(self, chat_id: int):
+        """صبر تا پایان پنجره ادغام (با سقف max_delay) و انتقال به صف ارسال"""
+        try:
+            while True:
+                pending = self._pending.get(chat_id)
+                if pending is None:
+                    return
+                wait = self._due_at(pending) - time.monotonic()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._flush(chat_id)
+        except asyncio.CancelledError:
+            pass
+
+    def _flush(self, chat_id: int):
+        pending = self._pending.pop(chat_id, None)
+        self._timers.pop(chat_id, None)
+        if pending is not None:
+            self._coalesce_delay.observe(time.monotonic() - pending.first_at)
+            self._ready.put_nowait(pending)
+
+    async def flush_all(self):
+        """ارسال فوری همه هشدارهای در انتظار"""
+        if self._ready is None:
+            return
+        for chat_id in list(self._pending):
+            timer = self._timers.get(chat_id)
+            if timer:
+                timer.cancel()
+            self._flush(chat_id)
+        await self._ready.join()
+
+    # ==================== Delivery ====================
+
+    async def _sender_loop(self):
+        """ارسال ترتیبی پیام‌ها با رعایت نرخ؛ هر دور شامل همه دسته‌های آماده است"""
+        while True:
+            batches = [await self._ready.get()]
+            while not self._ready.empty():
+                batches.append(self._ready.get_nowait())
+
+            for pending in self.orderer.order(batches):
+                outcome = self._failed_ids
+                try:
+                    if not self._is_dead(pending.chat_id) and await self._deliver(pending):
+                        outcome = self._sent_ids
+                        self._record_latency(pending)
+                except Exception as e:
+                    if is_transient_failure(e):
+                        logger.warning(f"⏳ ارسال هشدار به {pending.chat_id} بعداً تکرار می‌شود: {e}")
+                        outcome = self._retry_ids
+                    else:
+                        logger.error(f"❌ خطا در ارسال هشدار به {pending.chat_id}: {e}")
+                finally:
+                    self._ready.task_done()
+                outcome.extend(pending.outbox_ids)
+                if pending.outbox_ids:
+                    # ثبت فوری نتیجه تا ری‌استارت در این فاصله پیام تکراری نفرستد
+                    try:
+                        await self._record_outcomes()
+                    except Exception as e:
+                        logger.error(f"❌ خطا در ثبت وضعیت outbox: {e}")
+
+    def _record_latency(self, pending: PendingAlerts):
+        """ثبت تاخیر از ثبت هشدار تا تحویل، به تفکیک کاربر"""
+        if pending.produced_at is None:
+            return
+        latency = max(0.0, time.time() - pending.produced_at)
+        self._delivery_latency.observe(latency)
+        samples = self._user_latency.get(pending.chat_id)
+        if samples is None:
+            samples = self._user_latency[pending.chat_id] = deque(maxlen=32)
+        samples.append(latency)
+
+    async def _deliver(self, pending: PendingAlerts) -> bool:
+        """ارسال یا ویرایش پیام یک چت؛ True در صورت تحویل"""
+        now = time.monotonic()
+        self._prune_live(now)
+
+        live = self._find_live_message(pending, now)
+        if live is not None:
+            # فقط لیست نوبت‌ها عوض شده: ویرایش همان پیام قبلی
+            entries = dict(live.entries)
+            entries.update(pending.entries)
+            text = MessageFormatter.coalesced_alert_message(list(entries.values()))
+            if text == live.text:
+                self._edits_skipped.inc()
+                self._alerts_delivered.inc(pending.alert_count)
+                return True
+            if await self._edit(pending.chat_id, live.message_id, text):
+                live.entries = entries
+                live.text = text
+                for doctor_id in pending.entries:
+                    self._live[(pending.chat_id, doctor_id)] = live
+                self._messages_edited.inc()
+                self._alerts_delivered.inc(pending.alert_count)
+                await asyncio.sleep(self.base_delay + random.uniform(0, 0.15))
+                return True
+            # پیام قبلی قابل ویرایش نیست (مثلاً حذف شده): پیام جدید
+            self._forget_live(pending.chat_id, live)
+
+        # لیست خالی فقط برای ویرایش پیام زنده است، نه پیام جدید
+        entries = {doctor_id: entry for doctor_id, entry in pending.entries.items() if entry[1]}
+        text = MessageFormatter.coalesced_alert_message(list(entries.values()))
+        if not text:
+            return True
+        message = await self._send(pending.chat_id, text)
+        if message is not None:
+            self._messages_sent.inc()
+            self._alerts_delivered.inc(pending.alert_count)
+            self._remember_live(pending.chat_id, message.message_id, entries, text, now)
+        await asyncio.sleep(self.base_delay + random.uniform(0, 0.15))
+        return message is not None
+
+    async def _call_with_retry(self, chat_id: int, make_call):
+        """
+        اجرای یک درخواست Bot API با مدیریت RetryAfter و backoff
+
+        BadRequest و خطاهای غیرقابل تکرار به فراخواننده برگردانده می‌شوند.
+        """
+        attempts = 0
+        while True:
+            try:
+                return await make_call()
+            except RetryAfter as e:
+                wait_time = getattr(e, 'retry_after', 2)
+                logger.warning(f"⏳ Telegram rate limit (RetryAfter {wait_time}s) for {chat_id}")
+                await asyncio.sleep(wait_time + random.uniform(0, 0.5))
+            except BadRequest:
+                raise
+            except (TimedOut, NetworkError) as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    raise
+                backoff = min(self.base_delay * (2 ** attempts), self.max_backoff)
+                logger.warning(f"🌐 {type(e).__name__}: {e}. retrying in {backoff:.2f}s (attempt {attempts})")
+                await asyncio.sleep(backoff)
+
+    async def _send(self, chat_id: int, text: str):
+        """
+        ارسال پیام جدید؛ در صورت شکست None
+
+        خطاهای موقت (پس از تمام شدن تلاش‌های _call_with_retry) دوباره raise
+        می‌شوند تا رکوردهای outbox در انتظار بمانند.
+        """
+        try:
+            return await self._call_with_retry(
+                chat_id,
+                lambda: self.bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+            )
+        except Exception as e:
+            self._send_failures.inc()
+            if is_permanent_failure(e):
+                logger.info(f"🚫 چت {chat_id} غیرقابل دسترس است ({e})")
+                self._prune_chat(chat_id)
+            elif is_transient_failure(e):
+                raise
+            else:
+                logger.error(f"❌ خطا در ارسال به {chat_id}: {e}")
+            return None
+
+    async def _edit(self, chat_id: int, message_id: int, text: str) -> bool:
+        """ویرایش پیام هشدار قبلی"""
+        try:
+            await self._call_with_retry(
+                chat_id,
+                lambda: self.bot.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=text, parse_mode='HTML'
+                )
+            )
+            return True
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return True
+            if is_permanent_failure(e):
+                self._prune_chat(chat_id)
+            logger.debug(f"✏️ ویرایش پیام {message_id} در {chat_id} ممکن نشد: {e}")
+            return False
+        except Exception as e:
+            if is_permanent_failure(e):
+                self._prune_chat(chat_id)
+            logger.warning(f"⚠️ خطا در ویرایش پیام {message_id} در {chat_id}: {e}")
+            return False
+
+    def _is_dead(self, chat_id: int) -> bool:
+        return chat_id in self._dead_chats or chat_id in self._deactivating
+
+    def _prune_chat(self, chat_id: int):
+        """حذف فوری چت مرده از ساختارهای حافظه؛ غیرفعال‌سازی دیتابیس دسته‌ای انجام می‌شود"""
+        if self._is_dead(chat_id):
+            return
+        self._dead_chats.add(chat_id)
+
+        pending = self._pending.pop(chat_id, None)
+        timer = self._timers.pop(chat_id, None)
+        if timer:
+            timer.cancel()
+        if pending is not None:
+            self._failed_ids.extend(pending.outbox_ids)
+        for key in [key for key in self._live if key[0] == chat_id]:
+            del self._live[key]
+        self._user_latency.pop(chat_id, None)
+        self.orderer.forget(chat_id)
+
+    # ==================== Live Messages ====================
+
+    def _find_live_message(self, pending: PendingAlerts, now: float) -> Optional[LiveAlert]:
+        """پیام زنده‌ای که همه دکترهای این دسته را پوشش می‌دهد (در پنجره ویرایش)"""
+        if self.edit_window <= 0:
+            return None
+        live = None
+        for doctor_id in pending.entries:
+            candidate = self._live.get((pending.chat_id, doctor_id))
+            if candidate is None or (live is not None and candidate is not live):
+                return None
+            live = candidate
+        if live is None or now - live.sent_at > self.edit_window:
+            return None
+        return live
+
+    def _remember_live(self, chat_id: int, message_id: int, entries: Dict[int, tuple], text: str, now: float):
+        if self.edit_window <= 0:
+            return
+        live = LiveAlert(message_id=message_id, sent_at=now, entries=entries, text=text)
+        for doctor_id in entries:
+            self._live[(chat_id, doctor_id)] = live
+
+    def _forget_live(self, chat_id: int, live: LiveAlert):
+        for doctor_id in live.entries:
+            if self._live.get((chat_id, doctor_id)) is live:
+                del self._live[(chat_id, doctor_id)]
+
+    def _prune_live(self, now: float):
+        """حذف پیام‌های زنده‌ای که از پنجره ویرایش خارج شده‌اند"""
+        expired = [key for key, live in self._live.items() if now - live.sent_at > self.edit_window]
+        for key in expired:
+            del self._live[key]
+
+    # ==================== Stats ====================
+
+    def get_fairness_report(self, worst: int = 5) -> Dict:
+        """صدک‌های تاخیر تحویل هر کاربر برای اطمینان از عدم تبعیض سیستماتیک"""
+        per_user = {}
+        for chat_id, samples in self._user_latency.items():
+            values = sorted(samples)
+            per_user[chat_id] = {
+                'p50': values[len(values) // 2],
+                'p95': values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+            }
+        if not per_user:
+            return {'policy': self.orderer.policy, 'users': 0}
+
+        p95_values = sorted(v['p95'] for v in per_user.values())
+        worst_users = sorted(per_user.items(), key=lambda item: item[1]['p95'], reverse=True)[:worst]
+        return {
+            'policy': self.orderer.policy,
+            'users': len(per_user),
+            'user_p95_median': round(p95_values[len(p95_values) // 2], 2),
+            'user_p95_max': round(p95_values[-1], 2),
+            'worst_users': [(chat_id, round(v['p95'], 2)) for chat_id, v in worst_users],
+        }
+
+    def get_stats(self) -> Dict:
+        """آمار ادغام: تعداد هشدارها در برابر پیام‌های ارسال‌شده"""
+        delivered = self._alerts_delivered.value
+        sent = self._messages_sent.value
+        edited = self._messages_edited.value
+        return {
+            'alerts_produced': self._alerts_produced.value,
+            'alerts_delivered': delivered,
+            'messages_sent': sent,
+            'messages_edited': edited,
+            'edits_skipped': self._edits_skipped.value,
+            'send_failures': self._send_failures.value,
+            'dead_chats_pruned': self._dead_chats_pruned.value,
+            'pending_chats': len(self._pending),
+            'live_messages': len(self._live),
+            # هر پیام جدید یا ویرایش یک فراخوانی Bot API است
+            'reduction_percent': round((1 - (sent + edited) / delivered) * 100, 1) if delivered else 0.0,
+            'coalesce_delay': self._coalesce_delay.summary(),
+            'delivery_latency': self._delivery_latency.summary(),
+            'outbox_backlog': int(self._outbox_backlog.value),
+            'outbox_oldest_age': round(self._outbox_age.value, 1),
+            'outbox_duplicates_skipped': self._outbox_duplicates.value,
+        }
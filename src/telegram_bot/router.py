@@ -0,0 +1,132 @@
+"""
+مسیریاب جدول‌محور callback_data دکمه‌های inline
+
+مسیرها یک بار کامپایل می‌شوند: مسیرهای ثابت (مثل "show_doctors") با یک
+جستجوی dict و مسیرهای پارامتری (مثل "doctor_info_{doctor_id:int}") بر اساس
+پیشوند ثابتشان پیدا می‌شوند و پارامترها با نوع درست به handler داده می‌شوند.
+زمان اجرا و خطاهای هر مسیر در متریک‌های callback.<route>.* ثبت می‌شود.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Pattern, Tuple
+
+from src.utils.metrics import metrics
+
+RouteHandler = Callable[..., Awaitable[Any]]
+
+# نوع پارامتر → (الگوی regex، تبدیل)
+CONVERTERS: Dict[str, Tuple[str, Callable[[str], Any]]] = {
+    'int': (r'-?\d+', int),
+    'str': (r'[^_]+', str),
+    'rest': (r'.*', str),  # باقی‌مانده رشته (برای مسیرهای پیشوندی)
+}
+PARAM = re.compile(r'\{(?P<name>[A-Za-z_]\w*)(?::(?P<type>\w+))?\}')
+
+
+@dataclass
+class Route:
+    pattern: str
+    handler: RouteHandler
+    name: str
+    regex: Optional[Pattern] = None
+    converters: Dict[str, Callable[[str], Any]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.latency = metrics.histogram(f'callback.{self.name}.seconds')
+        self.errors = metrics.counter(f'callback.{self.name}.errors')
+
+    @property
+    def prefix(self) -> str:
+        """بخش ثابت ابتدای الگو"""
+        match = PARAM.search(self.pattern)
+        return self.pattern[:match.start()] if match else self.pattern
+
+    def match(self, data: str) -> Optional[Dict[str, Any]]:
+        found = self.regex.fullmatch(data)
+        if found is None:
+            return None
+        return {key: self.converters[key](value) for key, value in found.groupdict().items()}
+
+
+class CallbackRouter:
+    """جدول مسیرهای callback با زمان‌سنجی هر مسیر"""
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._by_prefix: Dict[str, List[Route]] = {}
+        self._prefix_lengths: List[int] = []  # نزولی: طولانی‌ترین پیشوند اول بررسی می‌شود
+
+    def add(self, pattern: str, handler: RouteHandler, name: Optional[str] = None):
+        """ثبت یک مسیر ثابت یا پارامتری"""
+        route = Route(pattern, handler, name or PARAM.sub('', pattern).strip('_') or pattern)
+        if not PARAM.search(pattern):
+            if pattern in self._exact:
+                raise ValueError(f"مسیر تکراری: {pattern}")
+            self._exact[pattern] = route
+            return route
+
+        regex, position = [], 0
+        for param in PARAM.finditer(pattern):
+            kind = param.group('type') or 'str'
+            if kind not in CONVERTERS:
+                raise ValueError(f"نوع پارامتر ناشناخته '{kind}' در مسیر {pattern}")
+            expression, convert = CONVERTERS[kind]
+            regex.append(re.escape(pattern[position:param.start()]))
+            regex.append(f"(?P<{param.group('name')}>{expression})")
+            route.converters[param.group('name')] = convert
+            position = param.end()
+        regex.append(re.escape(pattern[position:]))
+        route.regex = re.compile(''.join(regex))
+
+        self._by_prefix.setdefault(route.prefix, []).append(route)
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._by_prefix}, reverse=True)
+        return route
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, Dict[str, Any]]]:
+        """پیدا کردن مسیر و پارامترهای یک callback_data"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+        for length in self._prefix_lengths:
+            if length > len(data):
+                continue
+            for route in self._by_prefix.get(data[:length], ()):
+                params = route.match(data)
+                if params is not None:
+                    return route, params
+        return None
+
+    async def dispatch(self, data: str, *args) -> bool:
+        """اجرای handler مسیر؛ False اگر مسیری پیدا نشود"""
+        resolved = self.resolve(data)
+        if resolved is None:
+            metrics.counter('callback.unmatched').inc()
+            return False
+        route, params = resolved
+        started = time.perf_counter()
+        try:
+            await route.handler(*args, **params)
+        except Exception:
+            route.errors.inc()
+            raise
+        finally:
+            route.latency.observe(time.perf_counter() - started)
+        return True
+
+    @property
+    def routes(self) -> List[Route]:
+        return list(self._exact.values()) + [r for routes in self._by_prefix.values() for r in routes]
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """زمان اجرا (p50/p95) و خطاهای هر مسیر، مرتب از کندترین"""
+        stats = {}
+        for route in self.routes:
+            if route.latency.count:
+                stats[route.name] = {
+                    'count': route.latency.count,
+                    'p50': round(route.latency.percentile(50), 4),
+                    'p95': round(route.latency.percentile(95), 4),
+                    'errors': route.errors.value,
+                }
+        return dict(sorted(stats.items(), key=lambda item: item[1]['p95'], reverse=True))
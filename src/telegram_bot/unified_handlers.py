@@ -2,19 +2,26 @@
 Enhanced Telegram Handlers - نسخه بهبود یافته با متن‌های جذاب
 """
 import asyncio
+import html
 import re
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 from typing import List
 from datetime import datetime
 
-from src.database.models import User, Doctor, Subscription, DoctorCenter, DoctorService
+from src.database.models import User, Doctor, Subscription, DoctorService
+from src.database.counters import adjust_subscriber_count
+from src.database.identity import UserIdentity
+from src.database.queries import subscription_query, user_query, user_subscriptions_query
 from src.telegram_bot.messages import MessageFormatter
 from src.telegram_bot.doctor_handlers import DoctorHandlers
+from src.telegram_bot.router import CallbackRouter
 from src.api.doctor_manager import DoctorManager
+from src.api.bulk_import import BulkDoctorImporter, parse_sources
 from src.utils.logger import get_logger
+from src.utils.metrics import metrics
 
 logger = get_logger("EnhancedHandlers")
 
@@ -22,10 +29,33 @@ logger = get_logger("EnhancedHandlers")
 class UnifiedTelegramHandlers:
     """کلاس پیشرفته handlers تلگرام - نسخه بهبود یافته"""
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, admin_chat_id: int = 0, page_size: int = 8,
+                 importer: BulkDoctorImporter = None, import_max_items: int = 500,
+                 doctor_manager: DoctorManager = None):
         self.db_manager = db_manager
-        self.doctor_handlers = DoctorHandlers(db_manager)
-        self.doctor_manager = DoctorManager(db_manager)
+        self.admin_chat_id = admin_chat_id
+        self.page_size = page_size
+        self.doctor_manager = doctor_manager or DoctorManager(db_manager)
+        self.doctor_handlers = DoctorHandlers(db_manager, self.doctor_manager)
+        self.importer = importer or BulkDoctorImporter(db_manager)
+        self.import_max_items = import_max_items
+        self._import_task = None  # فقط یک ورود دسته‌ای در هر لحظه
+        self.callbacks = self._build_callback_router()
+    
+    def _build_callback_router(self) -> CallbackRouter:
+        """جدول مسیرهای دکمه‌های inline؛ هر handler با (update, context, **پارامترها) صدا زده می‌شود"""
+        router = CallbackRouter()
+        router.add("show_doctors", self._callback_show_doctors)
+        router.add("doctors_next_{after_id:int}", self._callback_doctors_page)
+        router.add("doctors_prev_{before_id:int}", self._callback_doctors_page)
+        router.add("my_subscriptions", self._callback_show_subscriptions)
+        router.add("doctor_info_{doctor_id:int}", self._callback_doctor_info)
+        router.add("subscribe_{doctor_id:int}", self._callback_subscribe)
+        router.add("unsubscribe_{doctor_id:int}", self._callback_unsubscribe)
+        router.add("add_doctor", self._callback_add_doctor)
+        router.add("check_appointments_{doctor_id:int}", self.doctor_handlers.check_doctor_appointments)
+        router.add("back_to_main", self._callback_back_to_main)
+        return router
     
     # ==================== Command Handlers ====================
     
@@ -34,30 +64,43 @@ class UnifiedTelegramHandlers:
         try:
             user = update.effective_user
             
-            # ثبت/به‌روزرسانی کاربر
+            # ثبت کاربر جدید یا فعال‌سازی دوباره؛ پروفایل و زمان فعالیت از بافر نوشته می‌شوند
             async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(User).filter(User.telegram_id == user.id)
-                )
+                result = await session.execute(user_query(user.id))
                 db_user = result.scalar_one_or_none()
-                
-                if not db_user:
-                    db_user = User(
-                        telegram_id=user.id,
-                        username=user.username,
-                        first_name=user.first_name,
-                        last_name=user.last_name
-                    )
-                    session.add(db_user)
+            
+            is_new_user = False
+            if not db_user or not db_user.is_active:
+                async def _register(session):
+                    # بررسی دوباره داخل تراکنش نوشتن (آپدیت‌ها همزمان پردازش می‌شوند)
+                    result = await session.execute(user_query(user.id))
+                    existing = result.scalar_one_or_none()
+                    if not existing:
+                        existing = User(
+                            telegram_id=user.id,
+                            username=user.username,
+                            first_name=user.first_name,
+                            last_name=user.last_name
+                        )
+                        session.add(existing)
+                        await session.flush()
+                        return existing, 'new'
+                    if not existing.is_active:
+                        existing.is_active = True
+                        return existing, 'reactivated'
+                    return existing, None
+                
+                db_user, change = await self.db_manager.run_write(_register)
+                if change == 'new':
                     logger.info(f"👤 کاربر جدید: {user.first_name}")
                     is_new_user = True
-                else:
-                    db_user.username = user.username
-                    db_user.first_name = user.first_name
-                    db_user.last_name = user.last_name
-                    db_user.is_active = True
-                    db_user.last_activity = datetime.utcnow()
-                    is_new_user = False
+                    self.db_manager.stats.adjust(all_users=1, total_users=1)
+                elif change == 'reactivated':
+                    self.db_manager.stats.adjust(total_users=1)
+            
+            self.db_manager.identities.put(UserIdentity.from_user(db_user))
+            if not is_new_user:
+                self.db_manager.activity.record(user)
             
             # پیام خوش‌آمدگویی بهبود یافته
             if is_new_user:
@@ -137,6 +180,118 @@ class UnifiedTelegramHandlers:
         """دستور /doctors"""
         await self._show_doctors_list(update.message)
     
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """دستور /search - جستجو در نام، تخصص و مراکز دکترها"""
+        query = " ".join(context.args or [])
+        if not query.strip():
+            await update.message.reply_text(
+                "🔎 <b>جستجوی دکتر</b>\n\n"
+                "بعد از دستور، نام دکتر، تخصص یا اسم مرکز رو بنویس.\n"
+                "📋 <b>مثال:</b> <code>/search قلب تهران</code>\n\n"
+                "💡 می‌تونی بدون دستور هم فقط اسم رو بفرستی.",
+                parse_mode='HTML'
+            )
+            return
+        if not await self._show_search_results(update.message, query):
+            await update.message.reply_text(
+                f"😔 دکتری با «{html.escape(query)}» پیدا نشد.\n\n"
+                "💡 می‌تونی لینک دکتر رو از پذیرش۲۴ بفرستی تا اضافه کنم.",
+                parse_mode='HTML'
+            )
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """دستور /stats (ادمین) - پاسخ فوری از snapshot آمار"""
+        try:
+            if not await self._is_admin(update.effective_user.id):
+                await update.message.reply_text(MessageFormatter.access_denied_message(), parse_mode='HTML')
+                return
+            stats = await self.db_manager.stats.get()
+            await update.message.reply_text(MessageFormatter.admin_stats_message(stats), parse_mode='HTML')
+        except Exception as e:
+            logger.error(f"❌ خطا در آمار: {e}")
+            await self._send_error_message(update.message, str(e))
+    
+    async def report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """دستور /report (ادمین) - گزارش کامل سیستم"""
+        try:
+            if not await self._is_admin(update.effective_user.id):
+                await update.message.reply_text(MessageFormatter.access_denied_message(), parse_mode='HTML')
+                return
+            stats = await self.db_manager.stats.get()
+            stats['appointments_found_today'] = stats['appointments_today']
+            # زمان پایان آخرین دور بررسی نوبت‌ها (نه عمر snapshot آمار)
+            last_round = metrics.gauge('monitor.last_round_at').value
+            stats['last_check'] = f"{int(time.time() - last_round)} ثانیه پیش" if last_round else "نامشخص"
+            try:
+                import psutil
+                stats['memory_usage'] = f"{psutil.Process().memory_info().rss / 1024 / 1024:.0f} MB"
+            except ImportError:
+                pass
+            await update.message.reply_text(MessageFormatter.admin_report_message(stats), parse_mode='HTML')
+        except Exception as e:
+            logger.error(f"❌ خطا در گزارش: {e}")
+            await self._send_error_message(update.message, str(e))
+    
+    async def import_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """دستور /import (ادمین) - ورود دسته‌ای دکترها از فایل یا لیست آدرس‌ها"""
+        message = update.message
+        try:
+            if not await self._is_admin(update.effective_user.id):
+                await message.reply_text(MessageFormatter.access_denied_message(), parse_mode='HTML')
+                return
+            if self._import_task is not None and not self._import_task.done():
+                await message.reply_text("⏳ یک ورود دسته‌ای در حال اجراست؛ بعد از پایانش دوباره امتحان کن.")
+                return
+            
+            # فایل پیوست همین پیام یا پیامی که به آن پاسخ داده شده، یا آدرس‌های بعد از دستور
+            document = message.document or (message.reply_to_message and message.reply_to_message.document)
+            if document is not None:
+                if document.file_size and document.file_size > 1024 * 1024:
+                    await message.reply_text("❌ حجم فایل بیش از ۱ مگابایت است")
+                    return
+                data = await (await document.get_file()).download_as_bytearray()
+                sources = parse_sources(bytes(data).decode('utf-8', errors='replace'))
+            else:
+                text = message.text or message.caption or ''
+                sources = parse_sources(text.split(None, 1)[1] if len(text.split(None, 1)) > 1 else '')
+            
+            if not sources:
+                await message.reply_text(
+                    "📥 **ورود دسته‌ای دکترها**\n\n"
+                    "یک فایل متنی (هر خط یک لینک یا slug) با کپشن /import بفرست،\n"
+                    "یا روی فایل ریپلای کن و /import بزن،\n"
+                    "یا لینک‌ها رو خط به خط بعد از /import بنویس.",
+                    parse_mode='HTML'
+                )
+                return
+            if len(sources) > self.import_max_items:
+                await message.reply_text(f"❌ حداکثر {self.import_max_items} آدرس در هر ورود مجاز است ({len(sources)} ارسال شد)")
+                return
+            
+            await message.reply_text(f"⏳ ورود {len(sources)} آدرس شروع شد؛ گزارش بعد از پایان ارسال می‌شود.")
+            # اجرا در پس‌زمینه تا صف آپدیت‌های این چت آزاد بماند
+            self._import_task = context.application.create_task(self._run_import(message, sources))
+            
+        except Exception as e:
+            logger.error(f"❌ خطا در ورود دسته‌ای: {e}")
+            await self._send_error_message(message, str(e))
+    
+    async def _run_import(self, message, sources: List[str]):
+        try:
+            report = await self.importer.run(sources)
+            text = report.format()
+        except Exception as e:
+            logger.error(f"❌ خطا در ورود دسته‌ای: {e}")
+            text = f"❌ ورود دسته‌ای ناموفق بود: {e}"
+        # محدودیت طول پیام تلگرام
+        await message.reply_text(text if len(text) <= 4000 else text[:4000] + "\n...")
+    
+    async def _is_admin(self, user_id: int) -> bool:
+        """ادمین: شناسه ADMIN_CHAT_ID یا کاربر با is_admin در دیتابیس"""
+        if self.admin_chat_id and user_id == self.admin_chat_id:
+            return True
+        return await self.doctor_handlers._is_admin(user_id)
+    
     # ==================== Message Handlers ====================
     
     async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -144,13 +299,19 @@ class UnifiedTelegramHandlers:
         try:
             text = update.message.text
             user_id = update.effective_user.id
+            self.db_manager.activity.record(update.effective_user)
             
             if text == "👨‍⚕️ دکترها":
                 await self._show_doctors_list(update.message)
             elif text in ["📊 وضعیت من", "📝 اشتراک‌ها"]:
                 await self._show_subscriptions(update.message, user_id)
+            elif self._is_doctor_link(text):
+                # لینک کامل یا slug دکتر: اضافه کردن
+                await self._handle_doctor_url(update.message, text, user_id)
+            elif await self._show_search_results(update.message, text):
+                pass
             elif self._is_doctor_url(text):
-                # اگر پیام شبیه URL دکتر است، سعی کن اضافه کنی
+                # نتیجه‌ای نبود؛ شاید slug یک کلمه‌ای دکتر باشد
                 await self._handle_doctor_url(update.message, text, user_id)
             else:
                 # پیام پیش‌فرض بهبود یافته
@@ -175,26 +336,9 @@ class UnifiedTelegramHandlers:
             query = update.callback_query
             await query.answer()
             
-            data = query.data
-            user_id = query.from_user.id
-            
-            if data == "show_doctors":
-                await self._callback_show_doctors(query)
-            elif data == "my_subscriptions":
-                await self._callback_show_subscriptions(query, user_id)
-            elif data.startswith("doctor_info_"):
-                await self._callback_doctor_info(query, data, user_id)
-            elif data.startswith("subscribe_"):
-                await self._callback_subscribe(query, data, user_id)
-            elif data.startswith("unsubscribe_"):
-                await self._callback_unsubscribe(query, data, user_id)
-            elif data == "add_doctor":
-                await self._callback_add_doctor(query)
-            elif data.startswith("check_appointments_"):
-                await self.doctor_handlers.check_doctor_appointments(update, context)
-            elif data == "back_to_main":
-                await self._callback_back_to_main(query, user_id)
-            else:
+            self.db_manager.activity.record(query.from_user)
+            
+            if not await self.callbacks.dispatch(query.data, update, context):
                 await query.edit_message_text(
                     "❌ **دستور نامشخص!**\n\n"
                     "😅 یه چیزی اشتباه شد. از منوی اصلی استفاده کن.",
@@ -219,17 +363,15 @@ class UnifiedTelegramHandlers:
     
     # ==================== Core Functions ====================
     
-    async def _show_doctors_list(self, message):
-        """نمایش لیست دکترها بهبود یافته"""
+    async def _show_doctors_list(self, message, after_id=None, before_id=None, edit=False):
+        """نمایش یک صفحه از لیست دکترها (از کاتالوگ در حافظه)"""
         try:
-            async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(Doctor).filter(Doctor.is_active == True)
-                )
-                doctors = result.scalars().all()
-                
-                if not doctors:
-                    text = """
+            page = await self.db_manager.catalog.page(
+                self.page_size, after_id=after_id, before_id=before_id
+            )
+            
+            if not page.total:
+                text = """
 😔 **هنوز دکتری اضافه نشده!**
 
 🤔 **چیکار کنی؟**
@@ -239,22 +381,18 @@ class UnifiedTelegramHandlers:
 `https://www.paziresh24.com/dr/دکتر-احمد-محمدی-0/`
 
 💡 **یا از دکمه زیر استفاده کن:**
-                    """
-                    
-                    keyboard = [
-                        [InlineKeyboardButton("🆕 اضافه کردن دکتر", callback_data="add_doctor")],
-                        [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
-                    ]
-                    
-                    await message.reply_text(
-                        text,
-                        parse_mode='HTML',
-                        reply_markup=InlineKeyboardMarkup(keyboard)
-                    )
-                    return
+                """
                 
+                keyboard = [
+                    [InlineKeyboardButton("🆕 اضافه کردن دکتر", callback_data="add_doctor")],
+                    [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
+                ]
+            else:
+                range_text = ""
+                if page.before_id is not None or page.after_id is not None:
+                    range_text = f"\n📄 **{page.start} تا {page.start + len(page.doctors) - 1}**"
                 text = f"""
-👨‍⚕️ **دکترهای موجود ({len(doctors)} دکتر)**
+👨‍⚕️ **دکترهای موجود ({page.total} دکتر)**{range_text}
 
 🎯 **چطور کار می‌کنه؟**
 روی اسم دکتر کلیک کن تا اطلاعات کامل و گزینه ثبت‌نام رو ببینی.
@@ -264,7 +402,7 @@ class UnifiedTelegramHandlers:
                 
                 # ایجاد keyboard بهبود یافته
                 keyboard = []
-                for doctor in doctors:
+                for doctor in page.doctors:
                     specialty_emoji = self._get_specialty_emoji(doctor.specialty)
                     
                     keyboard.append([
@@ -274,13 +412,24 @@ class UnifiedTelegramHandlers:
                         )
                     ])
                 
+                navigation = []
+                if page.before_id is not None:
+                    navigation.append(InlineKeyboardButton("▶️ قبلی", callback_data=f"doctors_prev_{page.before_id}"))
+                if page.after_id is not None:
+                    navigation.append(InlineKeyboardButton("بعدی ◀️", callback_data=f"doctors_next_{page.after_id}"))
+                if navigation:
+                    keyboard.append(navigation)
+                
                 keyboard.extend([
                     [InlineKeyboardButton("🆕 اضافه کردن دکتر", callback_data="add_doctor")],
                     [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
                 ])
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
+            
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            if edit:
+                await message.edit_text(text, parse_mode='HTML', reply_markup=reply_markup)
+            else:
                 await message.reply_text(
                     text,
                     parse_mode='HTML',
@@ -290,29 +439,41 @@ class UnifiedTelegramHandlers:
             logger.error(f"❌ خطا در نمایش لیست دکترها: {e}")
             await self._send_error_message(message, str(e))
     
+    async def _show_search_results(self, message, query: str) -> bool:
+        """نمایش نتایج جستجو به‌صورت دکمه؛ False اگر نتیجه‌ای نباشد"""
+        await self.db_manager.search.ensure_loaded()
+        hits = self.db_manager.search.search(query, limit=self.page_size)
+        if not hits:
+            return False
+        
+        keyboard = [
+            [InlineKeyboardButton(
+                f"{self._get_specialty_emoji(hit.specialty)} {hit.name}",
+                callback_data=f"doctor_info_{hit.id}"
+            )]
+            for hit in hits
+        ]
+        keyboard.append([InlineKeyboardButton("👨‍⚕️ همه دکترها", callback_data="show_doctors")])
+        
+        await message.reply_text(
+            f"🔎 <b>نتایج جستجو برای «{html.escape(query)}»</b>\n\n"
+            "روی اسم دکتر کلیک کن تا اطلاعات کامل رو ببینی.",
+            parse_mode='HTML',
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return True
+    
     async def _show_subscriptions(self, message, user_id):
         """نمایش اشتراک‌ها بهبود یافته"""
         try:
+            user = await self.db_manager.identities.get(user_id)
+            if not user:
+                await message.reply_text("❌ کاربر یافت نشد. لطفاً /start کنید.")
+                return
+            
             async with self.db_manager.session_scope() as session:
-                # دریافت کاربر
-                result = await session.execute(
-                    select(User).filter(User.telegram_id == user_id)
-                )
-                user = result.scalar_one_or_none()
-                
-                if not user:
-                    await message.reply_text("❌ کاربر یافت نشد. لطفاً /start کنید.")
-                    return
-                
                 # دریافت اشتراک‌های فعال
-                sub_result = await session.execute(
-                    select(Subscription)
-                    .options(selectinload(Subscription.doctor))
-                    .filter(
-                        Subscription.user_id == user.id,
-                        Subscription.is_active == True
-                    )
-                )
+                sub_result = await session.execute(user_subscriptions_query(user.user_pk))
                 subscriptions = sub_result.scalars().all()
                 
                 if not subscriptions:
@@ -379,68 +540,67 @@ class UnifiedTelegramHandlers:
     
     # ==================== Callback Methods ====================
     
-    async def _callback_show_doctors(self, query):
+    async def _callback_show_doctors(self, update, context):
         """callback نمایش دکترها"""
-        await self._show_doctors_list(query.message)
+        await self._show_doctors_list(update.callback_query.message)
+    
+    async def _callback_doctors_page(self, update, context, after_id=None, before_id=None):
+        """callback صفحه بعد/قبل لیست دکترها"""
+        await self._show_doctors_list(
+            update.callback_query.message, after_id=after_id, before_id=before_id, edit=True
+        )
     
-    async def _callback_show_subscriptions(self, query, user_id):
+    async def _callback_show_subscriptions(self, update, context):
         """callback نمایش اشتراک‌ها"""
-        await self._show_subscriptions(query.message, user_id)
+        query = update.callback_query
+        await self._show_subscriptions(query.message, query.from_user.id)
     
-    async def _callback_doctor_info(self, query, data, user_id):
+    async def _callback_doctor_info(self, update, context, doctor_id: int):
         """callback اطلاعات دکتر بهب��د یافته"""
+        query = update.callback_query
+        user_id = query.from_user.id
         try:
-            doctor_id = int(data.split("_")[2])
+            doctor = await self.db_manager.catalog.card(doctor_id)
+            if not doctor:
+                await query.edit_message_text("❌ دکتر یافت نشد.")
+                return
             
+            # بررسی اشتراک کاربر
+            user = await self.db_manager.identities.get(user_id)
+            
+            is_subscribed = False
             async with self.db_manager.session_scope() as session:
-                result = await session.execute(
-                    select(Doctor)
-                    .options(selectinload(Doctor.centers).selectinload(DoctorCenter.services))
-                    .filter(Doctor.id == doctor_id)
-                )
-                doctor = result.scalar_one_or_none()
-                
-                if not doctor:
-                    await query.edit_message_text("❌ دکتر یافت نشد.")
-                    return
-                
-                # بررسی اشتراک کاربر
-                user_result = await session.execute(
-                    select(User).filter(User.telegram_id == user_id)
-                )
-                user = user_result.scalar_one_or_none()
-                
-                is_subscribed = False
+                # شمارنده مشترکین مرتب تغییر می‌کند و جزو کارت کش‌شده نیست
+                subscriber_count = await session.scalar(
+                    select(Doctor.active_subscriber_count).filter(Doctor.id == doctor.id)
+                ) or 0
                 if user:
                     sub_result = await session.execute(
-                        select(Subscription).filter(
-                            Subscription.user_id == user.id,
-                            Subscription.doctor_id == doctor.id,
-                            Subscription.is_active == True
-                        )
+                        subscription_query(user.user_pk, doctor.id).with_only_columns(Subscription.id)
                     )
-                    is_subscribed = sub_result.scalar_one_or_none() is not None
-                
-                specialty_emoji = self._get_specialty_emoji(doctor.specialty)
-                
-                # دریافت اطلاعات مرکز
-                center_info = ""
-                if doctor.centers:
-                    first_center = doctor.centers[0]
-                    center_info = f"""
-🏥 **مطب/کلینیک:** {first_center.center_name}
-📍 **آدرس:** {first_center.center_address or 'آدرس موجود نیست'}
-📞 **تلفن:** {first_center.center_phone or 'شماره موجود نیست'}"""
-                    
-                    if len(doctor.centers) > 1:
-                        center_info += f"\n🏢 **تعداد مراکز:** {len(doctor.centers)} مرکز"
-                else:
-                    center_info = "\n🏥 **مطب/کلینیک:** اطلاعات موجود نیست"
-                
-                text = f"""
+                    is_subscribed = sub_result.first() is not None
+            
+            specialty_emoji = self._get_specialty_emoji(doctor.specialty)
+            
+            # دریافت اطلاعات مرکز
+            center_info = ""
+            if doctor.centers:
+                first_center = doctor.centers[0]
+                center_info = f"""
+🏥 **مطب/کلینیک:** {first_center.name}
+📍 **آدرس:** {first_center.address or 'آدرس موجود نیست'}
+📞 **تلفن:** {first_center.phone or 'شماره موجود نیست'}"""
+                
+                if len(doctor.centers) > 1:
+                    center_info += f"\n🏢 **تعداد مراکز:** {len(doctor.centers)} مرکز"
+            else:
+                center_info = "\n🏥 **مطب/کلینیک:** اطلاعات موجود نیست"
+            
+            text = f"""
 {specialty_emoji} **{doctor.name}**
 
 🩺 **تخصص:** {doctor.specialty or 'عمومی'}{center_info}
+👥 **مشترکین فعال:** {subscriber_count}
 
 🔗 **لینک صفحه دکتر:**
 https://www.paziresh24.com/dr/{doctor.slug}/
@@ -452,177 +612,177 @@ https://www.paziresh24.com/dr/{doctor.slug}/
 اگه ثبت‌نام کنی، من هر چند دقیقه یه بار نوبت‌های خالی این دکتر رو چک می‌کنم و تا پیدا شد، فوری بهت خبر می‌دم!
 
 💡 **نکته:** نوبت‌ها خیلی سریع تموم میشن، پس آماده باش!
-                """
-                
-                keyboard = []
-                if is_subscribed:
-                    keyboard.append([
-                        InlineKeyboardButton("🗑️ لغو ثبت‌نام", callback_data=f"unsubscribe_{doctor.id}")
-                    ])
-                else:
-                    keyboard.append([
-                        InlineKeyboardButton("📝 ثبت‌نام در این دکتر", callback_data=f"subscribe_{doctor.id}")
-                    ])
-                
-                keyboard.extend([
-                    [InlineKeyboardButton("🔙 لیست دکترها", callback_data="show_doctors")],
-                    [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
+            """
+            
+            keyboard = []
+            if is_subscribed:
+                keyboard.append([
+                    InlineKeyboardButton("🗑️ لغو ثبت‌نام", callback_data=f"unsubscribe_{doctor.id}")
                 ])
-                
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-                
+            else:
+                keyboard.append([
+                    InlineKeyboardButton("📝 ثبت‌نام در این دکتر", callback_data=f"subscribe_{doctor.id}")
+                ])
+            
+            keyboard.extend([
+                [InlineKeyboardButton("🔙 لیست دکترها", callback_data="show_doctors")],
+                [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
+            ])
+            
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await query.edit_message_text(
+                text,
+                parse_mode='HTML',
+                reply_markup=reply_markup
+            )
+            
         except Exception as e:
             logger.error(f"❌ خطا در اطلاعات دکتر: {e}")
             await query.edit_message_text(MessageFormatter.error_message(str(e)))
     
-    async def _callback_subscribe(self, query, data, user_id):
+    async def _callback_subscribe(self, update, context, doctor_id: int):
         """callback اشتراک بهبود یافته"""
+        query = update.callback_query
+        user_id = query.from_user.id
         try:
-            doctor_id = int(data.split("_")[1])
+            user = await self.db_manager.identities.get(user_id)
+            if not user:
+                await query.edit_message_text("❌ ابتدا /start کنید.")
+                return
             
-            async with self.db_manager.session_scope() as session:
-                # دریافت کاربر
-                user_result = await session.execute(
-                    select(User).filter(User.telegram_id == user_id)
-                )
-                user = user_result.scalar_one_or_none()
-                
-                if not user:
-                    await query.edit_message_text("❌ ابتدا /start کنید.")
-                    return
-                
+            async def _subscribe(session):
                 # دریافت دکتر
                 doctor_result = await session.execute(
                     select(Doctor).filter(Doctor.id == doctor_id)
                 )
                 doctor = doctor_result.scalar_one_or_none()
-                
                 if not doctor:
-                    await query.edit_message_text("❌ دکتر یافت نشد.")
-                    return
+                    return None, False
                 
                 # بررسی اشتراک قبلی
                 sub_result = await session.execute(
-                    select(Subscription).filter(
-                        Subscription.user_id == user.id,
-                        Subscription.doctor_id == doctor.id
-                    )
+                    subscription_query(user.user_pk, doctor.id, active_only=False)
                 )
                 existing_sub = sub_result.scalar_one_or_none()
                 
                 if existing_sub:
                     if existing_sub.is_active:
-                        await query.edit_message_text(
-                            MessageFormatter.error_message(f"قبلاً توی {doctor.name} ثبت‌نام کردی!"),
-                            parse_mode='HTML'
-                        )
-                        return
-                    else:
-                        existing_sub.is_active = True
-                        existing_sub.created_at = datetime.utcnow()
+                        return doctor, False
+                    existing_sub.is_active = True
+                    existing_sub.created_at = datetime.utcnow()
                 else:
-                    new_sub = Subscription(
-                        user_id=user.id,
+                    session.add(Subscription(
+                        user_id=user.user_pk,
                         doctor_id=doctor.id
-                    )
-                    session.add(new_sub)
-                
-                text = MessageFormatter.subscription_success_message(doctor)
-                
-                keyboard = [
-                    [InlineKeyboardButton("👨‍⚕️ اطلاعات دکتر", callback_data=f"doctor_info_{doctor.id}")],
-                    [InlineKeyboardButton("📊 وضعیت من", callback_data="my_subscriptions")],
-                    [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
+                    ))
+                await adjust_subscriber_count(session, doctor.id, 1)
+                return doctor, True
+            
+            # خواندن و نوشتن در یک تراکنش از صف نوشتن (ایمن در پردازش همزمان آپدیت‌ها)
+            doctor, subscribed = await self.db_manager.run_write(_subscribe)
+            
+            if not doctor:
+                await query.edit_message_text("❌ دکتر یافت نشد.")
+                return
+            
+            if not subscribed:
                 await query.edit_message_text(
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
+                    MessageFormatter.error_message(f"قبلاً توی {doctor.name} ثبت‌نام کردی!"),
+                    parse_mode='HTML'
                 )
-                
-                logger.info(f"📝 اشتراک جدید: {user.full_name} -> {doctor.name}")
+                return
+            
+            self.db_manager.stats.adjust(total_subscriptions=1)
+            text = MessageFormatter.subscription_success_message(doctor)
+            
+            keyboard = [
+                [InlineKeyboardButton("👨‍⚕️ اطلاعات دکتر", callback_data=f"doctor_info_{doctor.id}")],
+                [InlineKeyboardButton("📊 وضعیت من", callback_data="my_subscriptions")],
+                [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await query.edit_message_text(
+                text,
+                parse_mode='HTML',
+                reply_markup=reply_markup
+            )
+            
+            logger.info(f"📝 اشتراک جدید: {user_id} -> {doctor.name}")
                 
         except Exception as e:
             logger.error(f"❌ خطا در اشتراک: {e}")
             await query.edit_message_text(MessageFormatter.error_message(str(e)))
     
-    async def _callback_unsubscribe(self, query, data, user_id):
+    async def _callback_unsubscribe(self, update, context, doctor_id: int):
         """callback لغو اشتراک بهبود یافته"""
+        query = update.callback_query
+        user_id = query.from_user.id
         try:
-            doctor_id = int(data.split("_")[1])
+            user = await self.db_manager.identities.get(user_id)
+            if not user:
+                await query.edit_message_text("❌ کاربر یافت نشد.")
+                return
             
-            async with self.db_manager.session_scope() as session:
-                # دریافت کاربر
-                user_result = await session.execute(
-                    select(User).filter(User.telegram_id == user_id)
-                )
-                user = user_result.scalar_one_or_none()
-                
-                if not user:
-                    await query.edit_message_text("❌ کاربر یافت نشد.")
-                    return
-                
+            async def _unsubscribe(session):
                 # دریافت دکتر
                 doctor_result = await session.execute(
                     select(Doctor).filter(Doctor.id == doctor_id)
                 )
                 doctor = doctor_result.scalar_one_or_none()
-                
                 if not doctor:
-                    await query.edit_message_text("❌ دکتر یافت نشد.")
-                    return
+                    return None, False
                 
                 # پیدا کردن اشتراک
-                sub_result = await session.execute(
-                    select(Subscription).filter(
-                        Subscription.user_id == user.id,
-                        Subscription.doctor_id == doctor.id,
-                        Subscription.is_active == True
-                    )
-                )
+                sub_result = await session.execute(subscription_query(user.user_pk, doctor.id))
                 subscription = sub_result.scalar_one_or_none()
-                
                 if not subscription:
-                    await query.edit_message_text(
-                        MessageFormatter.error_message(f"توی {doctor.name} ثبت‌نام نکردی که!"),
-                        parse_mode='HTML'
-                    )
-                    return
+                    return doctor, False
                 
                 # لغو اشتراک
                 subscription.is_active = False
-                
-                text = MessageFormatter.unsubscription_success_message(doctor)
-                
-                keyboard = [
-                    [InlineKeyboardButton("📝 ثبت‌نام مجدد", callback_data=f"subscribe_{doctor.id}")],
-                    [InlineKeyboardButton("📊 وضعیت من", callback_data="my_subscriptions")],
-                    [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
+                await adjust_subscriber_count(session, doctor.id, -1)
+                return doctor, True
+            
+            doctor, unsubscribed = await self.db_manager.run_write(_unsubscribe)
+            
+            if not doctor:
+                await query.edit_message_text("❌ دکتر یافت نشد.")
+                return
+            
+            if not unsubscribed:
                 await query.edit_message_text(
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
+                    MessageFormatter.error_message(f"توی {doctor.name} ثبت‌نام نکردی که!"),
+                    parse_mode='HTML'
                 )
-                
-                logger.info(f"🗑️ لغو اشتراک: {user.full_name} -> {doctor.name}")
+                return
+            
+            self.db_manager.stats.adjust(total_subscriptions=-1)
+            text = MessageFormatter.unsubscription_success_message(doctor)
+            
+            keyboard = [
+                [InlineKeyboardButton("📝 ثبت‌نام مجدد", callback_data=f"subscribe_{doctor.id}")],
+                [InlineKeyboardButton("📊 وضعیت من", callback_data="my_subscriptions")],
+                [InlineKeyboardButton("🔙 منوی اصلی", callback_data="back_to_main")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await query.edit_message_text(
+                text,
+                parse_mode='HTML',
+                reply_markup=reply_markup
+            )
+            
+            logger.info(f"🗑️ لغو اشتراک: {user_id} -> {doctor.name}")
                 
         except Exception as e:
             logger.error(f"❌ خطا در لغو اشتراک: {e}")
             await query.edit_message_text(MessageFormatter.error_message(str(e)))
     
-    async def _callback_add_doctor(self, query):
+    async def _callback_add_doctor(self, update, context):
         """callback اضافه کردن دکتر بهبود یافته"""
+        query = update.callback_query
         text = MessageFormatter.add_doctor_prompt_message()
         
         keyboard = [
@@ -636,8 +796,9 @@ https://www.paziresh24.com/dr/{doctor.slug}/
             reply_markup=reply_markup
         )
     
-    async def _callback_back_to_main(self, query, user_id):
+    async def _callback_back_to_main(self, update, context):
         """callback بازگشت به منوی اصلی بهبود یافته"""
+        query = update.callback_query
         keyboard = [
             [InlineKeyboardButton("👨‍⚕️ دکترها", callback_data="show_doctors")],
             [InlineKeyboardButton("📊 وضعیت من", callback_data="my_subscriptions")],
@@ -694,6 +855,15 @@ https://www.paziresh24.com/dr/{doctor.slug}/
         
         return "👨‍⚕️"
     
+    def _is_doctor_link(self, text: str) -> bool:
+        """لینک کامل، لینک کوتاه یا slug خط‌تیره‌دار دکتر (نه متن جستجو)"""
+        text = (text or '').strip()
+        return bool(
+            re.match(r'https?://(?:www\.)?paziresh24\.com/dr/[^/\s]+/?', text)
+            or re.match(r'^dr/[^/\s]+/?$', text)
+            or ('-' in text and re.match(r'^[آ-یa-zA-Z0-9\-_]+$', text))
+        )
+    
     def _is_doctor_url(self, text: str) -> bool:
         """بررسی اینکه آیا متن شبیه URL دکتر است یا نه"""
         if not text:
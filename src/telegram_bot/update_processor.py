@@ -0,0 +1,133 @@
+"""
+پردازش همزمان آپدیت‌ها با ترتیب تضمین‌شده برای هر چت
+
+آپدیت‌های چت‌های مختلف همزمان (حداکثر workers تا) پردازش می‌شوند، ولی
+آپدیت‌های یک چت به ترتیب ورود و یکی‌یکی اجرا می‌شوند تا callbackهای یک کاربر
+با هم تداخل نکنند. صبر برای نوبت چت قبل از گرفتن ظرفیت worker است، پس
+چند آپدیت پشت سر هم یک کاربر ظرفیت بقیه را اشغال نمی‌کند.
+"""
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.utils.metrics import metrics
+
+
+class ChatSerialUpdateProcessor(BaseUpdateProcessor):
+    """
+    پردازشگر آپدیت با همزمانی محدود و ترتیب هر چت
+
+    max_pending سقف آپدیت‌های در حال انتظار یا پردازش (ظرفیت BaseUpdateProcessor)
+    و workers سقف handlerهایی است که واقعاً همزمان اجرا می‌شوند.
+    """
+
+    def __init__(self, workers: int = 8, max_pending: int = 256):
+        super().__init__(max(workers, max_pending))
+        self.workers = max(1, workers)
+        self._worker_slots: Optional[asyncio.Semaphore] = None
+        self._chat_locks: Dict[int, List[Any]] = {}  # chat_id → [Lock، تعداد منتظر]
+        self._running = 0
+
+        self._processed = metrics.counter('updates.processed')
+        self._queue_wait = metrics.histogram('updates.queue_wait_seconds')
+        self._active = metrics.gauge('updates.active')
+
+    async def initialize(self):
+        self._worker_slots = asyncio.Semaphore(self.workers)
+
+    async def shutdown(self):
+        pass
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update):
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        if self._worker_slots is None:
+            await self.initialize()
+        started = time.perf_counter()
+        key = self._chat_key(update)
+        if key is None:
+            await self._run(coroutine, started)
+            return
+
+        entry = self._chat_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine, started)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._chat_locks.pop(key, None)
+
+    async def _run(self, coroutine: Awaitable[Any], started: float):
+        async with self._worker_slots:
+            self._queue_wait.observe(time.perf_counter() - started)
+            self._running += 1
+            self._active.set(self._running)
+            try:
+                await coroutine
+            finally:
+                self._running -= 1
+                self._active.set(self._running)
+                self._processed.inc()
+
+    def get_stats(self) -> Dict:
+        wait = self._queue_wait
+        return {
+            'workers': self.workers,
+            'running': self._running,
+            'in_flight': self.current_concurrent_updates,
+            'chats_waiting': len(self._chat_locks),
+            'processed': self._processed.value,
+            'queue_wait_p95': round(wait.percentile(95), 4),
+        }
+
+
+def instrument_handler(name: str, callback: Callable[..., Awaitable[Any]]):
+    """ثبت زمان اجرا و خطاهای یک handler در متریک‌های handler.<name>.*"""
+    latency = metrics.histogram(f'handler.{name}.seconds')
+    errors = metrics.counter(f'handler.{name}.errors')
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def handler_latency_report() -> Dict[str, Dict[str, float]]:
+    """خلاصه زمان اجرای هر handler (p50/p95/p99) و تعداد خطا"""
+    report: Dict[str, Dict[str, float]] = {}
+    errors: Dict[str, int] = {}
+    for metric, value in metrics.snapshot('handler.').items():
+        name, _, kind = metric[len('handler.'):].rpartition('.')
+        if kind == 'seconds' and value['count']:
+            report[name] = {
+                'count': value['count'],
+                'p50': round(value['p50'], 4),
+                'p95': round(value['p95'], 4),
+                'p99': round(value['p99'], 4),
+            }
+        elif kind == 'errors':
+            errors[name] = value
+    for name, stats in report.items():
+        stats['errors'] = errors.get(name, 0)
+    return report
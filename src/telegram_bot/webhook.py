@@ -0,0 +1,153 @@
+"""
+دریافت آپدیت‌های تلگرام با webhook روی یک سرور HTTP سبک asyncio
+
+تلگرام هر آپدیت را با POST به آدرس ثبت‌شده می‌فرستد و هدر
+X-Telegram-Bot-Api-Secret-Token را همراه آن می‌آورد؛ درخواست‌های بدون توکن
+درست رد می‌شوند. آپدیت‌ها به صف Application داده می‌شوند و با همان
+handlerهای حالت polling (و همزمانی concurrent_updates) پردازش می‌شوند.
+
+بنچمارک محلی: scripts/bench_webhook.py
+"""
+import asyncio
+import hmac
+import json
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("Webhook")
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_HEADER_LINES = 100
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+UpdateHandler = Callable[[dict], Awaitable[None]]
+
+
+class WebhookReceiver:
+    """سرور HTTP/1.1 حداقلی (keep-alive) برای دریافت آپدیت‌های webhook"""
+
+    def __init__(self, handle_update: UpdateHandler, secret_token: str,
+                 host: str = "0.0.0.0", port: int = 8080, path: str = "/telegram",
+                 max_body: int = 1024 * 1024):
+        if not secret_token:
+            raise ValueError("توکن مخفی webhook نباید خالی باشد")
+        self.handle_update = handle_update
+        self.secret_token = secret_token.encode()
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_body = max_body
+        self._server: Optional[asyncio.base_events.Server] = None
+
+        self._received = metrics.counter('webhook.updates_received')
+        self._rejected = metrics.counter('webhook.requests_rejected')
+        self._request_time = metrics.histogram('webhook.request_seconds')
+
+    @property
+    def bound_port(self) -> int:
+        """پورت واقعی (برای port=0 در تست‌ها)"""
+        return self._server.sockets[0].getsockname()[1] if self._server else self.port
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        logger.info(f"🌐 webhook روی {self.host}:{self.bound_port}{self.path} گوش می‌دهد")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("🛑 webhook متوقف شد")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                started = time.perf_counter()
+                status = await self._dispatch(method, path, headers, body)
+                self._request_time.observe(time.perf_counter() - started)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            # سرآیند یا بدنه نامعتبر: اتصال بسته می‌شود
+            self._rejected.inc()
+            logger.debug(f"درخواست نامعتبر webhook: {e}")
+            self._write_response(writer, 413 if 'large' in str(e) else 400, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ValueError("خط درخواست نامعتبر")
+        method, path, _ = parts
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("تعداد سرآیندها بیش از حد است")
+
+        length = int(headers.get('content-length') or 0)
+        if length > self.max_body:
+            raise ValueError("payload too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, path.split('?', 1)[0], headers, body
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> int:
+        if path != self.path:
+            self._rejected.inc()
+            return 404
+        if method != 'POST':
+            self._rejected.inc()
+            return 405
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, '').encode(), self.secret_token):
+            self._rejected.inc()
+            return 403
+        try:
+            data = json.loads(body)
+        except ValueError:
+            self._rejected.inc()
+            return 400
+        self._received.inc()
+        try:
+            await self.handle_update(data)
+        except Exception as e:
+            logger.error(f"❌ خطا در ثبت آپدیت webhook: {e}")
+            return 500  # تلگرام آپدیت را دوباره می‌فرستد
+        return 200
+
+    @staticmethod
+    def _write_response(writer, status: int, keep_alive: bool):
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+        )
+
+    def get_stats(self) -> Dict:
+        return {
+            'updates_received': self._received.value,
+            'requests_rejected': self._rejected.value,
+            'request_p95': round(self._request_time.percentile(95), 4),
+        }
+
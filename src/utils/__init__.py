@@ -1,5 +1,5 @@
 # حذف import مستقیم برای جلوگیری از circular import
-__all__ = ['Config', 'setup_logger']
+__all__ = ['Config', 'setup_logger', 'metrics']
 
 def __getattr__(name):
     if name == 'Config':
@@ -8,4 +8,7 @@ def __getattr__(name):
     elif name == 'setup_logger':
         from .logger import setup_logger
         return setup_logger
+    elif name == 'metrics':
+        from .metrics import metrics
+        return metrics
     raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
\ No newline at end of file
@@ -2,8 +2,9 @@
 مدیریت تنظیمات پروژه
 """
 import os
+import threading
 import yaml
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 from pathlib import Path
 
 # Safe import for optional dependencies
@@ -34,6 +35,7 @@ except ImportError:
 
 from typing import TYPE_CHECKING
 from src.utils.logger import get_logger
+from src.utils.offload import run_blocking
 
 if TYPE_CHECKING:
     from src.api.models import Doctor
@@ -41,6 +43,23 @@ if TYPE_CHECKING:
 
 class DatabaseConfig(BaseModel):
     url: str = Field("sqlite+aiosqlite:///data/slothunter.db", env="DATABASE_URL")
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800  # بازسازی اتصال‌های PostgreSQL (ثانیه)
+    statement_cache_size: int = 256  # کش prepared statement در asyncpg
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"  # در حالت WAL امن و بسیار سریع‌تر از FULL
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 16384
+    sqlite_mmap_size_mb: int = 128
+    write_queue: bool = True  # عبور همه نوشتن‌های SQLite از یک صف
+    write_batch_size: int = 64
+    write_max_delay: float = 0.02  # حداکثر انتظار برای پر شدن دسته نوشتن (ثانیه)
+    activity_flush_interval: float = 5.0  # فاصله نوشتن دسته‌ای فعالیت کاربران (ثانیه)
+    activity_max_pending: int = 500  # نوشتن زودتر با رسیدن بافر به این تعداد کاربر
+    identity_cache_size: int = 10000  # تعداد کاربران نگه‌داشته‌شده در کش هویت
+    identity_cache_ttl: float = 300.0  # حداکثر عمر هر رکورد کش هویت (ثانیه)
 
 class ApiConfig(BaseModel):
     base_url: str = Field("https://apigw.paziresh24.com/booking/v2", env="API_BASE_URL")
@@ -48,6 +67,16 @@ class ApiConfig(BaseModel):
 class TelegramConfig(BaseModel):
     bot_token: str = Field("", env="TELEGRAM_BOT_TOKEN")
     admin_chat_id: int = Field(0, env="ADMIN_CHAT_ID")
+    doctors_page_size: int = 8  # تعداد دکتر در هر صفحه لیست
+    mode: str = "polling"  # polling یا webhook
+    concurrent_updates: int = 8  # تعداد آپدیت‌هایی که همزمان پردازش می‌شوند (آپدیت‌های هر چت به ترتیب)
+    max_pending_updates: int = 256  # سقف آپدیت‌های در انتظار یا در حال پردازش
+    webhook_url: str = ""  # آدرس عمومی https که تلگرام آپدیت‌ها را به آن می‌فرستد
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_path: str = "/telegram"
+    webhook_secret: str = Field("", env="TELEGRAM_WEBHOOK_SECRET")  # خالی = تولید تصادفی در هر اجرا
+    webhook_max_connections: int = 40
 
 class MonitoringConfig(BaseModel):
     check_interval: int = Field(90, env="CHECK_INTERVAL")  # افزایش به 90 ثانیه
@@ -55,21 +84,76 @@ class MonitoringConfig(BaseModel):
     timeout: int = 15  # افزایش timeout
     days_ahead: int = 5  # کاهش روزهای بررسی
     request_delay: float = 1.5  # delay بین درخواست‌ها
+    counter_reconcile_interval: int = 3600  # فاصله اصلاح شمارنده مشترکین دکترها (ثانیه)
+
+class NotificationConfig(BaseModel):
+    coalesce_window: float = 3.0  # پنجره ادغام هشدارهای یک چت (ثانیه)
+    max_coalesce_delay: float = 15.0  # سقف تاخیر اضافه ناشی از ادغام (ثانیه)
+    live_edit_window: float = 600.0  # مدت ویرایش پیام قبلی به جای ارسال پیام جدید (ثانیه)
+    outbox_batch_size: int = 200  # تعداد رکورد outbox در هر دور drain
+    outbox_poll_interval: float = 2.0  # فاصله بررسی outbox (ثانیه)
+    outbox_retention_days: int = 14  # مدت نگهداری رکوردهای ارسال‌شده
+    outbox_max_attempts: int = 5  # سقف تلاش ارسال یک اعلان پس از خطاهای موقت
+    fanout_order: str = "least_recent"  # fifo، rotate، random یا least_recent
+
+class ClusterConfig(BaseModel):
+    enabled: bool = False  # تقسیم کار بین چند نمونه با اجاره shard
+    instance_id: str = ""  # خالی = hostname-pid
+    num_shards: int = 64
+    lease_ttl: float = 30.0  # اجاره تمدیدنشده پس از این مدت منقضی می‌شود (ثانیه)
+    heartbeat_interval: float = 10.0
+    # فقط یک نمونه آپدیت‌های تلگرام را می‌گیرد (دو getUpdates همزمان روی یک توکن 409 Conflict می‌دهد)؛
+    # در بقیه false باشد - آن‌ها فقط اطلاع‌رسانی shardهای خود را می‌فرستند
+    bot_instance: bool = True
+
+class WorkersConfig(BaseModel):
+    mode: str = "single"  # single یا supervisor (ربات و بررسی نوبت در پردازه‌های جدا)
+    pollers: int = 2  # تعداد پردازه‌های بررسی نوبت
+    hash_replicas: int = 64  # گره‌های مجازی حلقه هش
+    queue_size: int = 10000  # ظرفیت صف رویدادهای نوبت
+    offload_threads: int = 8  # thread pool کارهای مسدودکننده (فایل، YAML)
+    offload_processes: int = 1  # process pool کارهای CPU-bound مثل parse صفحه دکتر (0 = فقط thread)
+    loop_lag_interval: float = 0.1  # فاصله نمونه‌برداری تاخیر event loop (ثانیه، 0 = غیرفعال)
+    loop_lag_warn: float = 0.25  # هشدار برای توقف‌های طولانی‌تر از این مقدار (ثانیه)
+
+class CatalogConfig(BaseModel):
+    import_concurrency: int = 4  # تعداد دریافت همزمان پروفایل دکترها در ورود دسته‌ای
+    import_rate: float = 2.0  # حداکثر درخواست پروفایل در ثانیه
+    import_max_items: int = 500  # سقف آدرس‌های یک فایل ورود
+    refresh_interval: float = 3600.0  # فاصله دورهای به‌روزرسانی پروفایل‌ها (ثانیه، 0 = غیرفعال)
+    refresh_max_age: float = 86400.0  # هر دکتر حداکثر یک بار در این مدت دوباره استخراج می‌شود
+    refresh_batch_size: int = 50  # حداکثر دکتر در هر دور
+    refresh_concurrency: int = 2
+    refresh_rate: float = 0.5  # درخواست در ثانیه؛ کندتر از ورود دسته‌ای
+    profile_cache_dir: str = "data/profile_cache"  # کش پروفایل‌ها با ETag/Last-Modified
+    profile_cache_max_mb: int = 50  # سقف حجم کش (0 = غیرفعال)
 
 class LoggingConfig(BaseModel):
     level: str = Field("INFO", env="LOG_LEVEL")
     file: str = "logs/slothunter.log"
     max_size: str = "10MB"
     backup_count: int = 5
+    json_format: bool = False  # یک شیء JSON در هر خط (همراه doctor_id، endpoint، latency_ms و ...)
+    rate_limit: float = 50.0  # حداکثر پیام زیر WARNING در ثانیه برای هر logger (0 = بدون محدودیت)
+    rate_burst: int = 200
 
 class AppConfig(BaseModel):
     database: DatabaseConfig = DatabaseConfig()
     api: ApiConfig = ApiConfig()
     telegram: TelegramConfig = TelegramConfig()
     monitoring: MonitoringConfig = MonitoringConfig()
+    notifications: NotificationConfig = NotificationConfig()
+    cluster: ClusterConfig = ClusterConfig()
+    workers: WorkersConfig = WorkersConfig()
+    catalog: CatalogConfig = CatalogConfig()
     logging: LoggingConfig = LoggingConfig()
     doctors: List[Dict[str, Any]] = []
 
+# نتیجه parse فایل‌های YAML بر اساس (mtime، حجم)؛ Config چند بار در هر پردازه ساخته می‌شود
+_yaml_cache: Dict[Path, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_yaml_lock = threading.Lock()
+
+
 class Config:
     """کلاس مدیریت تنظیمات"""
     
@@ -79,6 +163,11 @@ class Config:
         self.logger = get_logger("Config")
         self._config = self._load_and_validate_config()
     
+    @classmethod
+    async def load_async(cls, config_path: str = "config/config.yaml") -> 'Config':
+        """ساخت Config خارج از event loop (خواندن فایل و parse YAML همگام است)"""
+        return await run_blocking(cls, config_path)
+    
     def _load_and_validate_config(self) -> AppConfig:
         """بارگذاری و اعتبارسنجی تنظیمات"""
         config_data = self._load_config_from_file()
@@ -93,10 +182,19 @@ class Config:
 
     def _load_config_from_file(self) -> Dict[str, Any]:
         """بارگذاری تنظیمات از فایل"""
-        if self.config_path.exists():
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f) or {}
-        return {}
+        try:
+            stat = self.config_path.stat()
+        except FileNotFoundError:
+            return {}
+        key = (stat.st_mtime_ns, stat.st_size)
+        with _yaml_lock:
+            cached = _yaml_cache.get(self.config_path)
+            if cached is None or cached[0] != key:
+                with open(self.config_path, 'r', encoding='utf-8') as f:
+                    cached = (key, yaml.safe_load(f) or {})
+                _yaml_cache[self.config_path] = cached
+        # _replace_env_vars دیکشنری‌ها و لیست‌ها را از نو می‌سازد؛ نسخه کش‌شده تغییر نمی‌کند
+        return cached[1]
     
     def _replace_env_vars(self, obj: Any) -> Any:
         """جایگزینی متغیرهای محیطی در تنظیمات"""
@@ -130,20 +228,65 @@ class Config:
             },
             'telegram': {
                 'bot_token': os.getenv('TELEGRAM_BOT_TOKEN', ''),
-                'admin_chat_id': admin_chat_id
+                'admin_chat_id': admin_chat_id,
+                'doctors_page_size': 8
             },
             'monitoring': {
                 'check_interval': int(os.getenv('CHECK_INTERVAL', '90')),  # افزایش به 90 ثانیه
                 'max_retries': 3,
                 'timeout': 15,  # افزایش timeout
                 'days_ahead': 5,  # کاهش روزهای بررسی
-                'request_delay': 1.5  # delay بین درخواست‌ها
+                'request_delay': 1.5,  # delay بین درخواست‌ها
+                'counter_reconcile_interval': 3600
+            },
+            'notifications': {
+                'coalesce_window': 3.0,
+                'max_coalesce_delay': 15.0,
+                'live_edit_window': 600.0,
+                'outbox_batch_size': 200,
+                'outbox_poll_interval': 2.0,
+                'outbox_retention_days': 14,
+                'outbox_max_attempts': 5,
+                'fanout_order': 'least_recent'
+            },
+            'cluster': {
+                'enabled': False,
+                'instance_id': '',
+                'num_shards': 64,
+                'lease_ttl': 30.0,
+                'heartbeat_interval': 10.0,
+                'bot_instance': True
+            },
+            'workers': {
+                'mode': 'single',
+                'pollers': 2,
+                'hash_replicas': 64,
+                'queue_size': 10000,
+                'offload_threads': 8,
+                'offload_processes': 1,
+                'loop_lag_interval': 0.1,
+                'loop_lag_warn': 0.25
+            },
+            'catalog': {
+                'import_concurrency': 4,
+                'import_rate': 2.0,
+                'import_max_items': 500,
+                'refresh_interval': 3600.0,
+                'refresh_max_age': 86400.0,
+                'refresh_batch_size': 50,
+                'refresh_concurrency': 2,
+                'refresh_rate': 0.5,
+                'profile_cache_dir': 'data/profile_cache',
+                'profile_cache_max_mb': 50
             },
             'logging': {
                 'level': os.getenv('LOG_LEVEL', 'INFO'),
                 'file': 'logs/slothunter.log',
                 'max_size': '10MB',
-                'backup_count': 5
+                'backup_count': 5,
+                'json_format': False,
+                'rate_limit': 50.0,
+                'rate_burst': 200
             },
             'doctors': []
         }
@@ -156,6 +299,15 @@ class Config:
     def admin_chat_id(self) -> int:
         return self._config.telegram.admin_chat_id
 
+    @property
+    def doctors_page_size(self) -> int:
+        return self._config.telegram.doctors_page_size
+
+    @property
+    def telegram_settings(self) -> TelegramConfig:
+        """تنظیمات دریافت آپدیت (polling/webhook) و همزمانی"""
+        return self._config.telegram
+
     @property
     def check_interval(self) -> int:
         return self._config.monitoring.check_interval
@@ -177,6 +329,47 @@ class Config:
         """delay بین درخواست‌ها"""
         return getattr(self._config.monitoring, 'request_delay', 1.5)
 
+    @property
+    def counter_reconcile_interval(self) -> int:
+        """فاصله اصلاح شمارنده مشترکین دکترها"""
+        return self._config.monitoring.counter_reconcile_interval
+
+    @property
+    def coalesce_window(self) -> float:
+        """پنجره ادغام هشدارهای یک چت"""
+        return self._config.notifications.coalesce_window
+
+    @property
+    def max_coalesce_delay(self) -> float:
+        """حداکثر تاخیر اضافه برای ادغام هشدارها"""
+        return self._config.notifications.max_coalesce_delay
+
+    @property
+    def live_edit_window(self) -> float:
+        """پنجره ویرایش پیام هشدار قبلی (0 = غیرفعال)"""
+        return self._config.notifications.live_edit_window
+
+    @property
+    def outbox_batch_size(self) -> int:
+        return self._config.notifications.outbox_batch_size
+
+    @property
+    def outbox_poll_interval(self) -> float:
+        return self._config.notifications.outbox_poll_interval
+
+    @property
+    def outbox_retention_days(self) -> int:
+        return self._config.notifications.outbox_retention_days
+
+    @property
+    def outbox_max_attempts(self) -> int:
+        return self._config.notifications.outbox_max_attempts
+
+    @property
+    def fanout_order(self) -> str:
+        """سیاست ترتیب ارسال به مشترکین"""
+        return self._config.notifications.fanout_order
+
     @property
     def log_level(self) -> str:
         return self._config.logging.level
@@ -185,9 +378,35 @@ class Config:
     def log_file(self) -> str:
         return self._config.logging.file
 
+    @property
+    def logging_settings(self) -> LoggingConfig:
+        """تنظیمات کامل لاگ (چرخش فایل، JSON و محدودیت نرخ)"""
+        return self._config.logging
+
     @property
     def database_url(self) -> str:
-        return self._config.database.url
+        # متغیر محیطی DATABASE_URL بر فایل تنظیمات مقدم است
+        return os.getenv('DATABASE_URL') or self._config.database.url
+
+    @property
+    def cluster_settings(self) -> ClusterConfig:
+        """تنظیمات اجرای چند نمونه‌ای"""
+        return self._config.cluster
+
+    @property
+    def workers_settings(self) -> WorkersConfig:
+        """تنظیمات حالت چند پردازه‌ای"""
+        return self._config.workers
+
+    @property
+    def database_settings(self) -> DatabaseConfig:
+        """تنظیمات اتصال، pool و پروفایل SQLite"""
+        return self._config.database
+
+    @property
+    def catalog_settings(self) -> CatalogConfig:
+        """تنظیمات ورود و به‌روزرسانی کاتالوگ دکترها"""
+        return self._config.catalog
 
     @property
     def api_base_url(self) -> str:
@@ -1,10 +1,109 @@
 """
 تنظیم سیستم لاگ
+
+فراخوانی logger فقط رکورد را در یک صف در حافظه می‌گذارد؛ نوشتن در کنسول و
+فایل (RotatingFileHandler) در thread جداگانه QueueListener انجام می‌شود تا
+I/O همگام دیسک روی event loop اجرا نشود. خروجی می‌تواند متنی یا JSON (یک
+شیء در هر خط، همراه فیلدهای extra مثل doctor_id، endpoint و latency_ms)
+باشد. پیام‌های زیر سطح WARNING هر logger با token bucket محدود می‌شوند و
+پیام‌های اضافه پیش از ورود به صف دور ریخته می‌شوند.
 """
+import atexit
+import copy
+import json
 import logging
 import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+
+# ویژگی‌های استاندارد LogRecord؛ بقیه از extra آمده‌اند
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listeners: List[logging.handlers.QueueListener] = []
+
+
+class JsonFormatter(logging.Formatter):
+    """یک شیء JSON در هر خط؛ فیلدهای extra به همان نام اضافه می‌شوند"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """پیام در thread فراخواننده ساخته می‌شود؛ traceback جدا در exc_text می‌ماند تا JSON آن را جدا بنویسد"""
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    محدودیت نرخ به ازای هر logger (token bucket)
+
+    WARNING و بالاتر همیشه عبور می‌کنند. تعداد پیام‌های حذف‌شده به اولین
+    پیام عبوری بعدی همان logger اضافه می‌شود.
+    """
+
+    def __init__(self, rate: float = 50.0, burst: int = 200):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        self._buckets: Dict[str, List[float]] = {}  # نام logger → [توکن‌ها، آخرین زمان، حذف‌شده‌ها]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.getMessage()} (+{dropped} پیام حذف‌شده)"
+            record.args = None
+        return True
+
+
+@atexit.register
+def stop_logging():
+    """خالی کردن صف‌ها و توقف threadهای نوشتن لاگ"""
+    while _listeners:
+        _listeners.pop().stop()
 
 
 def setup_logger(
@@ -12,7 +111,10 @@ def setup_logger(
     level: str = "INFO",
     log_file: Optional[str] = None,
     max_size: str = "10MB",
-    backup_count: int = 5
+    backup_count: int = 5,
+    json_format: bool = False,
+    rate_limit: float = 50.0,
+    rate_burst: int = 200
 ) -> logging.Logger:
     """
     تنظیم logger برای پروژه
@@ -23,6 +125,9 @@ def setup_logger(
         log_file: مسیر فایل لاگ
         max_size: حداکثر اندازه فایل لاگ
         backup_count: تعداد فایل‌های backup
+        json_format: خروجی JSON به جای متن
+        rate_limit: حداکثر پیام زیر WARNING در ثانیه برای هر logger (0 = بدون محدودیت)
+        rate_burst: ظرفیت انفجاری token bucket
     
     Returns:
         logger تنظیم شده
@@ -40,16 +145,20 @@ def setup_logger(
         return logger
     
     # فرمت لاگ
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    handlers = []
     
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # File handler (اختیاری)
     if log_file:
@@ -69,7 +178,18 @@ def setup_logger(
         )
         file_handler.setLevel(log_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # logger فقط در صف می‌نویسد؛ handlerهای واقعی در thread listener اجرا می‌شوند
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.setLevel(log_level)
+    queue_handler.addFilter(RateLimitFilter(rate_limit, rate_burst))
+    logger.addHandler(queue_handler)
+    
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
     
     return logger
 
@@ -0,0 +1,119 @@
+"""
+ثبت متریک‌های داخلی برنامه (شمارنده، گیج و هیستوگرام)
+"""
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+
+class Counter:
+    """شمارنده افزایشی"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+class Gauge:
+    """مقدار لحظه‌ای"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Histogram:
+    """هیستوگرام با نمونه‌های محدود برای محاسبه صدک‌ها"""
+
+    def __init__(self, name: str, max_samples: int = 2048):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self._samples.append(value)
+
+    def percentile(self, p: float) -> float:
+        """صدک p (بین 0 تا 100) از نمونه‌های اخیر"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * (len(samples) - 1)))))
+        return samples[index]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """مخزن متریک‌ها - هر نام فقط یک بار ساخته می‌شود"""
+
+    def __init__(self):
+        self._counters: Dict[str, Counter] = {}
+        self._gauges: Dict[str, Gauge] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = Counter(name)
+            return self._counters[name]
+
+    def gauge(self, name: str) -> Gauge:
+        with self._lock:
+            if name not in self._gauges:
+                self._gauges[name] = Gauge(name)
+            return self._gauges[name]
+
+    def histogram(self, name: str, max_samples: int = 2048) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, max_samples)
+            return self._histograms[name]
+
+    def snapshot(self, prefix: Optional[str] = None) -> Dict[str, object]:
+        """تصویر لحظه‌ای از همه متریک‌ها (یا متریک‌های با پیشوند مشخص)"""
+        def _match(names: Iterable[str]):
+            return [n for n in names if prefix is None or n.startswith(prefix)]
+
+        data: Dict[str, object] = {}
+        for name in _match(self._counters):
+            data[name] = self._counters[name].value
+        for name in _match(self._gauges):
+            data[name] = self._gauges[name].value
+        for name in _match(self._histograms):
+            data[name] = self._histograms[name].summary()
+        return data
+
+
+# مخزن سراسری متریک‌ها
+metrics = MetricsRegistry()
@@ -0,0 +1,142 @@
+"""
+اجرای کارهای مسدودکننده و CPU-bound خارج از event loop
+
+- run_blocking: I/O همگام (فایل، YAML و ...) در thread pool مشترک
+- run_cpu: کار سنگین CPU (مثل json.loads صفحه‌های بزرگ) در process pool؛
+  json.loads در thread هم GIL را تا پایان نگه می‌دارد و loop را متوقف می‌کند.
+  اگر process pool غیرفعال یا خراب باشد، کار در thread انجام می‌شود.
+- LoopLagMonitor: تاخیر بیدار شدن یک timer را اندازه می‌گیرد؛ هر توقف loop
+  (کار همگام طولانی در یک coroutine) مستقیماً در این عدد دیده می‌شود.
+
+توابع ارسالی به run_cpu باید در سطح ماژول تعریف شده و قابل pickle باشند.
+"""
+import asyncio
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger("Offload")
+
+_settings = {'threads': 8, 'processes': 1}
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def configure(threads: int = 8, processes: int = 1):
+    """تنظیم اندازه poolها (قبل از اولین استفاده؛ processes=0 یعنی فقط thread)"""
+    _settings['threads'] = max(1, threads)
+    _settings['processes'] = max(0, processes)
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=_settings['threads'], thread_name_prefix="offload")
+    return _thread_pool
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    if _process_pool is None and _settings['processes'] > 0:
+        # spawn: fork کردن پردازه‌ای که thread دارد (aiosqlite، httpx) امن نیست
+        _process_pool = ProcessPoolExecutor(
+            max_workers=_settings['processes'],
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _process_pool
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """اجرای تابع همگام در thread pool مشترک"""
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            _get_thread_pool(), partial(fn, *args, **kwargs)
+        )
+    finally:
+        metrics.histogram('offload.thread_seconds').observe(time.perf_counter() - started)
+
+
+async def run_cpu(fn: Callable, *args) -> Any:
+    """اجرای کار CPU-bound در process pool (در نبود آن در thread pool)"""
+    global _process_pool
+    pool = _get_process_pool()
+    if pool is None:
+        return await run_blocking(fn, *args)
+
+    started = time.perf_counter()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except (BrokenProcessPool, pickle.PicklingError, AttributeError) as e:
+        if isinstance(e, AttributeError) and 'pickle' not in str(e):
+            raise  # خطای خود تابع
+        # پردازه کمکی مرده یا تابع/ورودی قابل ارسال نیست: همین بار در thread
+        metrics.counter('offload.process_fallbacks').inc()
+        logger.warning(f"⚠️ اجرای {getattr(fn, '__name__', fn)} در process pool ممکن نشد ({e!r})؛ اجرا در thread")
+        if isinstance(e, BrokenProcessPool):
+            _process_pool = None  # دفعه بعد pool تازه ساخته می‌شود
+        return await run_blocking(fn, *args)
+    metrics.histogram('offload.process_seconds').observe(time.perf_counter() - started)
+    return result
+
+
+def shutdown():
+    """بستن poolها (هنگام خروج)"""
+    global _thread_pool, _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+
+
+class LoopLagMonitor:
+    """اندازه‌گیری پاسخگویی event loop با یک timer دوره‌ای"""
+
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.25, name: str = 'event_loop'):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._task: Optional[asyncio.Task] = None
+        self._lag = metrics.histogram(f'{name}.lag_seconds')
+        self._stalls = metrics.counter(f'{name}.stalls')
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._lag.observe(lag)
+            if lag >= self.warn_threshold:
+                self._stalls.inc()
+                logger.warning(f"🐢 event loop {lag * 1000:.0f} میلی‌ثانیه مسدود بود")
+
+    def get_stats(self) -> Dict:
+        return {
+            'samples': self._lag.count,
+            'p50_ms': round(self._lag.percentile(50) * 1000, 2),
+            'p99_ms': round(self._lag.percentile(99) * 1000, 2),
+            'max_ms': round(self._lag.percentile(100) * 1000, 2),
+            'stalls': self._stalls.value,
+        }
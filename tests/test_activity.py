@@ -0,0 +1,34 @@
+"""
+بافر فعالیت کاربران: به‌روزرسانی کاربران موجود بدون ساخت کاربر جدید
+"""
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from src.database.database import DatabaseManager
+from src.database.models import User
+
+
+async def _flush_round(path):
+    db = DatabaseManager(f"sqlite+aiosqlite:///{path}")
+    await db._setup_database()
+    try:
+        async with db.session_scope() as session:
+            session.add(User(telegram_id=1, first_name="قدیمی"))
+
+        db.activity.record(SimpleNamespace(id=1, username="known", first_name="جدید", last_name=None))
+        db.activity.record(SimpleNamespace(id=2, username="stranger", first_name="ناشناس", last_name=None))
+        await db.activity.flush()
+
+        async with db.session_scope() as session:
+            return (await session.execute(
+                select(User.telegram_id, User.username, User.first_name).order_by(User.telegram_id)
+            )).all()
+    finally:
+        await db.close()
+
+
+def test_flush_updates_existing_users_only(tmp_path):
+    rows = asyncio.run(_flush_round(tmp_path / "activity.db"))
+    assert [tuple(row) for row in rows] == [(1, "known", "جدید")]
@@ -0,0 +1,110 @@
+"""
+طرح اجرای کوئری‌های پرتکرار با EXPLAIN QUERY PLAN (SQLite)
+
+هر کوئری با همان سازنده یا متدی که برنامه صدا می‌زند اجرا و SQL واقعی آن
+(از جمله کوئری‌های selectinload) ضبط می‌شود؛ هیچ‌کدام نباید به پیمایش کامل
+جدول (SCAN بدون ایندکس) برسد.
+"""
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from src.api.models import Appointment
+from src.database.database import DatabaseManager
+from src.database.models import Doctor, DoctorCenter, DoctorService, Subscription, User
+from src.database.outbox import OutboxStore
+from src.database.queries import (
+    active_doctors_query,
+    subscriber_chat_ids_query,
+    subscription_query,
+    user_query,
+    user_subscriptions_query,
+)
+from src.database.users import deactivate_chats
+
+# "SCAN users" یا "SCAN TABLE users" پیمایش کامل است؛ "SCAN users USING INDEX" پیمایش ایندکس
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)\b(?! USING)')
+
+
+async def _seed(db):
+    async with db.session_scope() as session:
+        session.add(Doctor(id=1, name="دکتر", slug="dr-1", doctor_id="d1", active_subscriber_count=1))
+        session.add_all([User(id=1, telegram_id=1001), User(id=2, telegram_id=1002)])
+        await session.flush()
+        session.add(DoctorCenter(id=1, doctor_id=1, center_id="c1", center_name="مطب", user_center_id="u1"))
+        session.add(Subscription(user_id=1, doctor_id=1))
+        await session.flush()
+        session.add(DoctorService(center_id=1, service_id="s1", service_name="ویزیت", user_center_id="u1"))
+
+
+async def _execute(db, query):
+    async with db.session_scope() as session:
+        (await session.execute(query)).all()
+
+
+async def _outbox_round(db):
+    outbox = OutboxStore(db)
+    appointment = Appointment(from_time=1700000000, to_time=1700000600, workhour_turn_num=1,
+                              center_id="c1", service_id="s1")
+    await outbox.add(1, [1001, 1002], [appointment])
+    rows = await outbox.fetch_pending(0, 200)
+    await outbox.fetch_pending(0, 200, {0, 1}, 64)
+    await outbox.mark_sent([rows[0].id])
+    await outbox.mark_retry([rows[1].id], "timeout", 5)
+    await outbox.fail_chats([1002], "chat unreachable")
+    await outbox.backlog()
+
+
+HOT_QUERIES = {
+    'monitor.active_doctors': lambda db: _execute(db, active_doctors_query()),
+    'monitor.active_doctors_sharded': lambda db: _execute(db, active_doctors_query({0, 1}, 64)),
+    'fanout.subscribers': lambda db: _execute(db, subscriber_chat_ids_query(1)),
+    'handler.user': lambda db: _execute(db, user_query(1001)),
+    'handler.user_subscriptions': lambda db: _execute(db, user_subscriptions_query(1)),
+    'handler.subscription': lambda db: _execute(db, subscription_query(1, 1)),
+    'handler.subscription_any': lambda db: _execute(db, subscription_query(1, 1, active_only=False)),
+    'identity.lookup': lambda db: db.identities.get(1001),
+    'outbox.round': _outbox_round,
+    'notifier.deactivate_chats': lambda db: deactivate_chats(db, [1001]),
+}
+
+
+async def _explain(path, action):
+    """اجرای action روی دیتابیس موقت و طرح اجرای هر SELECT/UPDATE/DELETE آن"""
+    db = DatabaseManager(f"sqlite+aiosqlite:///{path}")
+    await db._setup_database()
+    try:
+        await _seed(db)
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine.sync_engine, 'before_cursor_execute', record)
+        try:
+            await action(db)
+        finally:
+            event.remove(db.engine.sync_engine, 'before_cursor_execute', record)
+
+        plans = []
+        async with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                rows = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)).all()
+                plans.append(SimpleNamespace(sql=statement, plan=[row[-1] for row in rows]))
+        return plans
+    finally:
+        await db.close()
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(name, tmp_path):
+    plans = asyncio.run(_explain(tmp_path / "plans.db", HOT_QUERIES[name]))
+    assert plans, f"{name}: هیچ کوئری‌ای اجرا نشد"
+    for explained in plans:
+        full_scans = [detail for detail in explained.plan if FULL_SCAN.match(detail)]
+        assert not full_scans, f"{name}: {full_scans}\n{explained.sql}"
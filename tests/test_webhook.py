@@ -0,0 +1,58 @@
+"""
+دریافت آپدیت با WebhookReceiver روی پورت محلی (port=0)
+"""
+import asyncio
+
+import httpx
+
+from src.telegram_bot.webhook import SECRET_HEADER, WebhookReceiver
+
+SECRET = "test-secret"
+UPDATE = {'update_id': 1, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': 7, 'type': 'private'}}}
+
+
+async def _post_all(requests):
+    """راه‌اندازی receiver، ارسال درخواست‌ها و برگرداندن (وضعیت‌ها، آپدیت‌های دریافتی)"""
+    received = []
+
+    async def handle_update(data: dict):
+        received.append(data)
+
+    receiver = WebhookReceiver(handle_update, SECRET, host="127.0.0.1", port=0)
+    await receiver.start()
+    try:
+        base_url = f"http://127.0.0.1:{receiver.bound_port}"
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            statuses = []
+            for path, headers, body in requests:
+                response = await client.post(path, headers=headers, json=body)
+                statuses.append(response.status_code)
+    finally:
+        await receiver.stop()
+    return statuses, received
+
+
+def test_valid_secret_is_accepted_and_handled():
+    statuses, received = asyncio.run(_post_all([
+        ("/telegram", {SECRET_HEADER: SECRET}, UPDATE),
+        ("/telegram", {SECRET_HEADER: SECRET}, {**UPDATE, 'update_id': 2}),
+    ]))
+    assert statuses == [200, 200]
+    assert [update['update_id'] for update in received] == [1, 2]
+
+
+def test_invalid_or_missing_secret_is_rejected():
+    statuses, received = asyncio.run(_post_all([
+        ("/telegram", {SECRET_HEADER: "wrong"}, UPDATE),
+        ("/telegram", {}, UPDATE),
+    ]))
+    assert statuses == [403, 403]
+    assert received == []
+
+
+def test_unknown_path_is_rejected():
+    statuses, received = asyncio.run(_post_all([
+        ("/other", {SECRET_HEADER: SECRET}, UPDATE),
+    ]))
+    assert statuses == [404]
+    assert received == []